@@ -1,12 +1,12 @@
 import json
+import os
 import pathlib
 import sys
 from typing import TextIO
 
 import click
-import jsonschema
 
-from chow import logger, usecases
+from chow import archive, archive_columns, logger, resilience, response_cache, usecases
 
 
 @click.group()
@@ -16,6 +16,32 @@ def cli() -> None:
     """
 
 
+# Shared by the commands that load the price archive.
+archive_validation_option = click.option(
+    "--archive-validation",
+    type=click.Choice(archive.VALIDATIONS),
+    default=archive.VALIDATION_FULL,
+    show_default=True,
+    help="How to validate the archive: against its schema, with faster structural checks, or only if it has changed since it was last validated.",
+)
+
+
+def _check_archive_exists(
+    ctx: click.Context, param: click.Parameter, value: pathlib.Path
+) -> pathlib.Path:
+    """
+    Check the passed archive exists.
+
+    Changes can be appended to an archive's journal before the archive file is first written, so an
+    archive exists if either of them does.
+    """
+    if not value.exists() and not os.path.exists(archive.journal_filepath(str(value))):
+        raise click.BadParameter(
+            f"Neither '{value}' nor its journal '{archive.journal_filepath(str(value))}' exist."
+        )
+    return value
+
+
 @cli.command()
 @click.argument("product_id", default="23476011")
 def fetch_price(product_id: str) -> None:
@@ -31,11 +57,111 @@ def fetch_price(product_id: str) -> None:
 
 @cli.command()
 @click.argument("products", type=click.File("rb"))
-@click.argument("archive", type=click.Path(exists=False))
-def update_price_archive(products: TextIO, archive: str) -> None:
+@click.argument("archive_filepath", metavar="ARCHIVE", type=click.Path(exists=False))
+@click.option(
+    "--fetch-mode",
+    type=click.Choice(usecases.FETCH_MODES),
+    default=usecases.FETCH_MODE_THREADS,
+    show_default=True,
+    help="How to run concurrent price fetches.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=usecases.DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Maximum number of prices to fetch at the same time.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Stop downloading each product page once its price has been read.",
+)
+@click.option(
+    "--parse-workers",
+    type=click.IntRange(min=1),
+    default=usecases.DEFAULT_PARSE_WORKERS,
+    show_default=True,
+    help="Number of processes parsing product pages in pipeline mode.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=pathlib.Path),
+    help="Folder of cached prices used to make conditional requests for product pages.",
+)
+@click.option(
+    "--cache-max-bytes",
+    type=click.IntRange(min=0),
+    default=response_cache.DEFAULT_MAX_BYTES,
+    show_default=True,
+    help="Size that the cache folder is trimmed to after each run.",
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    help="Use the cached prices without making any requests. Products without a cached price are left unchanged.",
+)
+@click.option(
+    "--rate-limit",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Maximum number of requests to make per second.",
+)
+@click.option(
+    "--adaptive",
+    is_flag=True,
+    help="Adjust the number of requests in flight, up to --concurrency, if Ocado throttles them.",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Number of times to retry temporary errors, with backoff. Products that still fail are left unchanged.",
+)
+@click.option(
+    "--deadline",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Time budget in seconds for fetching prices, after which no more requests are made.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Skip products whose prices were fetched today by an interrupted update.",
+)
+@click.option(
+    "--journal",
+    is_flag=True,
+    help="Append the changes to the archive's journal rather than rewriting the archive. Use compact-archive to fold the journal into the archive.",
+)
+@archive_validation_option
+def update_price_archive(
+    products: TextIO,
+    archive_filepath: str,
+    fetch_mode: str,
+    concurrency: int,
+    stream: bool,
+    parse_workers: int,
+    cache_dir: pathlib.Path | None,
+    cache_max_bytes: int,
+    offline: bool,
+    rate_limit: float | None,
+    adaptive: bool,
+    retries: int,
+    deadline: float | None,
+    resume: bool,
+    journal: bool,
+    archive_validation: str,
+) -> None:
     """
     Update a price archive JSON file with any prices changes and print a summary to STDOUT.
     """
+    if offline and cache_dir is None:
+        raise click.UsageError("--offline requires --cache-dir")
+    if cache_dir is not None and fetch_mode == usecases.FETCH_MODE_PIPELINE:
+        raise click.UsageError("--cache-dir isn't supported in pipeline mode")
+    if journal and archive.is_sqlite(archive_filepath):
+        raise click.UsageError("--journal isn't supported for SQLite archives")
+
     try:
         product_list = _load_products(products)
     except InvalidJSON as e:
@@ -46,13 +172,108 @@ def update_price_archive(products: TextIO, archive: str) -> None:
 
     summary = usecases.update_price_archive(
         products=product_list,
-        archive_filepath=archive,
+        archive_filepath=archive_filepath,
         logger=logger.ConsoleLogger(debug_mode=True),
+        fetch_mode=fetch_mode,
+        concurrency=concurrency,
+        stream=stream,
+        parse_workers=parse_workers,
+        cache=(
+            response_cache.ResponseCache(cache_dir, max_bytes=cache_max_bytes)
+            if cache_dir is not None
+            else None
+        ),
+        offline=offline,
+        rate_limit=rate_limit,
+        adaptive=adaptive,
+        retry_policy=(
+            resilience.RetryPolicy(max_attempts=retries + 1, deadline=deadline)
+            if retries or deadline
+            else None
+        ),
+        resume=resume,
+        archive_validation=archive_validation,
+        append_to_journal=journal,
     )
     if summary:
         print(summary)
 
 
+@cli.command()
+@click.argument(
+    "source",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
+)
+@click.argument(
+    "destination",
+    type=click.Path(
+        exists=False, file_okay=True, dir_okay=False, path_type=pathlib.Path
+    ),
+)
+def convert_archive(source: pathlib.Path, destination: pathlib.Path) -> None:
+    """
+    Copy a price archive between the JSON and SQLite formats.
+
+    The format of each file is determined by its suffix: .db, .sqlite and .sqlite3 files are SQLite
+    databases, anything else is JSON.
+    """
+    try:
+        products = archive.load(str(source))
+    except archive.InvalidJSON as e:
+        click.secho(f"Error: {e}", fg="red")
+        sys.exit(1)
+
+    archive.save(str(destination), products)
+    print(f"Copied {len(products)} products to {destination}")
+
+
+@cli.command()
+@click.argument(
+    "archive_filepath",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
+)
+@archive_validation_option
+def compact_archive(archive_filepath: pathlib.Path, archive_validation: str) -> None:
+    """
+    Fold the archive's journal of changes into the archive file.
+    """
+    if archive.is_sqlite(str(archive_filepath)):
+        raise click.UsageError("SQLite archives don't have a journal")
+    if not os.path.exists(archive.journal_filepath(str(archive_filepath))):
+        print("No journal to compact")
+        return
+
+    num_records = archive.compact(str(archive_filepath), validation=archive_validation)
+    print(f"Folded {num_records} journal records into {archive_filepath}")
+
+
+@cli.command()
+@click.argument(
+    "archive_filepath",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
+)
+@archive_validation_option
+def snapshot_archive(archive_filepath: pathlib.Path, archive_validation: str) -> None:
+    """
+    Write a binary snapshot of the archive for faster loading.
+
+    Commands that generate documents and charts load the snapshot instead of the archive until
+    the archive changes.
+    """
+    if archive.is_sqlite(str(archive_filepath)):
+        raise click.UsageError("SQLite archives don't support snapshots")
+
+    columns = archive_columns.write_snapshot(
+        str(archive_filepath), validation=archive_validation
+    )
+    print(
+        f"Wrote snapshot of {len(columns)} products to {archive_columns.snapshot_filepath(str(archive_filepath))}"
+    )
+
+
 class InvalidJSON(Exception):
     """
     For when JSON is invalid.
@@ -74,7 +295,7 @@ PRODUCTS_SCHEMA = {
 }
 
 
-def _load_products(products_content: TextIO) -> usecases.Products:
+def _load_products(products_content: TextIO) -> "usecases.Products":
     """
     Load the product map from the passed text stream.
 
@@ -87,6 +308,9 @@ def _load_products(products_content: TextIO) -> usecases.Products:
         raise InvalidJSON("JSON could not be decoded") from e
 
     # Validate against schema.
+    # jsonschema is slow to import so it's only imported by the commands that need it.
+    import jsonschema
+
     try:
         jsonschema.validate(instance=products, schema=PRODUCTS_SCHEMA)
     except jsonschema.exceptions.ValidationError as e:
@@ -98,9 +322,8 @@ def _load_products(products_content: TextIO) -> usecases.Products:
 @cli.command()
 @click.argument(
     "archive",
-    type=click.Path(
-        exists=True, file_okay=True, dir_okay=False, path_type=pathlib.Path
-    ),
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
 )
 @click.argument(
     "folder",
@@ -108,7 +331,28 @@ def _load_products(products_content: TextIO) -> usecases.Products:
         exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path
     ),
 )
-def generate_graphs(archive: pathlib.Path, folder: pathlib.Path) -> None:
+@archive_validation_option
+@click.option(
+    "--refresh-days",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of days after which unchanged charts are re-rendered to extend them to today.",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes rendering charts.",
+)
+def generate_graphs(
+    archive: pathlib.Path,
+    folder: pathlib.Path,
+    archive_validation: str,
+    refresh_days: int,
+    jobs: int,
+) -> None:
     """
     Update the product graphs.
     """
@@ -116,16 +360,72 @@ def generate_graphs(archive: pathlib.Path, folder: pathlib.Path) -> None:
         archive_filepath=archive,
         chart_folder=folder,
         logger=logger.ConsoleLogger(debug_mode=True),
+        archive_validation=archive_validation,
+        refresh_days=refresh_days,
+        jobs=jobs,
     )
 
 
 @cli.command()
 @click.argument(
     "archive_filepath",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
+)
+@click.argument(
+    "docs_folder",
     type=click.Path(
-        exists=True, file_okay=True, dir_okay=False, path_type=pathlib.Path
+        exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path
     ),
 )
+@archive_validation_option
+@click.option(
+    "--refresh-days",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of days after which unchanged charts are re-rendered to extend them to today.",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes rendering charts.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only regenerate the documents of products changed by update-price-archive since documents were last generated.",
+)
+def build_site(
+    archive_filepath: pathlib.Path,
+    docs_folder: pathlib.Path,
+    archive_validation: str,
+    refresh_days: int,
+    jobs: int,
+    incremental: bool,
+) -> None:
+    """
+    Generate the charts, overview, timeline and product documents in the passed folder.
+    """
+    usecases.build_site(
+        archive_filepath=archive_filepath,
+        docs_folder=docs_folder,
+        logger=logger.ConsoleLogger(debug_mode=True),
+        archive_validation=archive_validation,
+        refresh_days=refresh_days,
+        jobs=jobs,
+        incremental=incremental,
+    )
+
+
+@cli.command()
+@click.argument(
+    "archive_filepath",
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
+)
 @click.argument(
     "charts_folder",
     type=click.Path(
@@ -138,10 +438,12 @@ def generate_graphs(archive: pathlib.Path, folder: pathlib.Path) -> None:
         exists=False, file_okay=True, dir_okay=False, path_type=pathlib.Path
     ),
 )
+@archive_validation_option
 def generate_overview(
     archive_filepath: pathlib.Path,
     charts_folder: pathlib.Path,
     overview_filepath: pathlib.Path,
+    archive_validation: str,
 ) -> None:
     """
     Generate a product overview in the passed file.
@@ -151,15 +453,15 @@ def generate_overview(
         charts_folder=charts_folder,
         overview_filepath=overview_filepath,
         logger=logger.ConsoleLogger(debug_mode=True),
+        archive_validation=archive_validation,
     )
 
 
 @cli.command()
 @click.argument(
     "archive_filepath",
-    type=click.Path(
-        exists=True, file_okay=True, dir_okay=False, path_type=pathlib.Path
-    ),
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
 )
 @click.argument(
     "timeline_filepath",
@@ -167,25 +469,44 @@ def generate_overview(
         exists=False, file_okay=True, dir_okay=False, path_type=pathlib.Path
     ),
 )
+@archive_validation_option
+@click.option(
+    "--max-days",
+    type=click.IntRange(min=1),
+    help="Only include the newest dates with price changes.",
+)
+@click.option(
+    "--partitioned",
+    is_flag=True,
+    help="Write a timeline file for each month, next to the timeline file, which becomes an index of them.",
+)
 def generate_timeline(
-    archive_filepath: pathlib.Path, timeline_filepath: pathlib.Path
+    archive_filepath: pathlib.Path,
+    timeline_filepath: pathlib.Path,
+    archive_validation: str,
+    max_days: int | None,
+    partitioned: bool,
 ) -> None:
     """
     Generate a timeline in the passed file.
     """
+    if partitioned and max_days is not None:
+        raise click.UsageError("--max-days isn't supported in partitioned mode")
     usecases.generate_timeline_file(
         archive_filepath=archive_filepath,
         timeline_filepath=timeline_filepath,
         logger=logger.ConsoleLogger(debug_mode=True),
+        archive_validation=archive_validation,
+        max_days=max_days,
+        partitioned=partitioned,
     )
 
 
 @cli.command()
 @click.argument(
     "archive_filepath",
-    type=click.Path(
-        exists=True, file_okay=True, dir_okay=False, path_type=pathlib.Path
-    ),
+    type=click.Path(file_okay=True, dir_okay=False, path_type=pathlib.Path),
+    callback=_check_archive_exists,
 )
 @click.argument(
     "charts_folder",
@@ -199,10 +520,18 @@ def generate_timeline(
         exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path
     ),
 )
+@archive_validation_option
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only regenerate the documents of products changed by update-price-archive since documents were last generated.",
+)
 def generate_product_documents(
     archive_filepath: pathlib.Path,
     charts_folder: pathlib.Path,
     products_folder: pathlib.Path,
+    archive_validation: str,
+    incremental: bool,
 ) -> None:
     """
     Generate product detail documents in the passed folder.
@@ -212,6 +541,8 @@ def generate_product_documents(
         charts_folder=charts_folder,
         products_folder=products_folder,
         logger=logger.ConsoleLogger(debug_mode=True),
+        archive_validation=archive_validation,
+        incremental=incremental,
     )
 
 
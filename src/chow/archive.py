@@ -1,8 +1,18 @@
+import functools
+import hashlib
 import json
 import os
-from typing import TypedDict
+import pathlib
+import re
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Required, TextIO, TypedDict
 
-import jsonschema
+from chow import output
+
+# jsonschema is slow to import so it's only imported when the archive is validated against its
+# schema.
+if TYPE_CHECKING:
+    import jsonschema.protocols
 
 
 class PriceChange(TypedDict):
@@ -25,6 +35,24 @@ class InvalidJSON(Exception):
     pass
 
 
+class ChangeSet(TypedDict):
+    # Products that aren't in the archive yet, keyed by product ID.
+    new_products: dict[str, ProductPriceHistory]
+    # Price changes to append to products in the archive, keyed by product ID.
+    price_changes: dict[str, PriceChange]
+    # IDs of products in the archive to mark as removed.
+    removed_products: list[str]
+
+
+class JournalRecord(TypedDict, total=False):
+    product_id: Required[str]
+    name: Required[str]
+    # Price change records have a date and price. Removal records have a removed flag.
+    date: str  # YYYY-MM-DD
+    price: str
+    removed: bool
+
+
 ARCHIVE_SCHEMA = {
     "type": "object",
     "patternProperties": {
@@ -62,33 +90,615 @@ ARCHIVE_SCHEMA = {
 }
 
 
-def load(filepath: str) -> ArchiveProductMap:
+# Ways of validating the archive when it is loaded:
+# - full: validate against ARCHIVE_SCHEMA with jsonschema.
+# - structural: validate with hand-written checks that are equivalent to ARCHIVE_SCHEMA but faster.
+# - trusted: skip validation if the file is unchanged since it was last validated, otherwise
+#   validate fully.
+VALIDATION_FULL = "full"
+VALIDATION_STRUCTURAL = "structural"
+VALIDATION_TRUSTED = "trusted"
+VALIDATIONS = (VALIDATION_FULL, VALIDATION_STRUCTURAL, VALIDATION_TRUSTED)
+
+
+# Archive files with these suffixes are SQLite databases rather than JSON files.
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def load(filepath: str, validation: str = VALIDATION_FULL) -> ArchiveProductMap:
     """
     Return the product archive data structure.
+
+    SQLite archives aren't validated as their tables constrain the data instead.
+    """
+    if is_sqlite(filepath):
+        if not os.path.exists(filepath):
+            return {}
+
+        # Imported here as the SQLite backend imports this module.
+        from chow import archive_sqlite
+
+        return archive_sqlite.load(filepath)
+
+    # Archive is stored in a local JSON file, plus any changes appended to its journal since the
+    # journal was last compacted into the file.
+    content = _load_archive_file(filepath, validation)
+    _replay_journal(content, _load_journal(filepath))
+    return content
+
+
+def _load_archive_file(filepath: str, validation: str) -> ArchiveProductMap:
+    """
+    Return the product archive data structure from the passed JSON file.
     """
-    # Archive is stored in a local file.
     if not os.path.exists(filepath):
         return {}
 
+    with open(filepath, "rb") as f:
+        raw_content = f.read()
+
     # Decode file content.
-    with open(filepath) as f:
-        try:
-            content: ArchiveProductMap = json.load(f)
-        except json.decoder.JSONDecodeError as e:
-            raise InvalidJSON("JSON could not be decoded") from e
+    try:
+        content: ArchiveProductMap = json.loads(raw_content)
+    except json.decoder.JSONDecodeError as e:
+        raise InvalidJSON("JSON could not be decoded") from e
+
+    if validation == VALIDATION_STRUCTURAL:
+        _validate_structure(content)
+    elif validation == VALIDATION_TRUSTED:
+        _validate_unless_trusted(filepath, raw_content, content)
+    else:
+        _validate_schema(content)
+
+    return content
+
+
+@functools.cache
+def _schema_validator() -> "jsonschema.protocols.Validator":
+    """
+    Return a validator for the archive schema.
+
+    This is built once per process as checking the schema and building the validator is slow.
+    """
+    import jsonschema.validators
+
+    validator_class = jsonschema.validators.validator_for(ARCHIVE_SCHEMA)
+    validator_class.check_schema(ARCHIVE_SCHEMA)
+    return validator_class(ARCHIVE_SCHEMA)
+
+
+def _validate_schema(content: Any) -> None:
+    """
+    Validate the passed content against the archive schema.
+
+    Raises InvalidJSON.
+    """
+    import jsonschema.exceptions
 
-    # Validate against schema.
     try:
-        jsonschema.validate(instance=content, schema=ARCHIVE_SCHEMA)
+        _schema_validator().validate(content)
     except jsonschema.exceptions.ValidationError as e:
         raise InvalidJSON("JSON does not conform to schema") from e
 
-    return content
+
+_PRODUCT_ID_REGEX = re.compile(r"^\d+$")
+_PRODUCT_KEYS = frozenset(("name", "prices", "removed"))
+_PRICE_CHANGE_KEYS = frozenset(("date", "price"))
+
+
+def _validate_structure(content: Any) -> None:
+    """
+    Validate the passed content with checks that are equivalent to the archive schema.
+
+    Raises InvalidJSON.
+    """
+    if not isinstance(content, dict):
+        raise InvalidJSON("JSON does not conform to schema")
+
+    for product_id, product in content.items():
+        _validate_product_structure(product_id, product)
+
+
+def _validate_product_structure(product_id: str, product: Any) -> None:
+    """
+    Validate the passed product with checks that are equivalent to its subschema.
+
+    Raises InvalidJSON.
+    """
+    error = InvalidJSON("JSON does not conform to schema")
+    if not _PRODUCT_ID_REGEX.search(product_id):
+        raise error
+    if not isinstance(product, dict) or not _PRODUCT_KEYS.issuperset(product):
+        raise error
+    if not isinstance(product.get("name"), str):
+        raise error
+    if "removed" in product and not isinstance(product["removed"], bool):
+        raise error
+
+    prices = product.get("prices")
+    if not isinstance(prices, list):
+        raise error
+    for price_change in prices:
+        if (
+            not isinstance(price_change, dict)
+            or price_change.keys() != _PRICE_CHANGE_KEYS
+            or not isinstance(price_change["date"], str)
+            or not isinstance(price_change["price"], str)
+        ):
+            raise error
+
+
+def _validate_unless_trusted(filepath: str, raw_content: bytes, content: Any) -> None:
+    """
+    Validate the passed content unless the file's hash matches that of its last validation.
+
+    Raises InvalidJSON.
+    """
+    content_hash = hashlib.sha256(raw_content).hexdigest()
+    if _is_trusted(filepath, content_hash):
+        return
+
+    _validate_schema(content)
+    _record_trusted(filepath, content_hash)
+
+
+def _is_trusted(filepath: str, content_hash: str) -> bool:
+    """
+    Return whether the passed hash of the archive file matches that of its last validation.
+    """
+    try:
+        with open(f"{filepath}.validated") as f:
+            return f.read().strip() == content_hash
+    except FileNotFoundError:
+        return False
+
+
+def _record_trusted(filepath: str, content_hash: str) -> None:
+    """
+    Record the hash of the validated archive file so the next load can skip validation.
+    """
+    # This is best-effort as the archive may be in a read-only location.
+    try:
+        with open(f"{filepath}.validated", "w") as f:
+            f.write(content_hash)
+    except OSError:
+        pass
+
+
+@functools.cache
+def _product_schema_validator() -> "jsonschema.protocols.Validator":
+    """
+    Return a validator for the subschema of each product in the archive schema.
+    """
+    import jsonschema.validators
+
+    product_schema = ARCHIVE_SCHEMA["patternProperties"][_PRODUCT_ID_REGEX.pattern]  # type: ignore[index]
+    validator_class = jsonschema.validators.validator_for(product_schema)
+    validator_class.check_schema(product_schema)
+    return validator_class(product_schema)
+
+
+def _validate_product_schema(product_id: str, product: Any) -> None:
+    """
+    Validate the passed product against its subschema.
+
+    Raises InvalidJSON.
+    """
+    if not _PRODUCT_ID_REGEX.search(product_id):
+        raise InvalidJSON("JSON does not conform to schema")
+    import jsonschema.exceptions
+
+    try:
+        _product_schema_validator().validate(product)
+    except jsonschema.exceptions.ValidationError as e:
+        raise InvalidJSON("JSON does not conform to schema") from e
+
+
+def iter_products(
+    filepath: str, validation: str = VALIDATION_FULL
+) -> Iterator[tuple[str, ProductPriceHistory]]:
+    """
+    Yield the ID and price history of each product in the archive, one at a time.
+
+    Unlike `load`, products are parsed and validated incrementally so memory use is bounded by the
+    largest product rather than the size of the archive. Products are yielded in the same order
+    as `load` returns them.
+    """
+    if is_sqlite(filepath):
+        if os.path.exists(filepath):
+            from chow import archive_sqlite
+
+            yield from archive_sqlite.iter_products(filepath)
+        return
+
+    # Group the journal records by product so they can be replayed onto each product as it's read.
+    journal_records: dict[str, list[JournalRecord]] = {}
+    for record in _load_journal(filepath):
+        journal_records.setdefault(record["product_id"], []).append(record)
+
+    if os.path.exists(filepath):
+        content_hash = None
+        validate_product = (
+            _validate_product_structure
+            if validation == VALIDATION_STRUCTURAL
+            else _validate_product_schema
+        )
+        if validation == VALIDATION_TRUSTED:
+            with open(filepath, "rb") as f:
+                content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+            if _is_trusted(filepath, content_hash):
+                validate_product = _skip_validation
+
+        with open(filepath) as f:
+            for product_id, product in _iter_json_object_items(f):
+                validate_product(product_id, product)
+                products = {product_id: product}
+                _replay_journal(products, journal_records.pop(product_id, []))
+                yield product_id, products[product_id]
+
+        if content_hash is not None and validate_product is not _skip_validation:
+            _record_trusted(filepath, content_hash)
+
+    # Yield any products that are only in the journal.
+    for product_id, records in journal_records.items():
+        products = {}
+        _replay_journal(products, records)
+        yield product_id, products[product_id]
+
+
+def _skip_validation(product_id: str, product: Any) -> None:
+    pass
+
+
+# Size of the chunks read from archive files when iterating over their products.
+_STREAM_CHUNK_SIZE = 64 * 1024
+_JSON_WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+
+
+def _iter_json_object_items(f: TextIO) -> Iterator[tuple[Any, Any]]:
+    """
+    Yield the key and value of each item of the JSON object in the passed file.
+
+    Raises InvalidJSON.
+    """
+    reader = _JSONStreamReader(f)
+    if reader.take() != "{":
+        raise InvalidJSON("JSON does not conform to schema")
+    if reader.peek() == "}":
+        reader.take()
+    else:
+        while True:
+            key = reader.decode()
+            if not isinstance(key, str) or reader.take() != ":":
+                raise InvalidJSON("JSON could not be decoded")
+            yield key, reader.decode()
+
+            delimiter = reader.take()
+            if delimiter == "}":
+                break
+            if delimiter != ",":
+                raise InvalidJSON("JSON could not be decoded")
+
+    if reader.peek() != "":
+        raise InvalidJSON("JSON could not be decoded")
+
+
+class _JSONStreamReader:
+    """
+    Reads JSON values from a file, a chunk at a time.
+    """
+
+    def __init__(self, f: TextIO) -> None:
+        self._file = f
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def peek(self) -> str:
+        """
+        Return the next non-whitespace character, or an empty string at the end of the file.
+        """
+        while True:
+            match = _JSON_WHITESPACE_REGEX.match(self._buffer, self._position)
+            self._position = match.end() if match else self._position
+            if self._position < len(self._buffer) or not self._read_more():
+                return self._buffer[self._position : self._position + 1]
+
+    def take(self) -> str:
+        """
+        Return and consume the next non-whitespace character.
+        """
+        character = self.peek()
+        self._position += len(character)
+        return character
+
+    def decode(self) -> Any:
+        """
+        Return and consume the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.decoder.JSONDecodeError as e:
+                # The value may continue in the next chunk.
+                if self._read_more():
+                    continue
+                raise InvalidJSON("JSON could not be decoded") from e
+
+            # A number at the end of the buffer may also continue in the next chunk.
+            if end == len(self._buffer) and self._read_more():
+                continue
+
+            self._position = end
+            return value
+
+    def _read_more(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(_STREAM_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        return True
 
 
 def save(filepath: str, archive: ArchiveProductMap) -> None:
     """
     Save the product archive data structure.
     """
-    with open(filepath, "w") as f:
+    if is_sqlite(filepath):
+        from chow import archive_sqlite
+
+        archive_sqlite.save(filepath, archive)
+        return
+
+    # Flush the archive to disk before it replaces the old one so a crash can't leave it truncated.
+    with output.atomic_write(pathlib.Path(filepath), "w", fsync=True) as f:
         json.dump(archive, f, indent=4)
+
+
+def has_changes(changes: ChangeSet) -> bool:
+    """
+    Return whether the passed change set changes the archive.
+    """
+    return bool(
+        changes["new_products"]
+        or changes["price_changes"]
+        or changes["removed_products"]
+    )
+
+
+def apply_changes(products: ArchiveProductMap, changes: ChangeSet) -> ArchiveProductMap:
+    """
+    Return a copy of the archive data structure with the passed changes applied.
+
+    The copy is shallow: only the changed products are copied, the rest are shared with the
+    passed archive, which is left unchanged.
+    """
+    updated_products = dict(products)
+    for product_id, price_change in changes["price_changes"].items():
+        product = updated_products[product_id]
+        updated_products[product_id] = {
+            **product,
+            "prices": [*product["prices"], price_change],
+        }
+    for product_id in changes["removed_products"]:
+        updated_products[product_id] = {**updated_products[product_id], "removed": True}
+    updated_products.update(changes["new_products"])
+    return updated_products
+
+
+def save_changes(
+    filepath: str, products: ArchiveProductMap, changes: ChangeSet
+) -> None:
+    """
+    Save the passed changes to the archive data structure.
+
+    SQLite archives are updated by inserting the changes. JSON archives are rewritten.
+    """
+    if is_sqlite(filepath):
+        from chow import archive_sqlite
+
+        archive_sqlite.save_changes(filepath, changes)
+        return
+
+    save(filepath, apply_changes(products, changes))
+
+
+def append_changes(
+    filepath: str, products: ArchiveProductMap, changes: ChangeSet
+) -> int:
+    """
+    Append the passed changes to the archive data structure to the archive's journal.
+
+    Returns the number of records appended.
+    """
+    records: list[JournalRecord] = []
+    for product_id, product in changes["new_products"].items():
+        for price_change in product["prices"]:
+            records.append(
+                {
+                    "product_id": product_id,
+                    "name": product["name"],
+                    "date": price_change["date"],
+                    "price": price_change["price"],
+                }
+            )
+    for product_id, price_change in changes["price_changes"].items():
+        records.append(
+            {
+                "product_id": product_id,
+                "name": products[product_id]["name"],
+                "date": price_change["date"],
+                "price": price_change["price"],
+            }
+        )
+    for product_id in changes["removed_products"]:
+        records.append(
+            {
+                "product_id": product_id,
+                "name": products[product_id]["name"],
+                "removed": True,
+            }
+        )
+
+    if records:
+        # Drop the last record if an interrupted append left it incomplete, so the first record
+        # appended isn't joined onto it.
+        output.truncate_partial_line(pathlib.Path(journal_filepath(filepath)))
+        with open(journal_filepath(filepath), "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+
+    return len(records)
+
+
+def compact(filepath: str, validation: str = VALIDATION_FULL) -> int:
+    """
+    Fold the archive's journal into the archive file and remove the journal.
+
+    Returns the number of journal records folded into the archive file.
+    """
+    records = _load_journal(filepath)
+    content = _load_archive_file(filepath, validation)
+    _replay_journal(content, records)
+
+    # The archive file is replaced atomically. If the journal can't be removed afterwards,
+    # replaying it again is harmless.
+    save(filepath, content)
+    os.unlink(journal_filepath(filepath))
+
+    return len(records)
+
+
+def journal_filepath(filepath: str) -> str:
+    """
+    Return the filepath of the journal for the passed archive file.
+    """
+    return f"{filepath}.journal"
+
+
+def changed_products_filepath(filepath: str) -> str:
+    """
+    Return the filepath of the list of products changed by updates to the passed archive file.
+    """
+    return f"{filepath}.changed"
+
+
+def record_changed_products(filepath: str, changes: ChangeSet) -> None:
+    """
+    Append the IDs of the products changed by the passed change set to the list of changed
+    products of the passed archive file.
+
+    The list accumulates over updates until it's cleared by `clear_changed_products`, so that
+    generated documents can be updated for just the changed products.
+    """
+    product_ids = [
+        *changes["new_products"],
+        *changes["price_changes"],
+        *changes["removed_products"],
+    ]
+    # Drop the last ID if an interrupted update left it incomplete, so the first ID appended isn't
+    # joined onto it.
+    output.truncate_partial_line(pathlib.Path(changed_products_filepath(filepath)))
+    with open(changed_products_filepath(filepath), "a") as f:
+        f.writelines(f"{product_id}\n" for product_id in product_ids)
+
+
+def load_changed_products(filepath: str) -> set[str]:
+    """
+    Return the IDs of the products changed since the list of changed products was last cleared.
+    """
+    try:
+        with open(changed_products_filepath(filepath)) as f:
+            # The last line may be incomplete if an update was interrupted.
+            return {line.rstrip("\n") for line in f if line.endswith("\n")}
+    except FileNotFoundError:
+        return set()
+
+
+def clear_changed_products(filepath: str) -> None:
+    """
+    Remove the list of changed products of the passed archive file.
+    """
+    try:
+        os.remove(changed_products_filepath(filepath))
+    except FileNotFoundError:
+        pass
+
+
+def _load_journal(filepath: str) -> list[JournalRecord]:
+    """
+    Return the records from the journal of the passed archive file.
+
+    Raises InvalidJSON.
+    """
+    try:
+        with open(journal_filepath(filepath)) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+
+    records = []
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            record = json.loads(line)
+        except json.decoder.JSONDecodeError as e:
+            # The last line may be incomplete if an update was interrupted.
+            if line_number == len(lines):
+                break
+            raise InvalidJSON(f"Journal line {line_number} could not be decoded") from e
+        if not _is_valid_journal_record(record):
+            raise InvalidJSON(f"Journal line {line_number} is not a valid record")
+        records.append(record)
+    return records
+
+
+def _is_valid_journal_record(record: Any) -> bool:
+    if not (
+        isinstance(record, dict)
+        and isinstance(record.get("product_id"), str)
+        and _PRODUCT_ID_REGEX.search(record["product_id"])
+        and isinstance(record.get("name"), str)
+    ):
+        return False
+    if "removed" in record:
+        return isinstance(record["removed"], bool)
+    return isinstance(record.get("date"), str) and isinstance(record.get("price"), str)
+
+
+def _replay_journal(content: ArchiveProductMap, records: list[JournalRecord]) -> None:
+    """
+    Apply the passed journal records to the archive data structure in place.
+
+    Records that are already in the archive are skipped, so replaying a journal is idempotent.
+    """
+    for record in records:
+        product_id = record["product_id"]
+        if product_id not in content:
+            content[product_id] = {
+                "name": record["name"],
+                "prices": [],
+                "removed": False,
+            }
+        product = content[product_id]
+
+        if "removed" in record:
+            product["removed"] = record["removed"]
+            continue
+
+        price_change: PriceChange = {"date": record["date"], "price": record["price"]}
+        if price_change not in product["prices"]:
+            product["prices"].append(price_change)
+
+
+def is_sqlite(filepath: str) -> bool:
+    """
+    Return whether the passed archive file is a SQLite database.
+    """
+    return os.path.splitext(filepath)[1] in SQLITE_SUFFIXES
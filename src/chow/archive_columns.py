@@ -0,0 +1,289 @@
+import array
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import struct
+import sys
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from chow import archive, output
+
+
+class ColumnarArchive:
+    """
+    Columnar view of the price archive, built once when the archive is loaded.
+
+    Product IDs, names and removal flags are held in sequences indexed by product. The price
+    changes of all products are held in two flat arrays, of day numbers (as returned by
+    `datetime.date.toordinal`) and of prices in pence, with the price changes of product `i` at
+    positions `offsets[i]` to `offsets[i + 1]` in chronological order.
+    """
+
+    def __init__(
+        self,
+        product_ids: list[str],
+        names: list[str],
+        removed: list[bool],
+        offsets: Sequence[int],
+        days: Sequence[int],
+        prices: Sequence[int],
+    ) -> None:
+        self.product_ids = product_ids
+        self.names = names
+        self.removed = removed
+        self.offsets = offsets
+        self.days = days
+        self.prices = prices
+
+    @classmethod
+    def from_archive(cls, products: archive.ArchiveProductMap) -> "ColumnarArchive":
+        """
+        Build the columnar view of the passed archive data structure.
+        """
+        return cls.from_products(products.items())
+
+    @classmethod
+    def from_products(
+        cls, products: Iterable[tuple[str, archive.ProductPriceHistory]]
+    ) -> "ColumnarArchive":
+        """
+        Build the columnar view from the passed (product ID, price history) pairs.
+        """
+        product_ids: list[str] = []
+        names: list[str] = []
+        removed: list[bool] = []
+        offsets = array.array("q", [0])
+        days = array.array("i")
+        prices = array.array("i")
+
+        # Most dates are shared between products so only parse each one once.
+        day_numbers: dict[str, int] = {}
+        for product_id, product in products:
+            product_ids.append(product_id)
+            names.append(product["name"])
+            removed.append(product.get("removed", False))
+            for price_change in product["prices"]:
+                date = price_change["date"]
+                day = day_numbers.get(date)
+                if day is None:
+                    day = day_numbers[date] = datetime.date.fromisoformat(
+                        date
+                    ).toordinal()
+                days.append(day)
+                prices.append(parse_pence(price_change["price"]))
+            offsets.append(len(days))
+
+        return cls(product_ids, names, removed, offsets, days, prices)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def price_range(self, index: int) -> range:
+        """
+        Return the positions of the passed product's price changes in the price change arrays.
+        """
+        return range(self.offsets[index], self.offsets[index + 1])
+
+
+def load(filepath: str, validation: str = archive.VALIDATION_FULL) -> ColumnarArchive:
+    """
+    Return the columnar view of the product archive.
+
+    The view is memory-mapped from the archive's binary snapshot if it has one that is up to date.
+    Otherwise it is built from the archive file one product at a time, without loading the whole
+    archive data structure.
+    """
+    if not archive.is_sqlite(filepath):
+        columns = load_snapshot(filepath)
+        if columns is not None:
+            return columns
+    return ColumnarArchive.from_products(
+        archive.iter_products(filepath, validation=validation)
+    )
+
+
+# Binary snapshots store the columnar view so it can be memory-mapped rather than parsed. The file
+# starts with a magic string and the length of a JSON header, which records the state of the
+# archive files the snapshot was built from and the location of each section. The sections are:
+# - the product offsets, day numbers and prices as fixed-width native integers;
+# - the removal flags as one byte per product;
+# - the product IDs and names as NUL-separated UTF-8 strings.
+# Each section starts on an 8-byte boundary.
+_SNAPSHOT_MAGIC = b"CHOWSNAP"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_PREAMBLE = struct.Struct(f"<{len(_SNAPSHOT_MAGIC)}sI")
+
+
+def snapshot_filepath(filepath: str) -> str:
+    """
+    Return the filepath of the binary snapshot for the passed archive file.
+    """
+    return f"{filepath}.snapshot"
+
+
+def write_snapshot(
+    filepath: str, validation: str = archive.VALIDATION_FULL
+) -> ColumnarArchive:
+    """
+    Build the columnar view of the passed archive file and write it to a binary snapshot.
+    """
+    # Record the state of the archive files before loading them so that any change made while the
+    # snapshot is being built makes it stale.
+    stats = _source_stats(filepath)
+    hashes = _source_hashes(filepath)
+    columns = ColumnarArchive.from_products(
+        archive.iter_products(filepath, validation=validation)
+    )
+
+    sections = {
+        "offsets": array.array("q", columns.offsets).tobytes(),
+        "days": array.array("i", columns.days).tobytes(),
+        "prices": array.array("i", columns.prices).tobytes(),
+        "removed": bytes(columns.removed),
+        "product_ids": "\0".join(columns.product_ids).encode(),
+        "names": "\0".join(columns.names).encode(),
+    }
+    locations = {}
+    position = 0
+    for name, content in sections.items():
+        locations[name] = [position, len(content)]
+        position += _padded_length(len(content))
+    header = json.dumps(
+        {
+            "version": _SNAPSHOT_VERSION,
+            "byteorder": sys.byteorder,
+            "num_products": len(columns),
+            "sources": {"stats": stats, "hashes": hashes},
+            "sections": locations,
+        }
+    ).encode()
+    header += b" " * (
+        _padded_length(_SNAPSHOT_PREAMBLE.size + len(header))
+        - _SNAPSHOT_PREAMBLE.size
+        - len(header)
+    )
+
+    with output.atomic_write(pathlib.Path(snapshot_filepath(filepath))) as f:
+        f.write(_SNAPSHOT_PREAMBLE.pack(_SNAPSHOT_MAGIC, len(header)))
+        f.write(header)
+        for content in sections.values():
+            f.write(content)
+            f.write(b"\0" * (_padded_length(len(content)) - len(content)))
+
+    return columns
+
+
+def load_snapshot(filepath: str) -> ColumnarArchive | None:
+    """
+    Return the columnar view memory-mapped from the archive's binary snapshot.
+
+    Returns None if there is no snapshot, or if it can't be read or is stale. A snapshot is stale
+    if the archive file or its journal have changed since it was written, judged by their size and
+    modification time or, failing that, their content hash.
+    """
+    try:
+        with open(snapshot_filepath(filepath), "rb") as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # mmap raises ValueError for empty files.
+        return None
+
+    try:
+        magic, header_length = _SNAPSHOT_PREAMBLE.unpack_from(snapshot)
+        if magic != _SNAPSHOT_MAGIC:
+            return None
+        header_end = _SNAPSHOT_PREAMBLE.size + header_length
+        header: dict[str, Any] = json.loads(
+            snapshot[_SNAPSHOT_PREAMBLE.size : header_end]
+        )
+        if (
+            header["version"] != _SNAPSHOT_VERSION
+            or header["byteorder"] != sys.byteorder
+        ):
+            return None
+        sources = header["sources"]
+        if sources["stats"] != _source_stats(filepath) and sources[
+            "hashes"
+        ] != _source_hashes(filepath):
+            return None
+
+        view = memoryview(snapshot)[header_end:]
+
+        def _section(name: str) -> memoryview:
+            start, length = header["sections"][name]
+            return view[start : start + length]
+
+        return ColumnarArchive(
+            product_ids=_split_strings(_section("product_ids"), header["num_products"]),
+            names=_split_strings(_section("names"), header["num_products"]),
+            removed=[bool(flag) for flag in _section("removed")],
+            offsets=_section("offsets").cast("q"),
+            days=_section("days").cast("i"),
+            prices=_section("prices").cast("i"),
+        )
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+
+def _split_strings(content: memoryview, num_strings: int) -> list[str]:
+    if num_strings == 0:
+        return []
+    return bytes(content).decode().split("\0")
+
+
+def _padded_length(length: int) -> int:
+    return (length + 7) // 8 * 8
+
+
+def _source_stats(filepath: str) -> list[list[int] | None]:
+    """
+    Return the size and modification time of the archive file and its journal.
+    """
+    stats: list[list[int] | None] = []
+    for source_filepath in (filepath, archive.journal_filepath(filepath)):
+        try:
+            stat = os.stat(source_filepath)
+        except FileNotFoundError:
+            stats.append(None)
+        else:
+            stats.append([stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def _source_hashes(filepath: str) -> list[str | None]:
+    """
+    Return the content hashes of the archive file and its journal.
+    """
+    hashes: list[str | None] = []
+    for source_filepath in (filepath, archive.journal_filepath(filepath)):
+        try:
+            with open(source_filepath, "rb") as f:
+                hashes.append(hashlib.file_digest(f, "sha256").hexdigest())
+        except FileNotFoundError:
+            hashes.append(None)
+    return hashes
+
+
+def parse_pence(price: str) -> int:
+    """
+    Convert the passed price string in pounds to pence.
+    """
+    return round(float(price) * 100)
+
+
+def format_pence(pence: int) -> str:
+    """
+    Convert the passed price in pence to a string in pounds, as it's stored in the archive.
+    """
+    return f"{pence / 100:.2f}"
+
+
+def format_day(day: int) -> str:
+    """
+    Convert the passed day number to a YYYY-MM-DD date string, as it's stored in the archive.
+    """
+    return datetime.date.fromordinal(day).isoformat()
@@ -0,0 +1,199 @@
+import contextlib
+import itertools
+import sqlite3
+from collections.abc import Iterator
+
+from chow import archive
+
+# Price changes are keyed by product ID and their position in the product's price history, so the
+# primary key doubles as the index for looking up a product's prices.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS price_changes (
+    product_id TEXT NOT NULL REFERENCES products (id),
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    price TEXT NOT NULL,
+    PRIMARY KEY (product_id, position)
+);
+CREATE INDEX IF NOT EXISTS price_changes_date ON price_changes (date);
+"""
+
+
+@contextlib.contextmanager
+def _connect(filepath: str) -> Iterator[sqlite3.Connection]:
+    """
+    Yield a connection to the passed database, creating the tables if needed.
+
+    Changes are committed in a single transaction when the block exits, or rolled back if it
+    raises.
+    """
+    with contextlib.closing(sqlite3.connect(filepath)) as connection:
+        connection.executescript(_SCHEMA)
+        with connection:
+            yield connection
+
+
+def load(filepath: str) -> archive.ArchiveProductMap:
+    """
+    Return the product archive data structure stored in the passed database.
+    """
+    with _connect(filepath) as connection:
+        products: archive.ArchiveProductMap = {}
+        for product_id, name, removed in connection.execute(
+            "SELECT id, name, removed FROM products ORDER BY rowid"
+        ):
+            products[product_id] = {
+                "name": name,
+                "removed": bool(removed),
+                "prices": [],
+            }
+
+        for product_id, date, price in connection.execute(
+            "SELECT product_id, date, price FROM price_changes ORDER BY product_id, position"
+        ):
+            products[product_id]["prices"].append({"date": date, "price": price})
+
+    return products
+
+
+def iter_products(
+    filepath: str,
+) -> Iterator[tuple[str, archive.ProductPriceHistory]]:
+    """
+    Yield the ID and price history of each product stored in the passed database, one at a time.
+    """
+    with _connect(filepath) as connection:
+        rows = connection.execute(
+            """
+            SELECT p.id, p.name, p.removed, c.date, c.price
+            FROM products p LEFT JOIN price_changes c ON c.product_id = p.id
+            ORDER BY p.rowid, c.position
+            """
+        )
+        for (product_id, name, removed), product_rows in itertools.groupby(
+            rows, key=lambda row: row[:3]
+        ):
+            yield (
+                product_id,
+                {
+                    "name": name,
+                    "removed": bool(removed),
+                    "prices": [
+                        {"date": date, "price": price}
+                        for _, _, _, date, price in product_rows
+                        if date is not None
+                    ],
+                },
+            )
+
+
+def save(filepath: str, products: archive.ArchiveProductMap) -> None:
+    """
+    Update the passed database to match the product archive data structure.
+
+    Price histories are expected to only be appended to, so only the price changes that aren't
+    already stored are inserted. A product's stored price changes are replaced if they no longer
+    match the start of its price history.
+    """
+    with _connect(filepath) as connection:
+        # Look up the number of stored price changes for each product, along with the last one.
+        # (SQLite takes the bare columns from the row with the maximum position.)
+        stored_products = {
+            product_id: (name, bool(removed), num_prices, (date, price))
+            for product_id, name, removed, num_prices, date, price in connection.execute(
+                """
+                SELECT p.id, p.name, p.removed, COALESCE(MAX(c.position) + 1, 0), c.date, c.price
+                FROM products p LEFT JOIN price_changes c ON c.product_id = p.id
+                GROUP BY p.id
+                """
+            )
+        }
+
+        for product_id, product in products.items():
+            prices = product["prices"]
+            removed = product.get("removed", False)
+
+            stored_product = stored_products.pop(product_id, None)
+            if stored_product is None:
+                connection.execute(
+                    "INSERT INTO products (id, name, removed) VALUES (?, ?, ?)",
+                    (product_id, product["name"], removed),
+                )
+                num_stored_prices = 0
+            else:
+                name, stored_removed, num_stored_prices, last_price = stored_product
+                if (name, stored_removed) != (product["name"], removed):
+                    connection.execute(
+                        "UPDATE products SET name = ?, removed = ? WHERE id = ?",
+                        (product["name"], removed, product_id),
+                    )
+                if num_stored_prices and (
+                    num_stored_prices > len(prices)
+                    or last_price
+                    != (
+                        prices[num_stored_prices - 1]["date"],
+                        prices[num_stored_prices - 1]["price"],
+                    )
+                ):
+                    connection.execute(
+                        "DELETE FROM price_changes WHERE product_id = ?", (product_id,)
+                    )
+                    num_stored_prices = 0
+
+            connection.executemany(
+                "INSERT INTO price_changes (product_id, position, date, price) VALUES (?, ?, ?, ?)",
+                (
+                    (product_id, position, price_change["date"], price_change["price"])
+                    for position, price_change in enumerate(
+                        prices[num_stored_prices:], start=num_stored_prices
+                    )
+                ),
+            )
+
+        # Remove any products that are no longer in the archive.
+        for product_id in stored_products:
+            connection.execute(
+                "DELETE FROM price_changes WHERE product_id = ?", (product_id,)
+            )
+            connection.execute("DELETE FROM products WHERE id = ?", (product_id,))
+
+
+def save_changes(filepath: str, changes: archive.ChangeSet) -> None:
+    """
+    Insert the passed changes into the passed database, in a single transaction.
+    """
+    with _connect(filepath) as connection:
+        for product_id, product in changes["new_products"].items():
+            connection.execute(
+                "INSERT INTO products (id, name, removed) VALUES (?, ?, ?)",
+                (product_id, product["name"], product.get("removed", False)),
+            )
+            connection.executemany(
+                "INSERT INTO price_changes (product_id, position, date, price) VALUES (?, ?, ?, ?)",
+                (
+                    (product_id, position, price_change["date"], price_change["price"])
+                    for position, price_change in enumerate(product["prices"])
+                ),
+            )
+
+        # Append each price change after the product's last stored price change.
+        connection.executemany(
+            """
+            INSERT INTO price_changes (product_id, position, date, price)
+            SELECT ?, COALESCE(MAX(position) + 1, 0), ?, ? FROM price_changes WHERE product_id = ?
+            """,
+            (
+                (product_id, price_change["date"], price_change["price"], product_id)
+                for product_id, price_change in changes["price_changes"].items()
+            ),
+        )
+
+        connection.executemany(
+            "UPDATE products SET removed = 1 WHERE id = ?",
+            ((product_id,) for product_id in changes["removed_products"]),
+        )
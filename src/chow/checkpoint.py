@@ -0,0 +1,63 @@
+import datetime
+import json
+import pathlib
+import threading
+
+from chow import output
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of the prices fetched during an archive update.
+
+    Each price is written as a line of JSON as soon as it has been fetched, so the prices aren't
+    lost if the update is interrupted. Lines are flushed as they are written, so they survive the
+    process being killed (but not necessarily the machine crashing).
+    """
+
+    def __init__(self, filepath: pathlib.Path) -> None:
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._repaired = False
+
+    def append(self, product_id: str, price: int, date: datetime.date) -> None:
+        """
+        Record the price (in pence) of the passed product on the passed date.
+        """
+        line = json.dumps(
+            {"product_id": product_id, "price": price, "date": date.isoformat()}
+        )
+        with self._lock:
+            # When resuming, drop the incomplete last line left by the interrupted update so the
+            # first price appended isn't joined onto it.
+            if not self._repaired:
+                output.truncate_partial_line(self.filepath)
+                self._repaired = True
+            with self.filepath.open("a") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    def load(self, date: datetime.date) -> dict[str, int]:
+        """
+        Return a dict mapping product IDs to the prices (in pence) recorded on the passed date.
+        """
+        prices: dict[str, int] = {}
+        try:
+            with self.filepath.open() as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        # The last line may be incomplete if the update was interrupted.
+                        continue
+                    if record["date"] == date.isoformat():
+                        prices[record["product_id"]] = record["price"]
+        except FileNotFoundError:
+            pass
+        return prices
+
+    def clear(self) -> None:
+        """
+        Remove the journal.
+        """
+        self.filepath.unlink(missing_ok=True)
@@ -0,0 +1,138 @@
+import contextlib
+import functools
+import hashlib
+import os
+import pathlib
+import tempfile
+from collections.abc import Iterator
+from typing import IO, Any
+
+_BLOCK_SIZE = 4096
+
+
+class OutputWriter:
+    """
+    Writes generated files, leaving files whose content hasn't changed untouched.
+
+    Unchanged files keep their modification times, so they don't churn git or invalidate caches
+    downstream. Changed files are written to a temporary file then renamed so readers never see a
+    partial file.
+    """
+
+    def __init__(self) -> None:
+        self.num_written = 0
+        self.num_skipped = 0
+
+    def write(self, filepath: pathlib.Path, content: str | bytes) -> bool:
+        """
+        Write the passed content to the passed file if it differs from the file's content.
+
+        Returns whether the file was written.
+        """
+        data = content.encode() if isinstance(content, str) else content
+        if _has_content(filepath, data):
+            self.num_skipped += 1
+            return False
+
+        with atomic_write(filepath) as f:
+            f.write(data)
+
+        self.num_written += 1
+        return True
+
+    def summary(self) -> str:
+        """
+        Return a summary of the files written and skipped.
+        """
+        return f"Wrote {self.num_written} files, skipped {self.num_skipped} unchanged files"
+
+
+@contextlib.contextmanager
+def atomic_write(
+    filepath: pathlib.Path, mode: str = "wb", fsync: bool = False
+) -> Iterator[IO[Any]]:
+    """
+    Open a temporary file to write the content of the passed file, which it replaces on exit.
+
+    Readers never see a partial file, and the temporary file is removed if writing fails. Pass
+    `fsync` to flush the content to disk before the file is replaced, so a crash can't leave it
+    truncated.
+    """
+    # The temporary file is created next to the file so it can be renamed over it.
+    fd, temp_filepath = tempfile.mkstemp(dir=filepath.parent, suffix=".tmp")
+    try:
+        # Temporary files are only readable by their owner so use the usual permissions.
+        os.fchmod(fd, _file_mode(filepath))
+        with os.fdopen(fd, mode) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_filepath, filepath)
+    except BaseException:
+        os.unlink(temp_filepath)
+        raise
+
+
+def truncate_partial_line(filepath: pathlib.Path) -> None:
+    """
+    Remove the incomplete last line left in the passed file by an interrupted append.
+
+    Lines appended afterwards would otherwise be joined onto it. Missing files are ignored.
+    """
+    try:
+        with filepath.open("rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            # Read back from the end of the file in blocks until a newline is found.
+            position = end
+            while position > 0:
+                block_start = max(position - _BLOCK_SIZE, 0)
+                f.seek(block_start)
+                block = f.read(position - block_start)
+                newline_index = block.rfind(b"\n")
+                if newline_index != -1:
+                    position = block_start + newline_index + 1
+                    break
+                position = block_start
+            if position != end:
+                f.truncate(position)
+    except FileNotFoundError:
+        pass
+
+
+def _has_content(filepath: pathlib.Path, data: bytes) -> bool:
+    """
+    Return whether the passed file's content matches the passed data.
+    """
+    try:
+        # Avoid reading the file if its size shows it has changed.
+        if filepath.stat().st_size != len(data):
+            return False
+        with filepath.open("rb") as f:
+            file_hash = hashlib.file_digest(f, "sha256").digest()
+    except FileNotFoundError:
+        return False
+    return file_hash == hashlib.sha256(data).digest()
+
+
+def _file_mode(filepath: pathlib.Path) -> int:
+    """
+    Return the permissions of the passed file, or the permissions of a new file if it doesn't
+    exist.
+    """
+    try:
+        return filepath.stat().st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_umask()
+
+
+@functools.cache
+def _umask() -> int:
+    """
+    Return the process's umask.
+    """
+    # The umask can only be read by setting it, so set a restrictive one while it's restored in
+    # case another thread creates a file in the meantime.
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return umask
@@ -0,0 +1,120 @@
+import collections
+import random
+import threading
+import time
+
+
+class RetryPolicy:
+    """
+    Policy for retrying failed requests with jittered exponential backoff.
+
+    The optional deadline is a budget, in seconds, for the whole run: once it has passed, no more
+    attempts are made.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        deadline: float | None = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._deadline_at = (
+            time.monotonic() + deadline if deadline is not None else None
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Return the delay, in seconds, before retrying after the passed (zero-based) attempt.
+
+        Uses "full jitter" so concurrent retries are spread out rather than synchronised.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def time_remaining(self) -> float | None:
+        """
+        Return the number of seconds until the deadline, or None if there is no deadline.
+        """
+        if self._deadline_at is None:
+            return None
+        return max(0.0, self._deadline_at - time.monotonic())
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker that stops requests to a host once its error rate is too high.
+
+    The breaker opens when at least `failure_threshold` of the last `window` requests failed. While
+    open, requests are rejected until `reset_timeout` seconds have passed, after which a single
+    trial request is allowed. The breaker closes if the trial succeeds and re-opens if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        window: int = 20,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes: collections.deque[bool] = collections.deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Return whether a request can be made.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_progress:
+                    return False
+                self._trial_in_progress = True
+            return True
+
+    def record(self, success: bool) -> None:
+        """
+        Record the outcome of a request.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_progress = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            if len(self._outcomes) == self.window:
+                failure_rate = self._outcomes.count(False) / self.window
+                if failure_rate >= self.failure_threshold:
+                    self._open()
+
+    def release(self) -> None:
+        """
+        Release a request without recording its outcome, so a half-open breaker allows another trial.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_progress = False
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
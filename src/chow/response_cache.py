@@ -0,0 +1,86 @@
+import json
+import os
+import pathlib
+from typing import TypedDict
+
+from chow import output
+
+
+class CacheEntry(TypedDict):
+    # Price in pence.
+    price: int
+    # HTTP validators of the product page the price was extracted from.
+    etag: str | None
+    last_modified: str | None
+
+
+# Default maximum size of the files in the cache folder.
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    Persistent cache of product prices, keyed by product ID.
+
+    Each entry stores the price along with the validators of the page it came from so later fetches
+    can be made conditional. Entries are stored as one JSON file per product. When the total size
+    of the files exceeds `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self, folder: pathlib.Path, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def get(self, product_id: str) -> CacheEntry | None:
+        """
+        Return the cache entry for the passed product, if there is one.
+        """
+        filepath = self._filepath(product_id)
+        try:
+            with filepath.open() as f:
+                entry: CacheEntry = json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+
+        # Record the access for least-recently-used eviction.
+        try:
+            os.utime(filepath)
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def set(self, product_id: str, entry: CacheEntry) -> None:
+        """
+        Store the cache entry for the passed product.
+        """
+        with output.atomic_write(self._filepath(product_id), "w") as f:
+            json.dump(entry, f)
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`.
+
+        Returns the number of entries removed.
+        """
+        entries = []
+        total_bytes = 0
+        for filepath in self.folder.glob("product-*.json"):
+            stat = filepath.stat()
+            entries.append((stat.st_mtime, stat.st_size, filepath))
+            total_bytes += stat.st_size
+
+        num_removed = 0
+        for _, size, filepath in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            filepath.unlink(missing_ok=True)
+            total_bytes -= size
+            num_removed += 1
+
+        return num_removed
+
+    def _filepath(self, product_id: str) -> pathlib.Path:
+        return self.folder / f"product-{product_id}.json"
@@ -0,0 +1,109 @@
+import statistics
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that limits the rate at which requests are made.
+
+    Tokens are added at `rate` per second, up to `capacity`, and each request takes one token.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Take a token, blocking until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Thread-safe limit on the number of requests in flight, adjusted using AIMD.
+
+    The limit increases by one after each limit's worth of successful requests (additive increase)
+    and halves when a request is throttled (multiplicative decrease). Throttled requests that were
+    started before the last decrease don't decrease the limit again, as they reflect the old limit.
+    """
+
+    def __init__(
+        self, initial_limit: int, min_limit: int = 1, max_limit: int = 100
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.latencies: list[float] = []
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Block until a request can be made within the limit.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, started_at: float, throttled: bool) -> None:
+        """
+        Record the outcome of a request started at the passed `time.monotonic()` time, and adjust
+        the limit.
+        """
+        now = time.monotonic()
+        with self._condition:
+            self._in_flight -= 1
+            self.latencies.append(now - started_at)
+            if throttled:
+                if started_at >= self._last_decrease_at:
+                    self.limit = max(self.min_limit, self.limit // 2)
+                    self._last_decrease_at = now
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit = min(self.max_limit, self.limit + 1)
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def latency_percentiles(self) -> dict[int, float]:
+        """
+        Return the 50th, 90th and 99th percentile request latencies, in seconds.
+        """
+        with self._condition:
+            latencies = list(self.latencies)
+        if len(latencies) < 2:
+            return {p: latencies[0] if latencies else 0.0 for p in (50, 90, 99)}
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {p: quantiles[p - 1] for p in (50, 90, 99)}
+
+    def summary(self) -> str:
+        """
+        Return a summary of the current limit and the observed latencies.
+        """
+        percentiles = self.latency_percentiles()
+        return (
+            f"Concurrency limit: {self.limit} (range {self.min_limit}-{self.max_limit}), "
+            f"latency p50={percentiles[50] * 1000:.0f}ms "
+            f"p90={percentiles[90] * 1000:.0f}ms p99={percentiles[99] * 1000:.0f}ms"
+        )
@@ -1,16 +1,56 @@
-from .charts import generate_product_graphs
-from .overview import generate_overview_file
-from .price_fetching import Products, fetch_ocado_price, update_price_archive
-from .product_docs import generate_product_detail_documents
-from .timeline import generate_timeline_file
+import importlib
+from typing import TYPE_CHECKING, Any
+
+from .fetch_options import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_PARSE_WORKERS,
+    FETCH_MODE_PIPELINE,
+    FETCH_MODE_THREADS,
+    FETCH_MODES,
+)
+
+if TYPE_CHECKING:
+    from .charts import generate_product_graphs
+    from .overview import generate_overview_file
+    from .price_fetching import Products, fetch_ocado_price, update_price_archive
+    from .product_docs import generate_product_detail_documents
+    from .site import build_site
+    from .timeline import generate_timeline_file
+
+# Use cases are imported when they are first used, as some of them import slow libraries like
+# matplotlib and requests that most commands don't need.
+_LAZY_ATTRIBUTES = {
+    "generate_product_graphs": "charts",
+    "generate_overview_file": "overview",
+    "Products": "price_fetching",
+    "fetch_ocado_price": "price_fetching",
+    "update_price_archive": "price_fetching",
+    "generate_product_detail_documents": "product_docs",
+    "build_site": "site",
+    "generate_timeline_file": "timeline",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f"{__name__}.{module_name}"), name)
+
 
 # This is required for Mypy - see https://mypy.readthedocs.io/en/stable/command_line.html#cmdoption-mypy-no-implicit-reexport
 __all__ = [
     "generate_product_graphs",
     "generate_overview_file",
     "Products",
+    "FETCH_MODES",
+    "FETCH_MODE_THREADS",
+    "FETCH_MODE_PIPELINE",
+    "DEFAULT_CONCURRENCY",
+    "DEFAULT_PARSE_WORKERS",
     "update_price_archive",
     "fetch_ocado_price",
     "generate_timeline_file",
     "generate_product_detail_documents",
+    "build_site",
 ]
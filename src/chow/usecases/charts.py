@@ -1,46 +1,278 @@
+import array
+import concurrent.futures
 import datetime
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
 import pathlib
+import statistics
+import time
+from collections.abc import Iterator
+from typing import Any, TypedDict
 
+import matplotlib
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import numpy as np
 
-from chow import archive, logger
+from chow import archive, archive_columns, logger, output
+
+# Increment this when changing how charts are drawn so that all charts are re-rendered.
+CHART_VERSION = 2
+
+# The manifest is kept alongside the charts so it's committed with them.
+MANIFEST_FILENAME = "manifest.json"
+
+
+class ChartManifestEntry(TypedDict):
+    fingerprint: str
+    end_date: str  # YYYY-MM-DD
+
+
+# Maps product IDs to the inputs their chart was last rendered from.
+ChartManifest = dict[str, ChartManifestEntry]
 
 
 def generate_product_graphs(
     archive_filepath: pathlib.Path,
     chart_folder: pathlib.Path,
     logger: logger.ConsoleLogger,
+    archive_validation: str = archive.VALIDATION_FULL,
+    refresh_days: int = 1,
+    jobs: int = 1,
 ) -> None:
     """
     Generate price graph images for each produce in the passed archive file.
     """
-    archive_data = archive.load(str(archive_filepath))
+    columns = archive_columns.load(str(archive_filepath), validation=archive_validation)
+    write_product_graphs(columns, chart_folder, logger, refresh_days, jobs)
+
+
+def write_product_graphs(
+    columns: archive_columns.ColumnarArchive,
+    chart_folder: pathlib.Path,
+    logger: logger.ConsoleLogger,
+    refresh_days: int = 1,
+    jobs: int = 1,
+) -> None:
+    """
+    Generate price graph images for each product in the passed columnar archive.
 
+    A chart is only re-rendered if the product's price history or the rendering parameters have
+    changed since it was last rendered, or if it was last extended to today's date at least
+    `refresh_days` days ago. Charts are rendered by `jobs` processes.
+    """
     # Use a consistent max Y value for all graphs.
     # TODO calculate this from the archive data
     max_y_value = 8.0
 
-    for product_id, product_data in archive_data.items():
-        filepath = f"{chart_folder}/product-{product_id}.png"
-        _generate_product_graph(product_data, max_y_value, filepath)
+    today = datetime.date.today()
+    manifest_filepath = chart_folder / MANIFEST_FILENAME
+    previous_manifest = _load_manifest(manifest_filepath)
+    manifest: ChartManifest = {}
+
+    stale_indexes: list[int] = []
+    for index, product_id in enumerate(columns.product_ids):
+        filepath = chart_folder / f"product-{product_id}.png"
+        fingerprint = _chart_fingerprint(columns, index, max_y_value)
+        previous_entry = previous_manifest.get(product_id)
+        if (
+            previous_entry is not None
+            and previous_entry["fingerprint"] == fingerprint
+            and _is_recent(previous_entry["end_date"], today, refresh_days)
+            and filepath.exists()
+        ):
+            manifest[product_id] = previous_entry
+            continue
+
+        stale_indexes.append(index)
+        manifest[product_id] = ChartManifestEntry(
+            fingerprint=fingerprint, end_date=today.isoformat()
+        )
+
+    writer = output.OutputWriter()
+    durations: list[float] = []
+    for index, (content, duration) in zip(
+        stale_indexes,
+        _render_charts(columns, stale_indexes, max_y_value, today, jobs),
+    ):
+        writer.write(
+            chart_folder / f"product-{columns.product_ids[index]}.png", content
+        )
+        durations.append(duration)
+
+    writer.write(manifest_filepath, json.dumps(manifest, indent=4, sort_keys=True))
+    logger.info(
+        f"Rendered {len(stale_indexes)} charts, {len(manifest) - len(stale_indexes)} up to date"
+    )
+    if durations:
+        logger.info(
+            f"Render time per chart ({jobs} processes): {_render_time_summary(durations)}"
+        )
+    logger.info(writer.summary())
+
+
+def _render_charts(
+    columns: archive_columns.ColumnarArchive,
+    indexes: list[int],
+    max_y_value: float,
+    end_date: datetime.date,
+    jobs: int,
+) -> Iterator[tuple[bytes, float]]:
+    """
+    Yield the PNG content of the passed products' charts, and the time taken to render each one.
+
+    Charts are yielded in the order of the passed indexes, whether they are rendered in this
+    process or by a pool of `jobs` processes.
+    """
+    charts = (_chart_columns(columns, index) for index in indexes)
+    render = functools.partial(
+        _timed_generate_product_graph, max_y_value=max_y_value, end_date=end_date
+    )
+    if jobs == 1:
+        yield from map(render, charts)
+        return
+
+    # Spawned workers each import matplotlib once and reuse their figure for every chart they
+    # render. Sending charts in chunks keeps the inter-process overhead low.
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        yield from pool.map(
+            render, charts, chunksize=max(1, min(16, len(indexes) // (jobs * 4)))
+        )
+
+
+def _chart_columns(
+    columns: archive_columns.ColumnarArchive, index: int
+) -> archive_columns.ColumnarArchive:
+    """
+    Return a columnar view of just the passed product, which is cheap to send to a worker.
+    """
+    price_range = columns.price_range(index)
+    return archive_columns.ColumnarArchive(
+        product_ids=[columns.product_ids[index]],
+        names=[columns.names[index]],
+        removed=[columns.removed[index]],
+        offsets=array.array("q", [0, len(price_range)]),
+        days=array.array("i", columns.days[price_range.start : price_range.stop]),
+        prices=array.array("i", columns.prices[price_range.start : price_range.stop]),
+    )
+
+
+def _timed_generate_product_graph(
+    columns: archive_columns.ColumnarArchive,
+    max_y_value: float,
+    end_date: datetime.date,
+) -> tuple[bytes, float]:
+    """
+    Return the chart of the only product in the passed columnar view and the time taken to render
+    it.
+
+    This runs in a worker process so it needs to be a module-level function.
+    """
+    start = time.perf_counter()
+    content = _generate_product_graph(columns, 0, max_y_value, end_date)
+    return content, time.perf_counter() - start
+
+
+def _render_time_summary(durations: list[float]) -> str:
+    """
+    Return a summary of the passed chart render times.
+    """
+    if len(durations) > 1:
+        p95 = statistics.quantiles(durations, n=20, method="inclusive")[-1]
+    else:
+        p95 = durations[0]
+    return "{count} charts, mean {mean:.3f}s, median {median:.3f}s, p95 {p95:.3f}s, max {max:.3f}s".format(
+        count=len(durations),
+        mean=statistics.fmean(durations),
+        median=statistics.median(durations),
+        p95=p95,
+        max=max(durations),
+    )
+
+
+def _chart_fingerprint(
+    columns: archive_columns.ColumnarArchive, index: int, max_y_value: float
+) -> str:
+    """
+    Return a hash of the inputs of the passed product's chart, apart from its end date.
+    """
+    price_range = columns.price_range(index)
+    fingerprint = hashlib.sha256()
+    fingerprint.update(
+        json.dumps(
+            [
+                CHART_VERSION,
+                matplotlib.__version__,  # type: ignore[attr-defined]
+                max_y_value,
+                columns.names[index],
+            ]
+        ).encode()
+    )
+    fingerprint.update(
+        array.array("i", columns.days[price_range.start : price_range.stop]).tobytes()
+    )
+    fingerprint.update(
+        array.array("i", columns.prices[price_range.start : price_range.stop]).tobytes()
+    )
+    return fingerprint.hexdigest()
+
+
+def _is_recent(end_date: str, today: datetime.date, refresh_days: int) -> bool:
+    """
+    Return whether a chart extended to the passed end date doesn't need refreshing yet.
+    """
+    try:
+        days_since = (today - datetime.date.fromisoformat(end_date)).days
+    except ValueError:
+        return False
+    return 0 <= days_since < refresh_days
+
+
+def _load_manifest(filepath: pathlib.Path) -> ChartManifest:
+    """
+    Return the chart manifest stored in the passed file.
+
+    The manifest is only a cache, so an empty manifest is returned if the file is missing or can't
+    be read and all charts are re-rendered.
+    """
+    try:
+        with filepath.open() as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+    if not isinstance(manifest, dict) or not all(
+        isinstance(entry, dict)
+        and isinstance(entry.get("fingerprint"), str)
+        and isinstance(entry.get("end_date"), str)
+        for entry in manifest.values()
+    ):
+        return {}
+    return manifest
 
 
 def _generate_product_graph(
-    product_data: archive.ProductPriceHistory, max_y_value: float, filepath: str
-) -> None:
+    columns: archive_columns.ColumnarArchive,
+    index: int,
+    max_y_value: float,
+    end_date: datetime.date,
+) -> bytes:
     """
-    Generate a price chart PNG file in the passed filepath.
+    Return the content of a price chart PNG file for the passed product.
     """
     # Extract data series.
-    dates, prices = _generate_data_series(product_data, end_date=datetime.date.today())
+    dates, prices = _generate_data_series(columns, index, end_date=end_date)
 
-    # Create graph object. The generated PNG images are 640x480 pixels.
-    figure, axes = plt.subplots()
-    axes.plot(np.array(dates), prices, linestyle="--")  # type: ignore[arg-type]
-    axes.set_title(product_data["name"])
+    # Reuse the graph object, clearing the previous chart.
+    figure, axes = _chart_figure()
+    axes.clear()  # type: ignore[attr-defined]
+    axes.plot(dates, prices, linestyle="--", drawstyle="steps-post")  # type: ignore[call-arg]
+    axes.set_title(columns.names[index])
     axes.set_xlabel("Date")
     axes.set_ylabel("Price")
     axes.grid(True, linestyle="dotted")  # type: ignore[call-arg]
@@ -52,50 +284,58 @@ def _generate_product_graph(
     axes.xaxis.set_major_formatter(formatter)  # type: ignore[attr-defined]
 
     # Ensure Y axis starts at zero and has fixed precision.
-    plt.ylim(0, max_y_value)
+    axes.set_ylim(0, max_y_value)
     axes.yaxis.set_major_formatter(  # type: ignore[attr-defined]
         ticker.FormatStrFormatter("£%.2f")
     )
 
-    # Save to file.
-    figure.savefig(filepath)
+    # Render in memory so the file is only written if the chart has changed.
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")  # type: ignore[arg-type]
 
-    plt.close()
+    return buffer.getvalue()
+
+
+@functools.cache
+def _chart_figure() -> tuple[plt.Figure, plt.Axes]:
+    """
+    Return the graph object that charts are drawn on, creating it the first time.
+
+    The generated PNG images are 640x480 pixels.
+    """
+    return plt.subplots()
 
 
 def _generate_data_series(
-    product_data: archive.ProductPriceHistory, end_date: datetime.date
-) -> tuple[list[datetime.date], list[float]]:
-    """
-    Return data series based on the product price-change data.
-    """
-    dates: list[datetime.date] = []
-    prices: list[float] = []
-
-    for price_change in product_data["prices"]:
-        date = datetime.date.fromisoformat(price_change["date"])
-        price = float(price_change["price"])
-        if len(dates) == 0:
-            # First iteration, add first data point.
-            dates.append(date)
-            prices.append(price)
-        else:
-            # Fill in dates and prices for gap.
-            previous_date = dates[-1]
-            previous_price = prices[-1]
-            delta = date - previous_date
-            for x in range(1, delta.days):
-                dates.append(previous_date + datetime.timedelta(days=x))
-                prices.append(previous_price)
-
-            # Add price change point.
-            dates.append(date)
-            prices.append(price)
-
-    # Append price points up to today's date.
-    final_delta = end_date - date
-    for x in range(1, final_delta.days + 1):
-        dates.append(date + datetime.timedelta(days=x))
-        prices.append(price)
-
-    return dates, prices
+    columns: archive_columns.ColumnarArchive, index: int, end_date: datetime.date
+) -> tuple[np.ndarray[Any], np.ndarray[Any]]:
+    """
+    Return data series of the passed product's price changes, extended to the passed end date.
+
+    The series only holds the price change points, as day-precision dates and prices in pounds,
+    so it should be drawn as a step plot where each price holds until the next change.
+    """
+    price_range = columns.price_range(index)
+    days: np.ndarray[Any] = np.array(
+        columns.days[price_range.start : price_range.stop],  # type: ignore[arg-type]
+        dtype=np.int64,
+    )
+    prices: np.ndarray[Any] = (
+        np.array(
+            columns.prices[price_range.start : price_range.stop],  # type: ignore[arg-type]
+            dtype=np.float64,
+        )
+        / 100
+    )
+
+    # Hold the latest price up to the end date.
+    end_day = end_date.toordinal()
+    if len(days) and days[-1] < end_day:
+        days = np.append(days, [end_day])
+        prices = np.append(prices, [prices[-1]])
+
+    return (days - _EPOCH_DAY).astype("datetime64[D]"), prices  # type: ignore[call-overload]
+
+
+# Day numbers are counted from 0001-01-01 but NumPy dates are counted from 1970-01-01.
+_EPOCH_DAY = datetime.date(1970, 1, 1).toordinal()
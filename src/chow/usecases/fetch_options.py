@@ -0,0 +1,16 @@
+import os
+
+# These are kept apart from the price fetching use case so the CLI can use them without importing
+# its dependencies.
+
+# Fetch modes for update_price_archive: a pool of threads, or a pipeline of download threads feeding
+# a pool of parser processes.
+FETCH_MODE_THREADS = "threads"
+FETCH_MODE_PIPELINE = "pipeline"
+FETCH_MODES = (FETCH_MODE_THREADS, FETCH_MODE_PIPELINE)
+
+# The default number of product prices to fetch at the same time.
+DEFAULT_CONCURRENCY = 10
+
+# The default number of processes parsing product pages in pipeline mode.
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 1
@@ -1,6 +1,6 @@
 import pathlib
 
-from chow import archive, logger
+from chow import archive, archive_columns, logger, output
 
 
 def generate_overview_file(
@@ -8,22 +8,39 @@ def generate_overview_file(
     charts_folder: pathlib.Path,
     overview_filepath: pathlib.Path,
     logger: logger.ConsoleLogger,
+    archive_validation: str = archive.VALIDATION_FULL,
 ) -> None:
     """
     Generate an overview markdown file.
     """
-    products_data = archive.load(str(archive_filepath))
+    columns = archive_columns.load(str(archive_filepath), validation=archive_validation)
+    write_overview_file(columns, charts_folder, overview_filepath, logger)
 
-    with overview_filepath.open("w") as f:
-        f.write("# Product price charts\n")
 
-        for product_id, product_data in products_data.items():
-            image_file = charts_folder / f"product-{product_id}.png"
-            if not image_file.exists():
-                continue
-            image_url = image_file.relative_to(overview_filepath.parent)
-            # Size images so they float two per row.
-            line = '<img align="left" style="width:48%" alt="{name}" src="{image_url}" />\n'.format(
-                name=product_data["name"], image_url=str(image_url)
-            )
-            f.write(line)
+def write_overview_file(
+    columns: archive_columns.ColumnarArchive,
+    charts_folder: pathlib.Path,
+    overview_filepath: pathlib.Path,
+    logger: logger.ConsoleLogger,
+) -> None:
+    """
+    Generate an overview markdown file for the passed columnar archive.
+
+    Only products whose chart exists are included, so this should run after the charts have been
+    generated.
+    """
+    lines = ["# Product price charts\n"]
+    for product_id, name in zip(columns.product_ids, columns.names):
+        image_file = charts_folder / f"product-{product_id}.png"
+        if not image_file.exists():
+            continue
+        image_url = image_file.relative_to(overview_filepath.parent)
+        # Size images so they float two per row.
+        line = '<img align="left" style="width:48%" alt="{name}" src="{image_url}" />\n'.format(
+            name=name, image_url=str(image_url)
+        )
+        lines.append(line)
+
+    writer = output.OutputWriter()
+    writer.write(overview_filepath, "".join(lines))
+    logger.info(writer.summary())
@@ -1,12 +1,21 @@
+import codecs
 import concurrent.futures
-import copy
 import datetime
-from typing import TypedDict
+import functools
+import html.parser
+import multiprocessing
+import pathlib
+import queue
+import threading
+import time
+from collections.abc import Callable
+from typing import TypedDict, TypeVar
 
-import bs4
 import requests
+import requests.adapters
 
-from chow import archive, logger
+from chow import archive, checkpoint, logger, resilience, response_cache, throttling
+from chow.usecases import fetch_options
 
 
 class Product(TypedDict):
@@ -19,103 +28,825 @@ Products = list[Product]
 # A private type associating prices with products.
 _ProductPrices = list[tuple[Product, int]]
 
+# A private type for functions that return the price (in pence) of the passed product ID.
+# Raises UnableToFetchPrice.
+_PriceFetcher = Callable[[str], int]
+
+# A private type for functions that are called with each product price as soon as it is known.
+_PriceCallback = Callable[[Product, int], None]
+
+
+class _ProductPage(TypedDict):
+    content: str
+    # HTTP validators that can be used to make a later request for the page conditional.
+    etag: str | None
+    last_modified: str | None
+
+
+# A private type for functions that return the passed product ID's detail page.
+# Raises UnableToFetchPrice.
+_PageFetcher = Callable[[str], _ProductPage]
+
+# Base URL of the Ocado site. Overridden in benchmarks to point at a local stub server.
+OCADO_BASE_URL = "https://www.ocado.com"
+
+# Use a realistic user agent when fetching product pages.
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
 
 def update_price_archive(
-    products: Products, archive_filepath: str, logger: logger.ConsoleLogger
+    products: Products,
+    archive_filepath: str,
+    logger: logger.ConsoleLogger,
+    fetch_mode: str = fetch_options.FETCH_MODE_THREADS,
+    concurrency: int = fetch_options.DEFAULT_CONCURRENCY,
+    stream: bool = False,
+    parse_workers: int = fetch_options.DEFAULT_PARSE_WORKERS,
+    cache: response_cache.ResponseCache | None = None,
+    offline: bool = False,
+    rate_limit: float | None = None,
+    adaptive: bool = False,
+    retry_policy: resilience.RetryPolicy | None = None,
+    resume: bool = False,
+    archive_validation: str = archive.VALIDATION_FULL,
+    append_to_journal: bool = False,
 ) -> str:
     """
     Fetch prices for the passed products and update the price archive.
+
+    Pass a response cache to make conditional requests for product pages, or to replay cached
+    prices without making any requests in offline mode. The cache isn't used in pipeline mode.
+
+    Pass a rate limit to cap the requests made per second. In adaptive mode, the number of
+    requests in flight starts low and is adjusted between 1 and `concurrency` depending on whether
+    Ocado throttles the requests.
+
+    Pass a retry policy to retry temporary errors with backoff, and to stop making requests while
+    Ocado's error rate is high. Products that still can't be fetched because of temporary errors
+    are left unchanged in the archive, rather than being marked as removed.
+
+    Each fetched price is recorded in a checkpoint journal next to the archive file. In resume
+    mode, products whose prices were recorded today by an interrupted update aren't fetched again.
+
+    Pass `append_to_journal` to append the changes to the archive's journal rather than rewriting
+    the archive file. The journal is folded into the archive by `archive.compact`.
+
+    The IDs of the changed products are recorded next to the archive file, so that product
+    documents can be regenerated for just those products.
     """
-    # Fetch product prices.
-    product_prices, missing_products = _fetch_product_prices(products, logger)
+    price_date = datetime.date.today()
+
+    # Load prices already fetched today by an interrupted update, or start a new journal.
+    journal = checkpoint.CheckpointJournal(
+        pathlib.Path(f"{archive_filepath}.checkpoint")
+    )
+    journalled_prices = journal.load(price_date) if resume else {}
+    if not resume:
+        journal.clear()
+    if journalled_prices:
+        logger.info(f"Resuming with {len(journalled_prices)} prices from checkpoint")
+    products_to_fetch = [
+        product
+        for product in products
+        if product["ocado_product_id"] not in journalled_prices
+    ]
+
+    def on_price(product: Product, price: int) -> None:
+        journal.append(product["ocado_product_id"], price, price_date)
+
+    rate_limiter = throttling.TokenBucket(rate_limit) if rate_limit else None
+    concurrency_limiter = (
+        throttling.AdaptiveConcurrencyLimiter(
+            initial_limit=min(fetch_options.DEFAULT_CONCURRENCY, concurrency),
+            max_limit=concurrency,
+        )
+        if adaptive
+        else None
+    )
+
+    circuit_breaker = resilience.CircuitBreaker() if retry_policy else None
+
+    # Fetch product prices, sharing one pool of keep-alive connections between all fetches.
+    with _create_session(pool_size=concurrency) as session:
+        fetch_price = _retry(
+            _throttle(
+                functools.partial(
+                    fetch_ocado_price,
+                    logger=logger,
+                    session=session,
+                    stream=stream,
+                    cache=cache,
+                    offline=offline,
+                ),
+                rate_limiter,
+                concurrency_limiter,
+            ),
+            retry_policy,
+            circuit_breaker,
+            logger,
+        )
+        if fetch_mode == fetch_options.FETCH_MODE_PIPELINE:
+            fetch_page = _retry(
+                _throttle(
+                    functools.partial(
+                        _fetch_product_page,
+                        logger=logger,
+                        session=session,
+                        stream=stream,
+                    ),
+                    rate_limiter,
+                    concurrency_limiter,
+                ),
+                retry_policy,
+                circuit_breaker,
+                logger,
+            )
+            product_prices, missing_products = _fetch_product_prices_pipeline(
+                products_to_fetch,
+                logger,
+                download_workers=concurrency,
+                parse_workers=parse_workers,
+                fetch_page=fetch_page,
+                on_price=on_price,
+            )
+        else:
+            product_prices, missing_products = _fetch_product_prices(
+                products_to_fetch,
+                logger,
+                max_workers=concurrency,
+                fetch_price=fetch_price,
+                on_price=on_price,
+            )
+
+        if concurrency_limiter is not None:
+            logger.info(concurrency_limiter.summary())
+
+        if cache is not None:
+            num_evicted = cache.evict()
+            logger.info(f"Evicted {num_evicted} entries from the response cache")
+
+        stats = _connection_stats(session)
+        logger.info(
+            "Made {requests} requests over {connections} connections ({reused} reused)".format(
+                requests=stats["requests"],
+                connections=stats["connections"],
+                reused=stats["requests"] - stats["connections"],
+            )
+        )
+
+    # Merge in the prices from the checkpoint journal.
+    for product in products:
+        product_id = product["ocado_product_id"]
+        if product_id in journalled_prices:
+            product_prices.append((product, journalled_prices[product_id]))
+
+    # Prices are fetched in any order so sort them into the order of the products, to keep the
+    # archive and summary deterministic.
+    product_order = {
+        product["ocado_product_id"]: index for index, product in enumerate(products)
+    }
+    product_prices.sort(
+        key=lambda product_price: product_order[product_price[0]["ocado_product_id"]]
+    )
 
     # Update archive file.
-    current_archive = archive.load(archive_filepath)
-    updated_archive = _update_price_archive(
-        price_date=datetime.date.today(),
+    current_archive = archive.load(archive_filepath, validation=archive_validation)
+    changes = _price_archive_changes(
+        price_date=price_date,
         product_prices=product_prices,
         missing_products=missing_products,
         price_archive=current_archive,
     )
 
     # If the archive has changed, save it and print out a summary of changes.
-    if updated_archive != current_archive:
-        archive.save(archive_filepath, updated_archive)
-        return _change_summary(current_archive, updated_archive)
+    summary = ""
+    if archive.has_changes(changes):
+        if append_to_journal:
+            num_records = archive.append_changes(
+                archive_filepath, current_archive, changes
+            )
+            logger.info(f"Appended {num_records} records to the archive journal")
+        else:
+            archive.save_changes(archive_filepath, current_archive, changes)
+        archive.record_changed_products(archive_filepath, changes)
+        summary = _change_summary(current_archive, changes)
+
+    # The journal is no longer needed once its prices are in the archive.
+    journal.clear()
 
-    return ""
+    return summary
 
 
 def _fetch_product_prices(
-    products: Products, logger: logger.ConsoleLogger
+    products: Products,
+    logger: logger.ConsoleLogger,
+    max_workers: int = fetch_options.DEFAULT_CONCURRENCY,
+    fetch_price: _PriceFetcher | None = None,
+    on_price: _PriceCallback | None = None,
 ) -> tuple[_ProductPrices, Products]:
     """
     Return a list of product prices and a list of products for which prices couldn't be fetched.
     """
+    if fetch_price is None:
+        fetch_price = functools.partial(fetch_ocado_price, logger=logger)
+
+    product_prices: _ProductPrices = []
+    missing_products: Products = []
+
     # Use a thread pool to fetch prices concurrently.
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Create a dict of Future->Product
         future_to_data = {
-            executor.submit(
-                fetch_ocado_price, product["ocado_product_id"], logger
-            ): product
+            executor.submit(fetch_price, product["ocado_product_id"]): product
             for product in products
         }
 
         # Loop over the completed futures and update the product data dict.
-        product_prices: _ProductPrices = []
-        missing_products: Products = []
         for future in concurrent.futures.as_completed(future_to_data):
             product = future_to_data[future]
             try:
                 price = future.result()
+            except _ABANDONED_ERRORS as e:
+                _record_abandoned_product(product, e, logger)
             except UnableToFetchPrice as e:
-                logger.error(
-                    "Unable to fetch price for product {}: {}".format(
-                        product["name"], e
-                    )
-                )
-                missing_products.append(product)
+                _record_missing_product(product, e, missing_products, logger)
             else:
-                logger.info(f"Fetch price of {price} for product {product['name']}")
-                product_prices.append((product, price))
+                _record_product_price(product, price, product_prices, logger, on_price)
 
     return product_prices, missing_products
 
 
+def _fetch_product_prices_pipeline(
+    products: Products,
+    logger: logger.ConsoleLogger,
+    download_workers: int,
+    parse_workers: int,
+    fetch_page: _PageFetcher | None = None,
+    on_price: _PriceCallback | None = None,
+) -> tuple[_ProductPrices, Products]:
+    """
+    Return a list of product prices and a list of products for which prices couldn't be fetched.
+
+    Pages are downloaded by a pool of threads and put on a bounded queue, from which they are
+    handed to a pool of processes for parsing. Parsing is CPU-bound so doing it in separate
+    processes stops it contending with the downloads for the GIL. When the parsers fall behind,
+    the queue fills up and the downloads pause.
+
+    If the consumer fails (or is interrupted), the downloads that haven't started are cancelled and
+    the ones waiting for space on the queue give up, so the pools can shut down.
+    """
+    if fetch_page is None:
+        fetch_page = functools.partial(_fetch_product_page, logger=logger)
+
+    product_prices: _ProductPrices = []
+    missing_products: Products = []
+
+    # Downloaded page content (or download errors) waiting to be parsed.
+    max_queued_pages = parse_workers * 2
+    pages: queue.Queue[tuple[Product, str | Exception]] = queue.Queue(
+        maxsize=max_queued_pages
+    )
+    download_timings = _StageTimings()
+    parse_timings = _StageTimings()
+    stopping = threading.Event()
+
+    def download(product: Product) -> None:
+        start = time.perf_counter()
+        page: str | Exception
+        try:
+            page = fetch_page(product["ocado_product_id"])["content"]
+        except Exception as e:
+            # Pass all errors to the consumer so it isn't left waiting for this product.
+            page = e
+        download_timings.record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        while not stopping.is_set():
+            try:
+                pages.put((product, page), timeout=_QUEUE_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            break
+        download_timings.record_wait(time.perf_counter() - start)
+
+    with (
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=download_workers
+        ) as downloaders,
+        # Forking a process that's running download threads isn't safe, so parser processes
+        # are spawned.
+        concurrent.futures.ProcessPoolExecutor(
+            max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as parsers,
+    ):
+        for product in products:
+            downloaders.submit(download, product)
+
+        # Every product puts exactly one item on the queue. Submit pages to the parsers, but only
+        # allow a bounded number to be in flight so the queue fills up if parsing falls behind.
+        parsing: dict[concurrent.futures.Future[tuple[int, float]], Product] = {}
+
+        def collect(
+            futures: set[concurrent.futures.Future[tuple[int, float]]],
+        ) -> None:
+            for future in futures:
+                product = parsing.pop(future)
+                try:
+                    price, duration = future.result()
+                except UnableToExtractPrice:
+                    error = UnableToFetchPrice("Unable to extract price from response")
+                    _record_missing_product(product, error, missing_products, logger)
+                else:
+                    parse_timings.record(duration)
+                    _record_product_price(
+                        product, price, product_prices, logger, on_price
+                    )
+
+        unexpected_error: Exception | None = None
+        try:
+            for _ in range(len(products)):
+                start = time.perf_counter()
+                product, page = pages.get()
+                parse_timings.record_wait(time.perf_counter() - start)
+
+                if isinstance(page, _ABANDONED_ERRORS):
+                    _record_abandoned_product(product, page, logger)
+                    continue
+                elif isinstance(page, UnableToFetchPrice):
+                    _record_missing_product(product, page, missing_products, logger)
+                    continue
+                elif isinstance(page, Exception):
+                    # Keep consuming so no download is left blocked on the queue, then re-raise the
+                    # first unexpected error once the stages have shut down.
+                    unexpected_error = unexpected_error or page
+                    continue
+
+                parsing[parsers.submit(_timed_extract_price, page)] = product
+                if len(parsing) >= max_queued_pages:
+                    done, _ = concurrent.futures.wait(
+                        parsing, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    collect(done)
+
+            collect(set(concurrent.futures.wait(parsing).done))
+        except BaseException:
+            # Errors recording prices (or Ctrl-C) stop the consumer, which would leave downloads
+            # blocked on the full queue and the pools waiting for them forever.
+            stopping.set()
+            downloaders.shutdown(wait=False, cancel_futures=True)
+            parsers.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    if unexpected_error is not None:
+        raise unexpected_error
+
+    logger.info(
+        f"Download stage ({download_workers} threads): {download_timings.summary()}"
+    )
+    logger.info(f"Parse stage ({parse_workers} processes): {parse_timings.summary()}")
+
+    return product_prices, missing_products
+
+
+def _timed_extract_price(content: str) -> tuple[int, float]:
+    """
+    Return the price (in pence) from the passed HTML and the time taken to extract it.
+
+    This runs in a parser process so it needs to be a module-level function.
+    """
+    start = time.perf_counter()
+    price = _extract_price(content)
+    return price, time.perf_counter() - start
+
+
+class _StageTimings:
+    """
+    Thread-safe accumulator of the time spent by a pipeline stage.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._count = 0
+        self._busy = 0.0
+        self._waiting = 0.0
+
+    def record(self, duration: float) -> None:
+        """
+        Record the time taken to process one item.
+        """
+        with self._lock:
+            self._count += 1
+            self._busy += duration
+
+    def record_wait(self, duration: float) -> None:
+        """
+        Record time spent blocked on the queue between the stages.
+        """
+        with self._lock:
+            self._waiting += duration
+
+    def summary(self) -> str:
+        average = self._busy / self._count * 1000 if self._count else 0.0
+        return (
+            f"{self._count} pages, {self._busy:.2f}s busy "
+            f"({average:.1f}ms per page), {self._waiting:.2f}s waiting on queue"
+        )
+
+
+_FetchResult = TypeVar("_FetchResult")
+
+
+def _throttle(
+    fetch: Callable[[str], _FetchResult],
+    rate_limiter: throttling.TokenBucket | None,
+    concurrency_limiter: throttling.AdaptiveConcurrencyLimiter | None,
+) -> Callable[[str], _FetchResult]:
+    """
+    Return a version of the passed fetch function that applies the passed limiters.
+    """
+    if rate_limiter is None and concurrency_limiter is None:
+        return fetch
+
+    def throttled_fetch(product_id: str) -> _FetchResult:
+        if concurrency_limiter is not None:
+            concurrency_limiter.acquire()
+        started_at = time.monotonic()
+        throttled = False
+        try:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+                started_at = time.monotonic()
+            return fetch(product_id)
+        except Throttled:
+            throttled = True
+            raise
+        finally:
+            if concurrency_limiter is not None:
+                concurrency_limiter.release(started_at, throttled=throttled)
+
+    return throttled_fetch
+
+
+def _retry(
+    fetch: Callable[[str], _FetchResult],
+    policy: resilience.RetryPolicy | None,
+    circuit_breaker: resilience.CircuitBreaker | None,
+    logger: logger.ConsoleLogger,
+) -> Callable[[str], _FetchResult]:
+    """
+    Return a version of the passed fetch function that retries temporary errors.
+
+    Raises FetchAbandoned if the fetch is given up on because of temporary errors, an open circuit
+    breaker or the policy's deadline passing.
+    """
+    if policy is None:
+        return fetch
+
+    def retrying_fetch(product_id: str) -> _FetchResult:
+        for attempt in range(policy.max_attempts):
+            if policy.time_remaining() == 0:
+                raise FetchAbandoned("Deadline for fetching prices has passed")
+            if circuit_breaker is not None and not circuit_breaker.allow_request():
+                raise FetchAbandoned("Circuit breaker is open")
+
+            success: bool | None = None
+            try:
+                result = fetch(product_id)
+            except TemporarilyUnableToFetchPrice as e:
+                success = False
+                error = e
+            except UnableToFetchPrice:
+                # The host answered, so errors like a missing product don't count as failures.
+                success = True
+                raise
+            else:
+                success = True
+                return result
+            finally:
+                if circuit_breaker is not None:
+                    if success is None:
+                        # The outcome is unknown so free the trial slot of a half-open breaker.
+                        circuit_breaker.release()
+                    else:
+                        circuit_breaker.record(success=success)
+
+            # Back off before retrying, without sleeping past the deadline.
+            if attempt + 1 < policy.max_attempts:
+                delay = policy.backoff(attempt)
+                time_remaining = policy.time_remaining()
+                if time_remaining is not None:
+                    delay = min(delay, time_remaining)
+                logger.debug(
+                    f"Retrying product {product_id} in {delay:.2f}s after error: {error}"
+                )
+                time.sleep(delay)
+
+        raise FetchAbandoned(
+            f"Gave up after {policy.max_attempts} attempts: {error}"
+        ) from error
+
+    return retrying_fetch
+
+
+def _record_product_price(
+    product: Product,
+    price: int,
+    product_prices: _ProductPrices,
+    logger: logger.ConsoleLogger,
+    on_price: _PriceCallback | None = None,
+) -> None:
+    logger.info(f"Fetch price of {price} for product {product['name']}")
+    product_prices.append((product, price))
+    if on_price is not None:
+        on_price(product, price)
+
+
+def _record_missing_product(
+    product: Product,
+    error: Exception,
+    missing_products: Products,
+    logger: logger.ConsoleLogger,
+) -> None:
+    logger.error(
+        "Unable to fetch price for product {}: {}".format(product["name"], error)
+    )
+    missing_products.append(product)
+
+
+def _record_abandoned_product(
+    product: Product,
+    error: Exception,
+    logger: logger.ConsoleLogger,
+) -> None:
+    logger.error(
+        "Gave up fetching price for product {}, leaving it unchanged: {}".format(
+            product["name"], error
+        )
+    )
+
+
+class _ConnectionStats(TypedDict):
+    requests: int
+    connections: int
+
+
+def _create_session(pool_size: int) -> requests.Session:
+    """
+    Return a HTTP session that keeps up to `pool_size` connections per host alive for reuse.
+
+    Sharing one session between all fetches avoids a new TCP and TLS handshake for each product
+    page (and for the redirect to its canonical URL).
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _connection_stats(session: requests.Session) -> _ConnectionStats:
+    """
+    Return the number of requests made by the passed session and connections opened to make them.
+    """
+    stats = _ConnectionStats(requests=0, connections=0)
+    # The same adapter can be mounted for several URL prefixes so make sure each is only counted once.
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        if not isinstance(adapter, requests.adapters.HTTPAdapter):
+            continue
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    return stats
+
+
 class UnableToFetchPrice(Exception):
     pass
 
 
-def fetch_ocado_price(product_id: str, logger: logger.ConsoleLogger) -> int:
+class TemporarilyUnableToFetchPrice(UnableToFetchPrice):
+    """
+    For errors that may not happen if the fetch is retried, like timeouts and server errors.
+    """
+
+
+class Throttled(TemporarilyUnableToFetchPrice):
+    """
+    For when Ocado responds with a status code that asks us to slow down.
+    """
+
+
+class FetchAbandoned(UnableToFetchPrice):
+    """
+    For when a fetch is given up on without knowing whether the product is still available.
+    """
+
+
+# Errors that leave a product unchanged rather than marking it as removed. A temporary error that
+# wasn't retried, like being throttled, says nothing about whether the product is still available.
+_ABANDONED_ERRORS = (FetchAbandoned, TemporarilyUnableToFetchPrice)
+
+# Seconds between checks of whether the pipeline is stopping, while a download waits for space on
+# the queue.
+_QUEUE_POLL_INTERVAL = 0.1
+
+# Status codes that Ocado uses to throttle requests.
+_THROTTLING_STATUS_CODES = (429, 503)
+
+
+def fetch_ocado_price(
+    product_id: str,
+    logger: logger.ConsoleLogger,
+    session: requests.Session | None = None,
+    stream: bool = False,
+    cache: response_cache.ResponseCache | None = None,
+    offline: bool = False,
+) -> int:
     """
     Fetch the price of the passed product from Ocado.
 
+    Pass a session to reuse its pooled connections. In stream mode, the page is read in chunks and
+    the connection is closed as soon as the price has been received.
+
+    Pass a cache to request the page conditionally and reuse the cached price if it hasn't been
+    modified. In offline mode, the cached price is returned without making a request, and products
+    without a cached price are abandoned.
+
     Raises UnableToFetchPrice.
     """
+    cache_entry = cache.get(product_id) if cache is not None else None
+    if offline:
+        if cache_entry is None:
+            raise FetchAbandoned("No cached price available in offline mode")
+        return cache_entry["price"]
+
+    try:
+        page = _fetch_product_page(
+            product_id, logger, session=session, stream=stream, validators=cache_entry
+        )
+    except _PageNotModified:
+        assert cache_entry is not None
+        logger.debug(f"Product {product_id} not modified, using cached price")
+        return cache_entry["price"]
+
+    # Extract price from HTML content.
+    try:
+        price = _extract_price(page["content"])
+    except UnableToExtractPrice:
+        raise UnableToFetchPrice("Unable to extract price from response")
+
+    if cache is not None:
+        cache.set(
+            product_id,
+            response_cache.CacheEntry(
+                price=price, etag=page["etag"], last_modified=page["last_modified"]
+            ),
+        )
+
+    return price
+
+
+class _PageNotModified(Exception):
+    pass
+
+
+def _fetch_product_page(
+    product_id: str,
+    logger: logger.ConsoleLogger,
+    session: requests.Session | None = None,
+    stream: bool = False,
+    validators: response_cache.CacheEntry | None = None,
+) -> _ProductPage:
+    """
+    Return the passed product's detail page.
+
+    In stream mode, the content is truncated after the price container.
+
+    Pass the validators of a previous response to make the request conditional.
+
+    Raises UnableToFetchPrice, or _PageNotModified if the page hasn't changed since the validators
+    were issued.
+    """
     logger.info(f"Fetching price for product {product_id}")
 
     # Construct URL for product detail page. The slug doesn't matter: Ocado will redirect to the
     # canonical URL.
-    url = f"https://www.ocado.com/products/slug-{product_id}"
+    url = f"{OCADO_BASE_URL}/products/slug-{product_id}"
+
+    headers = {"User-Agent": USER_AGENT}
+    if validators is not None:
+        if validators["etag"]:
+            headers["If-None-Match"] = validators["etag"]
+        if validators["last_modified"]:
+            headers["If-Modified-Since"] = validators["last_modified"]
 
-    # Fetch HTML content. Use a realistic user agent.
-    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    # Fetch HTML content.
+    get = session.get if session is not None else requests.get
     try:
-        response = requests.get(url, headers={"User-Agent": user_agent}, timeout=10)
+        response = get(url, headers=headers, timeout=10, stream=stream)
     except requests.exceptions.RequestException as e:
-        raise UnableToFetchPrice(str(e))
+        raise TemporarilyUnableToFetchPrice(str(e))
+
+    if response.status_code == 304 and validators is not None:
+        response.close()
+        raise _PageNotModified()
+
+    if response.status_code in _THROTTLING_STATUS_CODES:
+        response.close()
+        raise Throttled(
+            f"Got status code {response.status_code} from product detail page"
+        )
+
+    if response.status_code >= 500:
+        response.close()
+        raise TemporarilyUnableToFetchPrice(
+            f"Got status code {response.status_code} from product detail page"
+        )
 
     if response.status_code != 200:
+        # Release the connection in case the response is streamed.
+        response.close()
         raise UnableToFetchPrice(
             f"Got status code {response.status_code} from product detail page"
         )
 
-    # Extract price from HTML content.
-    try:
-        return _extract_price(response.text)
-    except UnableToExtractPrice:
-        raise UnableToFetchPrice("Unable to extract price from response")
+    if stream:
+        # Closing a streamed response before the body is consumed drops the connection rather
+        # than returning it to the pool, so the remainder of the page is never downloaded.
+        try:
+            with response:
+                content = _read_until_price_container(response)
+        except requests.exceptions.RequestException as e:
+            raise TemporarilyUnableToFetchPrice(str(e))
+    else:
+        content = response.text
+
+    return _ProductPage(
+        content=content,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+# The number of bytes to read at a time when streaming product pages.
+_STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _read_until_price_container(response: requests.Response) -> str:
+    """
+    Return the content of the passed streamed response, up to the end of the price container.
+
+    The full content is returned if there's no price container.
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+        errors="replace"
+    )
+    extractor = _IncrementalPriceExtractor()
+    for chunk in response.iter_content(chunk_size=_STREAM_CHUNK_SIZE):
+        if extractor.feed(decoder.decode(chunk)):
+            break
+    else:
+        extractor.feed(decoder.decode(b"", final=True))
+
+    return extractor.content
+
+
+class _IncrementalPriceExtractor:
+    """
+    Accumulates a product page, chunk by chunk, until the price container has been received.
+    """
+
+    def __init__(self) -> None:
+        self.content = ""
+        self._marker_index = -1
+        self._scan_from = 0
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Add the next chunk of the page and return whether the price container is now complete.
+        """
+        self.content += chunk
+
+        # Look for the price container marker, allowing for it straddling two chunks.
+        if self._marker_index == -1:
+            self._marker_index = self.content.find(
+                _PRICE_CONTAINER_MARKER, self._scan_from
+            )
+            if self._marker_index == -1:
+                self._scan_from = max(
+                    0, len(self.content) - len(_PRICE_CONTAINER_MARKER)
+                )
+                return False
+            self._scan_from = self._marker_index
+
+        # Then look for the end of the container.
+        if self.content.find("</div>", self._scan_from) == -1:
+            self._scan_from = max(self._scan_from, len(self.content) - len("</div>"))
+            return False
+
+        return True
 
 
 class UnableToExtractPrice(Exception):
@@ -125,7 +856,81 @@ class UnableToExtractPrice(Exception):
 def _extract_price(content: str) -> int:
     """
     Return the price (in pence) from the passed HTML of a product detail page.
+
+    A targeted scan for the price container is tried first as building a tree of the whole page
+    is slow. BeautifulSoup is used as a fallback in case the page markup doesn't match the scan.
     """
+    try:
+        return _extract_price_fast(content)
+    except UnableToExtractPrice:
+        return _extract_price_with_soup(content)
+
+
+# The attribute that marks the element containing the price.
+_PRICE_CONTAINER_MARKER = 'data-test="price-container"'
+
+
+def _extract_price_fast(content: str) -> int:
+    """
+    Return the price (in pence) by only parsing the price container element of the passed HTML.
+    """
+    marker_index = content.find(_PRICE_CONTAINER_MARKER)
+    if marker_index == -1:
+        raise UnableToExtractPrice("No price-container marker found in HTML")
+
+    # Parse from the start of the container's opening tag up to its first closing div tag (the
+    # price span is a direct child).
+    start = content.rfind("<", 0, marker_index)
+    end = content.find("</div>", marker_index)
+    if start == -1 or end == -1:
+        raise UnableToExtractPrice("Price-container element is malformed")
+
+    parser = _PriceContainerParser()
+    parser.feed(content[start : end + len("</div>")])
+    parser.close()
+    if parser.price_text is None:
+        raise UnableToExtractPrice("No price span element in price container div")
+
+    return _parse_price_text(parser.price_text)
+
+
+class _PriceContainerParser(html.parser.HTMLParser):
+    """
+    HTML parser that captures the text of the first span within the price container div.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.price_text: str | None = None
+        self._in_container = False
+        self._in_span = False
+        self._span_text: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "div" and ("data-test", "price-container") in attrs:
+            self._in_container = True
+        elif tag == "span" and self._in_container and self.price_text is None:
+            self._in_span = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "span" and self._in_span:
+            self._in_span = False
+            self.price_text = "".join(self._span_text).strip()
+        elif tag == "div":
+            self._in_container = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_span:
+            self._span_text.append(data)
+
+
+def _extract_price_with_soup(content: str) -> int:
+    """
+    Return the price (in pence) by parsing the whole of the passed HTML with BeautifulSoup.
+    """
+    # BeautifulSoup is slow to import and is only needed if the faster parsers fail.
+    import bs4
+
     soup = bs4.BeautifulSoup(content, "html.parser")
     div = soup.find("div", {"data-test": "price-container"})
     if not div:
@@ -136,6 +941,13 @@ def _extract_price(content: str) -> int:
         raise UnableToExtractPrice("No price span element in price container div")
 
     price_text = span.get_text(strip=True)  # type: ignore[union-attr]
+    return _parse_price_text(price_text)
+
+
+def _parse_price_text(price_text: str) -> int:
+    """
+    Return the price (in pence) from the passed price text, like "£1.90".
+    """
     try:
         price_in_pounds = float(price_text.replace("£", ""))
     except ValueError as e:
@@ -144,23 +956,26 @@ def _extract_price(content: str) -> int:
     return int(price_in_pounds * 100)
 
 
-def _update_price_archive(
+def _price_archive_changes(
     price_date: datetime.date,
     product_prices: _ProductPrices,
     missing_products: Products,
     price_archive: archive.ArchiveProductMap,
-) -> archive.ArchiveProductMap:
+) -> archive.ChangeSet:
     """
-    Return an updated version of the price archive.
+    Return the changes to make to the price archive.
     """
-    # Create a new copy of the archive.
-    updated_archive = copy.deepcopy(price_archive)
+    changes: archive.ChangeSet = {
+        "new_products": {},
+        "price_changes": {},
+        "removed_products": [],
+    }
     for product, price in product_prices:
         price_in_pounds = _convert_pence_to_pounds(price)
         product_id = product["ocado_product_id"]
         if product_id not in price_archive:
             # New product - not currently in archive.
-            updated_archive[product_id] = {
+            changes["new_products"][product_id] = {
                 "name": product["name"],
                 "prices": [
                     {
@@ -175,21 +990,19 @@ def _update_price_archive(
             last_archived_price = price_archive[product_id]["prices"][-1]["price"]
             if price_in_pounds != last_archived_price:
                 # Price is different from latest record - add a new record.
-                updated_archive[product_id]["prices"].append(
-                    {
-                        "date": price_date.isoformat(),
-                        "price": price_in_pounds,
-                    }
-                )
+                changes["price_changes"][product_id] = {
+                    "date": price_date.isoformat(),
+                    "price": price_in_pounds,
+                }
 
-    # Mark any missing products.
+    # Mark any missing products that aren't already marked.
     for product in missing_products:
         product_id = product["ocado_product_id"]
-        product_data = updated_archive.get(product_id)
-        if product_data:
-            updated_archive[product_id]["removed"] = True
+        product_data = price_archive.get(product_id)
+        if product_data and not product_data.get("removed", False):
+            changes["removed_products"].append(product_id)
 
-    return updated_archive
+    return changes
 
 
 def _convert_pence_to_pounds(pence: int) -> str:
@@ -201,46 +1014,36 @@ def _convert_pence_to_pounds(pence: int) -> str:
 
 
 def _change_summary(
-    current_archive: archive.ArchiveProductMap,
-    updated_archive: archive.ArchiveProductMap,
+    current_archive: archive.ArchiveProductMap, changes: archive.ChangeSet
 ) -> str:
     """
     Return a summary of the changes.
     """
-    if current_archive == updated_archive:
+    if not archive.has_changes(changes):
         return ""
 
     # Build a list of changes.
-    changes = []
+    summary_lines = []
 
-    # Look for new products in updated archive.
-    for product_id, product_data in updated_archive.items():
-        if product_id not in current_archive:
-            changes.append("New product: {name}".format(name=product_data["name"]))
+    # List new products.
+    for product_data in changes["new_products"].values():
+        summary_lines.append("New product: {name}".format(name=product_data["name"]))
 
-    # Look for products with new prices (or removed) updated archive.
-    for product_id, product_data in current_archive.items():
-        if product_id not in updated_archive:
-            changes.append("Remove product: {name}".format(name=product_data["name"]))
-        else:
-            updated_product_data = updated_archive[product_id]
-            # Look for name change.
-            if product_data["name"] != updated_product_data["name"]:
-                changes.append(
-                    "Rename product: {name} to {new_name}".format(
-                        name=product_data["name"], new_name=updated_product_data["name"]
-                    )
-                )
-            # Look for price change.
-            if product_data["prices"] != updated_product_data["prices"]:
-                previous_price = product_data["prices"][-1]["price"]
-                new_price = updated_product_data["prices"][-1]["price"]
-                changes.append(
-                    "Price change for {name}: £{old_price} to £{new_price}".format(
-                        name=product_data["name"],
-                        old_price=previous_price,
-                        new_price=new_price,
-                    )
-                )
+    # List products with new prices.
+    for product_id, price_change in changes["price_changes"].items():
+        product_data = current_archive[product_id]
+        summary_lines.append(
+            "Price change for {name}: £{old_price} to £{new_price}".format(
+                name=product_data["name"],
+                old_price=product_data["prices"][-1]["price"],
+                new_price=price_change["price"],
+            )
+        )
+
+    # List products that are no longer available.
+    for product_id in changes["removed_products"]:
+        summary_lines.append(
+            "Remove product: {name}".format(name=current_archive[product_id]["name"])
+        )
 
-    return "Update price archive\n\n{changes}".format(changes="\n".join(changes))
+    return "Update price archive\n\n{changes}".format(changes="\n".join(summary_lines))
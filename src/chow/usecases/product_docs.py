@@ -1,6 +1,14 @@
+import json
 import pathlib
 
-from chow import archive, logger
+from chow import archive, archive_columns, logger, output
+
+# Increment this when changing the product document template so that all documents are
+# regenerated, including in incremental mode.
+TEMPLATE_VERSION = 1
+
+# Maps product IDs to the template version their document was last generated with.
+MANIFEST_FILENAME = "product-docs-manifest.json"
 
 
 def generate_product_detail_documents(
@@ -8,56 +16,128 @@ def generate_product_detail_documents(
     charts_folder: pathlib.Path,
     products_folder: pathlib.Path,
     logger: logger.ConsoleLogger,
+    archive_validation: str = archive.VALIDATION_FULL,
+    incremental: bool = False,
 ) -> None:
     """
     Generate product detail documents in the passed folder.
+
+    In incremental mode, only the documents of the products changed by price archive updates since
+    the documents were last generated are regenerated.
     """
-    products_data = archive.load(str(archive_filepath))
-    for product_id, price_changes in products_data.items():
+    changed_product_ids = (
+        archive.load_changed_products(str(archive_filepath)) if incremental else None
+    )
+    columns = archive_columns.load(str(archive_filepath), validation=archive_validation)
+    write_product_detail_documents(
+        columns, charts_folder, products_folder, logger, changed_product_ids
+    )
+    # All documents are now up to date.
+    archive.clear_changed_products(str(archive_filepath))
+
+
+def write_product_detail_documents(
+    columns: archive_columns.ColumnarArchive,
+    charts_folder: pathlib.Path,
+    products_folder: pathlib.Path,
+    logger: logger.ConsoleLogger,
+    changed_product_ids: set[str] | None = None,
+) -> None:
+    """
+    Generate product detail documents for the passed columnar archive in the passed folder.
+
+    If the IDs of the changed products are passed, only their documents are regenerated, along with
+    any documents that are missing or were generated with a different template version.
+    """
+    manifest_filepath = products_folder / MANIFEST_FILENAME
+    previous_manifest = _load_manifest(manifest_filepath)
+    manifest: dict[str, int] = {}
+
+    writer = output.OutputWriter()
+    num_up_to_date = 0
+    for index, product_id in enumerate(columns.product_ids):
         document_filepath = products_folder / f"product-{product_id}.md"
+        manifest[product_id] = TEMPLATE_VERSION
+        if (
+            changed_product_ids is not None
+            and product_id not in changed_product_ids
+            and previous_manifest.get(product_id) == TEMPLATE_VERSION
+            and document_filepath.exists()
+        ):
+            num_up_to_date += 1
+            continue
+
         # TODO extract function for generating chart filepath.
         chart_filepath = charts_folder / f"product-{product_id}.png"
         chart_url = chart_filepath.relative_to(document_filepath.parent)
-        with open(document_filepath, "w") as f:
-            logger.debug(f"Writing {document_filepath}")
-            f.write(_product_detail_markdown(price_changes, chart_url))
+        markdown = _product_detail_markdown(columns, index, chart_url)
+        if writer.write(document_filepath, markdown):
+            logger.debug(f"Wrote {document_filepath}")
+
+    writer.write(manifest_filepath, json.dumps(manifest, indent=4, sort_keys=True))
+    logger.info(
+        f"Generated {len(manifest) - num_up_to_date} product documents, {num_up_to_date} up to date"
+    )
+    logger.info(writer.summary())
+
+
+def _load_manifest(filepath: pathlib.Path) -> dict[str, int]:
+    """
+    Return the product document manifest stored in the passed file.
+
+    The manifest is only a cache, so an empty manifest is returned if the file is missing or can't
+    be read and all documents are regenerated.
+    """
+    try:
+        with filepath.open() as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+    if not isinstance(manifest, dict):
+        return {}
+    return manifest
 
 
 def _product_detail_markdown(
-    price_changes: archive.ProductPriceHistory, chart_url: pathlib.Path
+    columns: archive_columns.ColumnarArchive, index: int, chart_url: pathlib.Path
 ) -> str:
     """
     Return the markdown for a product detail document.
     """
     # Build a list of (date, description) lines in chronological order.
     date_descriptions: list[tuple[str, str]] = []
-    previous_price: archive.PriceChange | None = None
-    for price_change in price_changes["prices"]:
+    previous_price: int | None = None
+    for position in columns.price_range(index):
+        price = columns.prices[position]
         if previous_price is not None:
             # Determine % change.
-            delta = float(price_change["price"]) - float(previous_price["price"])
-            delta_percentage = delta / float(previous_price["price"]) * 100
+            delta = price / 100 - previous_price / 100
+            delta_percentage = delta / (previous_price / 100) * 100
             abs_delta_percentage = round(abs(delta_percentage))
             description = "{emoji} Changed price from £{previous_price} to £{current_price} ({sign}{abs_delta_percentage}%)".format(
                 emoji="🔴" if delta > 0 else "🟢",
-                previous_price=previous_price["price"],
-                current_price=price_change["price"],
+                previous_price=archive_columns.format_pence(previous_price),
+                current_price=archive_columns.format_pence(price),
                 sign="+" if delta > 0 else "-",
                 abs_delta_percentage=abs_delta_percentage,
             )
         else:
-            description = f"🟡 Added to archive with price £{price_change['price']}"
-        date_descriptions.append((price_change["date"], description))
-        previous_price = price_change
+            description = (
+                f"🟡 Added to archive with price £{archive_columns.format_pence(price)}"
+            )
+        date_descriptions.append(
+            (archive_columns.format_day(columns.days[position]), description)
+        )
+        previous_price = price
 
     # Sort in opposite order so most recent price changes are at the top.
     date_descriptions.reverse()
 
     # Build a list of markdown lines.
-    lines = [f"# {price_changes['name']}", f"![]({chart_url})"]
+    lines = [f"# {columns.names[index]}", f"![]({chart_url})"]
 
     # Add removal status note
-    if price_changes.get("removed", False):
+    if columns.removed[index]:
         lines.append("**Note: This product has been removed from the Ocado catalog.**")
     else:
         lines.append("**Note: This product is still available in the Ocado catalog.**")
@@ -0,0 +1,108 @@
+import concurrent.futures
+import contextlib
+import pathlib
+import time
+from collections.abc import Iterator
+
+from chow import archive, archive_columns, logger
+from chow.usecases import charts, overview, product_docs, timeline
+
+STAGES = (
+    "load archive",
+    "charts",
+    "overview",
+    "timeline",
+    "product documents",
+    "total",
+)
+
+
+def build_site(
+    archive_filepath: pathlib.Path,
+    docs_folder: pathlib.Path,
+    logger: logger.ConsoleLogger,
+    archive_validation: str = archive.VALIDATION_FULL,
+    refresh_days: int = 1,
+    jobs: int = 1,
+    incremental: bool = False,
+) -> dict[str, float]:
+    """
+    Generate the charts, overview, timeline and product documents in the passed docs folder.
+
+    The archive is loaded and validated once and shared by all the generators. The overview only
+    includes products with a chart so it's generated after the charts, but the timeline and product
+    documents are generated in other threads at the same time as them.
+
+    In incremental mode, only the documents of the products changed by price archive updates since
+    the documents were last generated are regenerated.
+
+    Returns the time taken by each stage, in seconds.
+    """
+    charts_folder = docs_folder / "charts"
+    charts_folder.mkdir(exist_ok=True)
+
+    timings: dict[str, float] = {}
+    with _timed(timings, "total"):
+        with _timed(timings, "load archive"):
+            changed_product_ids = (
+                archive.load_changed_products(str(archive_filepath))
+                if incremental
+                else None
+            )
+            columns = archive_columns.load(
+                str(archive_filepath), validation=archive_validation
+            )
+
+        def generate_timeline() -> None:
+            with _timed(timings, "timeline"):
+                timeline.write_timeline_file(
+                    columns, docs_folder / "timeline.md", logger
+                )
+
+        def generate_product_documents() -> None:
+            with _timed(timings, "product documents"):
+                product_docs.write_product_detail_documents(
+                    columns, charts_folder, docs_folder, logger, changed_product_ids
+                )
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(generate)
+                for generate in (generate_timeline, generate_product_documents)
+            ]
+
+            # Pyplot isn't thread-safe so the charts are rendered in the calling thread.
+            with _timed(timings, "charts"):
+                charts.write_product_graphs(
+                    columns, charts_folder, logger, refresh_days, jobs
+                )
+            with _timed(timings, "overview"):
+                overview.write_overview_file(
+                    columns, charts_folder, docs_folder / "overview.md", logger
+                )
+
+            # Re-raise the first error, if any.
+            for future in futures:
+                future.result()
+
+        # All product documents are now up to date.
+        archive.clear_changed_products(str(archive_filepath))
+
+    # Stages finish in any order so report them in a fixed order.
+    logger.info("Stage timings:")
+    for stage in STAGES:
+        logger.info(f"  {stage}: {timings[stage]:.2f}s")
+
+    return timings
+
+
+@contextlib.contextmanager
+def _timed(timings: dict[str, float], stage: str) -> Iterator[None]:
+    """
+    Record the time taken by the block in the passed timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
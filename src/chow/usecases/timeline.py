@@ -1,8 +1,14 @@
 import collections
+import datetime
+import functools
+import heapq
+import itertools
 import pathlib
+import re
+from collections.abc import Iterable, Iterator
 from typing import TypedDict
 
-from chow import archive, logger
+from chow import archive, archive_columns, logger, output
 
 
 class TimelineDate(TypedDict):
@@ -17,38 +23,149 @@ def generate_timeline_file(
     archive_filepath: pathlib.Path,
     timeline_filepath: pathlib.Path,
     logger: logger.ConsoleLogger,
+    archive_validation: str = archive.VALIDATION_FULL,
+    max_days: int | None = None,
+    partitioned: bool = False,
 ) -> None:
     """
-    Generate a timeline document.
+    Generate a timeline document, of the newest `max_days` dates with price changes if passed.
+
+    In partitioned mode, a timeline document is generated for each month, and the passed file is an
+    index of them.
     """
-    products_data = archive.load(str(archive_filepath))
+    columns = archive_columns.load(str(archive_filepath), validation=archive_validation)
+    if partitioned:
+        write_partitioned_timeline_files(
+            columns, timeline_filepath, logger, datetime.date.today()
+        )
+    else:
+        write_timeline_file(columns, timeline_filepath, logger, max_days)
+
 
+def write_timeline_file(
+    columns: archive_columns.ColumnarArchive,
+    timeline_filepath: pathlib.Path,
+    logger: logger.ConsoleLogger,
+    max_days: int | None = None,
+) -> None:
+    """
+    Generate a timeline document for the passed columnar archive.
+    """
     # Convert products data into timeline datastructure.
-    timeline_data = _convert_to_timeline(products_data)
+    timeline_data = _convert_to_timeline(columns, max_days)
+
+    lines = ["# Product price timeline\n"]
+    lines.extend(_timeline_date_lines(timeline_data))
+    lines.extend(_missing_products_lines(columns))
+
+    writer = output.OutputWriter()
+    writer.write(timeline_filepath, "".join(lines))
+    logger.info(writer.summary())
+
+
+def write_partitioned_timeline_files(
+    columns: archive_columns.ColumnarArchive,
+    timeline_filepath: pathlib.Path,
+    logger: logger.ConsoleLogger,
+    today: datetime.date,
+) -> None:
+    """
+    Generate a timeline document for each month with price changes, and an index of them in the
+    passed file.
+
+    Price changes are normally only added to the current month, so the documents of earlier
+    months are left untouched once they exist. The newest existing document is always regenerated
+    too, as it can still get changes after its month has ended, like prices fetched late on its last
+    day. The timeline is read newest first and stops at the first earlier month with a document, so
+    a normal run only reads and writes the current month.
+    """
+    current_month = today.strftime("%Y-%m")
+    newest_month = max(_partition_months(timeline_filepath), default=current_month)
+    closed_before = min(current_month, newest_month)
+    writer = output.OutputWriter()
+    for month, timeline_dates in itertools.groupby(
+        _iter_timeline(columns), key=lambda timeline_date: timeline_date["date"][:7]
+    ):
+        filepath = _partition_filepath(timeline_filepath, month)
+        if month < closed_before and filepath.exists():
+            break
+        lines = [f"# Product price timeline for {_month_name(month)}\n"]
+        lines.extend(_timeline_date_lines(timeline_dates))
+        writer.write(filepath, "".join(lines))
+
+    lines = ["# Product price timeline\n"]
+    for month in sorted(_partition_months(timeline_filepath), reverse=True):
+        partition_url = _partition_filepath(timeline_filepath, month).name
+        lines.append(f"- [{_month_name(month)}](./{partition_url})\n")
+    lines.extend(_missing_products_lines(columns))
+    writer.write(timeline_filepath, "".join(lines))
+    logger.info(writer.summary())
+
+
+def _partition_filepath(timeline_filepath: pathlib.Path, month: str) -> pathlib.Path:
+    """
+    Return the filepath of the timeline document for the passed YYYY-MM month.
+    """
+    return timeline_filepath.with_name(
+        f"{timeline_filepath.stem}-{month}{timeline_filepath.suffix}"
+    )
+
+
+def _partition_months(timeline_filepath: pathlib.Path) -> list[str]:
+    """
+    Return the YYYY-MM months that have a timeline document.
+    """
+    partition_regex = re.compile(
+        rf"^{re.escape(timeline_filepath.stem)}-(\d{{4}}-\d{{2}}){re.escape(timeline_filepath.suffix)}$"
+    )
+    months = []
+    for filepath in timeline_filepath.parent.iterdir():
+        match = partition_regex.match(filepath.name)
+        if match:
+            months.append(match.group(1))
+    return months
+
 
-    missing_products = _generate_missing_products_summary(products_data)
+def _month_name(month: str) -> str:
+    """
+    Return the name of the passed YYYY-MM month, like "November 2022".
+    """
+    return datetime.date.fromisoformat(f"{month}-01").strftime("%B %Y")
+
+
+def _timeline_date_lines(timeline_dates: Iterable[TimelineDate]) -> list[str]:
+    """
+    Return the markdown for the passed timeline dates.
+    """
+    lines = []
+    for timeline_date in timeline_dates:
+        line = f"## {timeline_date['date']}\n"
+        for description in timeline_date["event_descriptions"]:
+            line += f"{description}<br/>\n"
+        lines.append(line)
+    return lines
 
-    with timeline_filepath.open("w") as f:
-        f.write("# Product price timeline\n")
-        for timeline_date in timeline_data:
-            line = f"## {timeline_date['date']}\n"
-            for description in timeline_date["event_descriptions"]:
-                line += f"{description}<br/>\n"
-            f.write(line)
 
-        if missing_products:
-            f.write("## Missing products\n")
-            f.write(f"{missing_products}\n")
+def _missing_products_lines(columns: archive_columns.ColumnarArchive) -> list[str]:
+    """
+    Return the markdown for the section of the products that are missing, if there are any.
+    """
+    missing_products = _generate_missing_products_summary(columns)
+    if not missing_products:
+        return []
+    return ["## Missing products\n", f"{missing_products}\n"]
 
 
-def _generate_missing_products_summary(products_data: archive.ArchiveProductMap) -> str:
+def _generate_missing_products_summary(
+    columns: archive_columns.ColumnarArchive,
+) -> str:
     """
     Return a summary of the products that are missing.
     """
     missing_product_names: list[str] = []
-    for product_id, product_data in products_data.items():
-        if product_data.get("removed", False):
-            missing_product_names.append(product_data["name"])
+    for name, removed in zip(columns.names, columns.removed):
+        if removed:
+            missing_product_names.append(name)
 
     if not missing_product_names:
         return ""
@@ -60,68 +177,132 @@ def _generate_missing_products_summary(products_data: archive.ArchiveProductMap)
     return "\n".join(lines)
 
 
-def _convert_to_timeline(products_data: archive.ArchiveProductMap) -> Timeline:
+def _convert_to_timeline(
+    columns: archive_columns.ColumnarArchive, max_days: int | None = None
+) -> Timeline:
     """
     Convert the archive data into a timeline structure where events are grouped by date.
 
+    Dates are in reverse chronological order, limited to the newest `max_days` dates if passed.
     Events are sorted in reverse price-change percentage order.
     """
-    # Convert archive data into a dict mapping the YYYY-MM-DD date string to a list of
+    if max_days is not None:
+        return list(itertools.islice(_iter_timeline(columns), max_days))
+
+    # The whole history is visited anyway, so grouping it by date then sorting the dates is faster
+    # than merging the product histories. Map the day number to a list of
     # (delta_percentage, change_description) tuples.
-    grouped_changes: dict[str, list[tuple[float, str]]] = collections.defaultdict(list)
-    for product_id, product_data in products_data.items():
-        previous_price_change: archive.PriceChange | None = None
+    grouped_changes: dict[int, list[tuple[float, str]]] = collections.defaultdict(list)
+    for index, product_id in enumerate(columns.product_ids):
+        previous_price: int | None = None
         # Prices are in chronological order.
-        for price_change in product_data["prices"]:
+        for position in columns.price_range(index):
+            price = columns.prices[position]
             # Compute description of change.
             delta_percentage, change_description = _change_summary(
-                product_id, product_data["name"], price_change, previous_price_change
+                product_id, columns.names[index], price, previous_price
             )
 
-            grouped_changes[price_change["date"]].append(
+            grouped_changes[columns.days[position]].append(
                 (delta_percentage, change_description)
             )
-            previous_price_change = price_change
+            previous_price = price
 
     # Sort in reverse chronological order.
-    chronological_changes = sorted(list(grouped_changes.items()), reverse=True)
+    chronological_changes = sorted(grouped_changes.items(), reverse=True)
 
     # Build timeline datastructure.
     timeline = []
-    for date, changes in chronological_changes:
+    for day, changes in chronological_changes:
         event_descriptions = [x[1] for x in sorted(changes, reverse=True)]
-        timeline.append(TimelineDate(date=date, event_descriptions=event_descriptions))
+        timeline.append(
+            TimelineDate(
+                date=archive_columns.format_day(day),
+                event_descriptions=event_descriptions,
+            )
+        )
 
     return timeline
 
 
+def _iter_timeline(columns: archive_columns.ColumnarArchive) -> Iterator[TimelineDate]:
+    """
+    Yield the timeline dates of the archive data in reverse chronological order.
+
+    This is used when only the newest dates are needed.
+
+    Each product's price changes are already in chronological order, so they are merged using a
+    heap of the latest price change of each product that hasn't been yielded yet. Price changes
+    are only visited, and their descriptions formatted, when their date is reached, so yielding the
+    newest dates doesn't read the older history.
+    """
+    # Heap entries are (negated day number, product index, price change position) tuples.
+    heap: list[tuple[int, int, int]] = []
+    for index in range(len(columns)):
+        price_range = columns.price_range(index)
+        if price_range:
+            heap.append(
+                (-columns.days[price_range.stop - 1], index, price_range.stop - 1)
+            )
+    heapq.heapify(heap)
+
+    while heap:
+        negated_day = heap[0][0]
+        # List of (delta_percentage, change_description) tuples.
+        changes: list[tuple[float, str]] = []
+        while heap and heap[0][0] == negated_day:
+            _, index, position = heapq.heappop(heap)
+            changes.append(_price_change_summary(columns, index, position))
+            if position > columns.offsets[index]:
+                heapq.heappush(heap, (-columns.days[position - 1], index, position - 1))
+
+        yield TimelineDate(
+            date=archive_columns.format_day(-negated_day),
+            event_descriptions=[x[1] for x in sorted(changes, reverse=True)],
+        )
+
+
+def _price_change_summary(
+    columns: archive_columns.ColumnarArchive, index: int, position: int
+) -> tuple[float, str]:
+    """
+    Return a tuple of the price delta percentage and a summary of the passed price change.
+    """
+    previous_price = (
+        columns.prices[position - 1] if position > columns.offsets[index] else None
+    )
+    return _change_summary(
+        columns.product_ids[index],
+        columns.names[index],
+        columns.prices[position],
+        previous_price,
+    )
+
+
+# Prices repeat across products and dates, so each is only formatted once.
+_format_pence = functools.lru_cache(maxsize=None)(archive_columns.format_pence)
+
+
 def _change_summary(
     product_id: str,
     product_name: str,
-    current_price_change: archive.PriceChange,
-    previous_price_change: archive.PriceChange | None,
+    current_pence: int,
+    previous_pence: int | None,
 ) -> tuple[float, str]:
     """
     Return a tuple of the price delta percentage and a summary of the price change.
     """
     product_url = f"./product-{product_id}.md"
     delta_percentage: float
-    if previous_price_change is None:
-        summary = f"🟡 [{product_name}]({product_url}) added to archive - price is £{current_price_change['price']}"
+    if previous_pence is None:
+        summary = f"🟡 [{product_name}]({product_url}) added to archive - price is £{_format_pence(current_pence)}"
         delta_percentage = 0
     else:
-        previous_price = float(previous_price_change["price"])
-        current_price = float(current_price_change["price"])
+        previous_price = previous_pence / 100
+        current_price = current_pence / 100
         delta = current_price - previous_price
         delta_percentage = delta / previous_price * 100
         abs_delta_percentage = round(abs(delta) / previous_price * 100)
-        summary = "{emoji} [{name}]({product_url}) changed price from £{previous_price} to £{current_price} ({sign}{abs_delta_percentage}%)".format(
-            emoji="🔴" if delta > 0 else "🟢",
-            name=product_name,
-            product_url=product_url,
-            previous_price=previous_price_change["price"],
-            current_price=current_price_change["price"],
-            sign="+" if delta > 0 else "-",
-            abs_delta_percentage=abs_delta_percentage,
-        )
+        emoji, sign = ("🔴", "+") if delta > 0 else ("🟢", "-")
+        summary = f"{emoji} [{product_name}]({product_url}) changed price from £{_format_pence(previous_pence)} to £{_format_pence(current_pence)} ({sign}{abs_delta_percentage}%)"
     return delta_percentage, summary
@@ -0,0 +1,156 @@
+import datetime
+import http.server
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+import pytest
+
+from chow import archive
+from chow.usecases import price_fetching
+
+
+def pytest_runtest_setup(item: pytest.Item) -> None:
+    # Benchmarks are slow and open local sockets so they only run when explicitly requested, e.g.
+    # with `make benchmark`.
+    if not os.environ.get("CHOW_BENCHMARKS"):
+        pytest.skip("Set CHOW_BENCHMARKS=1 to run benchmarks")
+
+
+class StubOcadoServer(http.server.ThreadingHTTPServer):
+    """
+    Local HTTP server that serves the same product page for every product URL.
+    """
+
+    daemon_threads = True
+    # Allow plenty of queued connections so the server isn't the bottleneck.
+    request_queue_size = 512
+
+    def __init__(self, page: bytes, latency: float) -> None:
+        super().__init__(("127.0.0.1", 0), _StubOcadoHandler)
+        self.page = page
+        self.latency = latency
+        # Simulate limited bandwidth by pausing between each chunk of the page.
+        self.chunk_size = 16 * 1024
+        self.chunk_delay = 0.0
+        self.bytes_sent = 0
+        # Simulate throttling by responding with a 429 when too many requests are in flight.
+        self.max_in_flight: int | None = None
+        self.in_flight = 0
+        self.num_throttled = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+
+class _StubOcadoHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubOcadoServer
+
+    def do_GET(self) -> None:
+        if not re.match(r"^/products/slug-\d+$", self.path):
+            self.send_error(404)
+            return
+
+        with self.server.lock:
+            max_in_flight = self.server.max_in_flight
+            if max_in_flight is not None and self.server.in_flight >= max_in_flight:
+                self.server.num_throttled += 1
+                throttled = True
+            else:
+                self.server.in_flight += 1
+                throttled = False
+        if throttled:
+            self.send_error(429)
+            return
+
+        try:
+            self._send_page()
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def _send_page(self) -> None:
+        # Simulate network and server latency.
+        time.sleep(self.server.latency)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.server.page)))
+        self.end_headers()
+
+        page, chunk_size = self.server.page, self.server.chunk_size
+        try:
+            for i in range(0, len(page), chunk_size):
+                self.wfile.write(page[i : i + chunk_size])
+                self.server.bytes_sent += len(page[i : i + chunk_size])
+                time.sleep(self.server.chunk_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading once it had the price.
+            self.close_connection = True
+
+    def log_message(self, format: str, *args: object) -> None:
+        # Keep benchmark output readable.
+        pass
+
+
+@pytest.fixture
+def stub_server(
+    fixture_path: Callable[[str], str], monkeypatch: pytest.MonkeyPatch
+) -> Iterator[StubOcadoServer]:
+    """
+    Run a stub Ocado server and point the price fetcher at it.
+    """
+    with open(fixture_path("ocado_product.html"), "rb") as f:
+        page = f.read()
+
+    server = StubOcadoServer(page, latency=0.25)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(price_fetching, "OCADO_BASE_URL", server.base_url)
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def build_archive(
+    num_products: int, num_price_changes: int = 20
+) -> archive.ArchiveProductMap:
+    """
+    Return a synthetic archive with the passed number of products and price changes per product.
+    """
+    start_date = datetime.date(2022, 1, 1)
+    return {
+        str(1000000 + i): {
+            "name": f"Product {i}",
+            "prices": [
+                {
+                    "date": (start_date + datetime.timedelta(days=7 * j)).isoformat(),
+                    "price": f"{1 + (i + j) % 500 / 100:.2f}",
+                }
+                for j in range(num_price_changes)
+            ],
+            "removed": i % 10 == 0,
+        }
+        for i in range(num_products)
+    }
+
+
+@pytest.fixture
+def archive_file(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Write a synthetic archive, a few megabytes in size, to a file.
+    """
+    filepath = tmp_path / "archive.json"
+    with filepath.open("w") as f:
+        json.dump(build_archive(2000), f, indent=4)
+    return filepath
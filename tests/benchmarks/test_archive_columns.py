@@ -0,0 +1,31 @@
+import json
+import pathlib
+import time
+import tracemalloc
+
+from chow import archive_columns
+
+
+def test_columnar_view_is_smaller_than_archive(archive_file: pathlib.Path) -> None:
+    with archive_file.open() as f:
+        raw_content = f.read()
+
+    tracemalloc.start()
+    products = json.loads(raw_content)
+    products_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    tracemalloc.start()
+    columns = archive_columns.ColumnarArchive.from_archive(products)
+    columns_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    build_time = time.perf_counter() - start
+
+    print(
+        f"\n{len(columns)} products, {len(columns.prices)} price changes: "
+        f"archive {products_size / 1024 / 1024:.1f}MB, "
+        f"columnar view {columns_size / 1024 / 1024:.1f}MB "
+        f"(built in {build_time * 1000:.0f}ms)"
+    )
+    assert columns_size < products_size
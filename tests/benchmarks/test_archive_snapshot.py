@@ -0,0 +1,55 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+from chow import archive, archive_columns
+
+from .conftest import build_archive
+
+NUM_PRODUCTS = 100_000
+
+# Each loader runs in a fresh interpreter so its peak RSS can be measured in isolation. (The peak
+# RSS reported by getrusage would include the memory of this process at the time of the fork.)
+_LOADER_SCRIPT = """
+import re, time
+from chow import archive, archive_columns
+start = time.perf_counter()
+{load}
+duration = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    print(duration, re.search(r"VmHWM:\\s+(\\d+) kB", f.read()).group(1))
+"""
+
+
+def _measure(load: str, filepath: pathlib.Path) -> tuple[float, int]:
+    script = _LOADER_SCRIPT.format(load=load.format(filepath=str(filepath)))
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    duration, max_rss_kb = output.split()
+    return float(duration), int(max_rss_kb)
+
+
+def test_snapshot_loads_faster_than_json(tmp_path: pathlib.Path) -> None:
+    filepath = tmp_path / "archive.json"
+    with filepath.open("w") as f:
+        json.dump(build_archive(NUM_PRODUCTS, num_price_changes=5), f)
+    archive_columns.write_snapshot(
+        str(filepath), validation=archive.VALIDATION_STRUCTURAL
+    )
+
+    results = {
+        "archive.load": _measure(
+            "archive.load('{filepath}', validation='structural')", filepath
+        ),
+        "snapshot": _measure("archive_columns.load_snapshot('{filepath}')", filepath),
+    }
+
+    size_mb = filepath.stat().st_size / 1024 / 1024
+    print(f"\nLoading {NUM_PRODUCTS} products ({size_mb:.0f}MB of JSON):")
+    for name, (duration, max_rss_kb) in results.items():
+        print(f"  {name}: {duration * 1000:.0f}ms, peak RSS {max_rss_kb / 1024:.0f}MB")
+
+    assert results["snapshot"][0] < results["archive.load"][0]
+    assert results["snapshot"][1] < results["archive.load"][1]
@@ -0,0 +1,42 @@
+import pathlib
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from chow import archive, archive_columns
+
+
+def test_streaming_uses_less_memory_than_load(archive_file: pathlib.Path) -> None:
+    filepath = str(archive_file)
+    results = {}
+    builds: list[tuple[str, Callable[[], archive_columns.ColumnarArchive]]] = [
+        (
+            "archive.load",
+            lambda: archive_columns.ColumnarArchive.from_archive(
+                archive.load(filepath, validation=archive.VALIDATION_STRUCTURAL)
+            ),
+        ),
+        (
+            "archive.iter_products",
+            lambda: archive_columns.ColumnarArchive.from_products(
+                archive.iter_products(
+                    filepath, validation=archive.VALIDATION_STRUCTURAL
+                )
+            ),
+        ),
+    ]
+    for name, build in builds:
+        start = time.perf_counter()
+        tracemalloc.start()
+        build()
+        peak_size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (time.perf_counter() - start, peak_size)
+
+    print("\nBuilding the columnar view:")
+    for name, (duration, peak_size) in results.items():
+        print(
+            f"  {name}: {duration * 1000:.0f}ms, peak {peak_size / 1024 / 1024:.1f}MB"
+        )
+
+    assert results["archive.iter_products"][1] < results["archive.load"][1]
@@ -0,0 +1,73 @@
+import copy
+import datetime
+import time
+
+from chow import archive
+from chow.usecases import price_fetching
+
+from .conftest import build_archive
+
+NUM_PRODUCTS = 100_000
+
+
+def _update_archive(
+    price_archive: archive.ArchiveProductMap, num_changes: int
+) -> tuple[float, float]:
+    """
+    Time building the changes from a price for every product, where `num_changes` prices have
+    changed, and applying them.
+    """
+    product_prices = [
+        (
+            price_fetching.Product(name=product["name"], ocado_product_id=product_id),
+            # Change the price of the first `num_changes` products.
+            _last_price_in_pence(product) + (1 if index < num_changes else 0),
+        )
+        for index, (product_id, product) in enumerate(price_archive.items())
+    ]
+
+    start = time.perf_counter()
+    changes = price_fetching._price_archive_changes(
+        price_date=datetime.date(2024, 1, 1),
+        product_prices=product_prices,
+        missing_products=[],
+        price_archive=price_archive,
+    )
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert archive.has_changes(changes) == (num_changes > 0)
+    archive.apply_changes(price_archive, changes)
+    apply_time = time.perf_counter() - start
+
+    return build_time, apply_time
+
+
+def _last_price_in_pence(product: archive.ProductPriceHistory) -> int:
+    return round(float(product["prices"][-1]["price"]) * 100)
+
+
+def test_update_cost_scales_with_changes() -> None:
+    price_archive = build_archive(NUM_PRODUCTS, num_price_changes=5)
+
+    # The previous approach deep-copied the archive then compared it with the original.
+    start = time.perf_counter()
+    copied_archive = copy.deepcopy(price_archive)
+    assert copied_archive == price_archive
+    deepcopy_time = time.perf_counter() - start
+
+    timings = {
+        num_changes: _update_archive(price_archive, num_changes)
+        for num_changes in (0, 10, 1000, 10_000)
+    }
+
+    print(f"\nUpdating an archive of {NUM_PRODUCTS} products:")
+    print(f"  deepcopy and compare: {deepcopy_time * 1000:.0f}ms")
+    for num_changes, (build_time, apply_time) in timings.items():
+        print(
+            f"  {num_changes} changes: built in {build_time * 1000:.0f}ms, "
+            f"applied in {apply_time * 1000:.1f}ms"
+        )
+
+    assert sum(timings[10]) < deepcopy_time / 10
+    assert timings[10][1] < timings[10_000][1]
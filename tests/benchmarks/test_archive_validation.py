@@ -0,0 +1,41 @@
+import json
+import pathlib
+import timeit
+
+import jsonschema
+
+from chow import archive
+
+ITERATIONS = 3
+
+
+def test_validation_modes(archive_file: pathlib.Path) -> None:
+    filepath = str(archive_file)
+    with archive_file.open() as f:
+        content = json.load(f)
+
+    def _load_uncompiled() -> None:
+        with open(filepath) as f:
+            jsonschema.validate(instance=json.load(f), schema=archive.ARCHIVE_SCHEMA)
+
+    # Record the hash of the validated file so the trusted loads skip validation.
+    archive.load(filepath, validation=archive.VALIDATION_TRUSTED)
+
+    timings = {
+        "uncompiled": timeit.timeit(_load_uncompiled, number=ITERATIONS),
+        **{
+            validation: timeit.timeit(
+                lambda: archive.load(filepath, validation=validation),
+                number=ITERATIONS,
+            )
+            for validation in archive.VALIDATIONS
+        },
+    }
+
+    size_mb = archive_file.stat().st_size / 1024 / 1024
+    print(f"\nLoading {len(content)} products ({size_mb:.1f}MB):")
+    for name, timing in timings.items():
+        print(f"  {name}: {timing / ITERATIONS * 1000:.0f}ms per load")
+
+    assert timings[archive.VALIDATION_STRUCTURAL] < timings[archive.VALIDATION_FULL]
+    assert timings[archive.VALIDATION_TRUSTED] < timings[archive.VALIDATION_FULL]
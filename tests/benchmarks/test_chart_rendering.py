@@ -0,0 +1,32 @@
+import datetime
+import os
+import time
+
+import pytest
+
+from chow import archive_columns
+from chow.usecases import charts
+
+from .conftest import build_archive
+
+
+@pytest.mark.parametrize("jobs", [1, 2, 4])
+def test_chart_rendering(jobs: int) -> None:
+    columns = archive_columns.ColumnarArchive.from_archive(build_archive(100))
+    indexes = list(range(len(columns)))
+    end_date = datetime.date(2023, 6, 1)
+
+    start = time.perf_counter()
+    results = list(charts._render_charts(columns, indexes, 8.0, end_date, jobs))
+    duration = time.perf_counter() - start
+
+    print(
+        f"\n{len(results)} charts with {jobs} processes ({os.cpu_count()} CPUs) in "
+        f"{duration:.2f}s ({len(results) / duration:.0f} charts/s): "
+        f"{charts._render_time_summary([duration for _, duration in results])}"
+    )
+    # Charts are rendered identically whatever the number of processes.
+    assert [content for content, _ in results[:3]] == [
+        charts._generate_product_graph(columns, index, 8.0, end_date)
+        for index in indexes[:3]
+    ]
@@ -0,0 +1,84 @@
+import functools
+import time
+from unittest import mock
+
+import pytest
+
+from chow.usecases import price_fetching
+
+pytestmark = pytest.mark.enable_socket
+
+NUM_PRODUCTS = 200
+
+
+def _products() -> price_fetching.Products:
+    return [
+        price_fetching.Product(name=f"Product {i}", ocado_product_id=str(i))
+        for i in range(NUM_PRODUCTS)
+    ]
+
+
+# Each mode is run at the same concurrencies so their timings can be compared.
+CONCURRENCIES = (10, 50)
+
+
+@pytest.mark.parametrize("concurrency", CONCURRENCIES)
+def test_thread_pool(stub_server, concurrency):
+    start = time.perf_counter()
+    product_prices, missing_products = price_fetching._fetch_product_prices(
+        _products(), logger=mock.Mock(), max_workers=concurrency
+    )
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"\nthreads ({concurrency} workers): {NUM_PRODUCTS} products in {elapsed:.2f}s"
+    )
+    assert len(product_prices) == NUM_PRODUCTS
+    assert missing_products == []
+
+
+def test_shared_session_reuses_connections(stub_server):
+    concurrency = 10
+    with price_fetching._create_session(pool_size=concurrency) as session:
+        start = time.perf_counter()
+        fetch_price = functools.partial(
+            price_fetching.fetch_ocado_price, logger=mock.Mock(), session=session
+        )
+        product_prices, _ = price_fetching._fetch_product_prices(
+            _products(),
+            logger=mock.Mock(),
+            max_workers=concurrency,
+            fetch_price=fetch_price,
+        )
+        elapsed = time.perf_counter() - start
+        stats = price_fetching._connection_stats(session)
+
+    print(
+        f"\nthreads with shared session: {NUM_PRODUCTS} products in {elapsed:.2f}s, "
+        f"{stats['requests']} requests over {stats['connections']} connections"
+    )
+    assert len(product_prices) == NUM_PRODUCTS
+    assert stats["requests"] == NUM_PRODUCTS
+    assert stats["connections"] <= concurrency
+
+
+@pytest.mark.parametrize("concurrency", CONCURRENCIES)
+def test_pipeline(stub_server, concurrency):
+    fetch_page = functools.partial(
+        price_fetching._fetch_product_page, logger=mock.Mock()
+    )
+    start = time.perf_counter()
+    product_prices, missing_products = price_fetching._fetch_product_prices_pipeline(
+        _products(),
+        logger=mock.Mock(info=print),
+        download_workers=concurrency,
+        parse_workers=4,
+        fetch_page=fetch_page,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"pipeline ({concurrency} threads, 4 processes): {NUM_PRODUCTS} products in {elapsed:.2f}s"
+    )
+    assert len(product_prices) == NUM_PRODUCTS
+    assert missing_products == []
@@ -0,0 +1,102 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from .conftest import build_archive
+
+# Import time budgets, in milliseconds on top of the interpreter's own start-up imports, and the
+# slow libraries that each command mustn't import.
+_COMMANDS = [
+    (
+        ["generate-timeline", "archive.json", "timeline.md"],
+        400,
+        {"matplotlib", "numpy", "bs4", "requests"},
+    ),
+    (
+        [
+            "generate-timeline",
+            "--archive-validation=structural",
+            "archive.json",
+            "timeline.md",
+        ],
+        150,
+        {"matplotlib", "numpy", "bs4", "requests", "jsonschema"},
+    ),
+    (
+        ["generate-overview", "archive.json", "charts", "overview.md"],
+        400,
+        {"matplotlib", "numpy", "bs4", "requests"},
+    ),
+    (
+        ["generate-product-documents", "archive.json", "charts", "."],
+        400,
+        {"matplotlib", "numpy", "bs4", "requests"},
+    ),
+    (
+        ["compact-archive", "--archive-validation=structural", "archive.json"],
+        150,
+        {"matplotlib", "numpy", "bs4", "requests", "jsonschema"},
+    ),
+    (
+        ["update-price-archive", "--help"],
+        150,
+        {"matplotlib", "numpy", "bs4", "requests", "jsonschema"},
+    ),
+    (
+        ["generate-graphs", "archive.json", "charts"],
+        2000,
+        {"bs4", "requests"},
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "args,budget,forbidden_modules",
+    _COMMANDS,
+    ids=[" ".join(args[:2]) for args, _, _ in _COMMANDS],
+)
+def test_import_time(
+    tmp_path: pathlib.Path,
+    args: list[str],
+    budget: int,
+    forbidden_modules: set[str],
+) -> None:
+    (tmp_path / "archive.json").write_text(json.dumps(build_archive(10)))
+    (tmp_path / "charts").mkdir()
+
+    baseline, _ = _import_times(tmp_path, ["-c", "pass"])
+    total, modules = _import_times(tmp_path, ["-m", "chow", *args])
+    import_time = (total - baseline) / 1000
+
+    print(f"\nchow {' '.join(args)}: {import_time:.0f}ms of imports")
+    assert not forbidden_modules & modules
+    assert import_time < budget
+
+
+def _import_times(cwd: pathlib.Path, args: list[str]) -> tuple[int, set[str]]:
+    """
+    Return the total import time, in microseconds, of running Python with the passed arguments,
+    and the top-level packages that were imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules = set()
+    # Lines look like "import time:  self [us] | cumulative | imported package", with nested
+    # imports indented.
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip().split(".")[0])
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
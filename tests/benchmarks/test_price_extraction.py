@@ -0,0 +1,23 @@
+import timeit
+
+from chow.usecases import price_fetching
+
+ITERATIONS = 20
+
+
+def test_fast_path_is_quicker_than_full_parse(fixture):
+    content = fixture("ocado_product.html")
+
+    soup_time = timeit.timeit(
+        lambda: price_fetching._extract_price_with_soup(content), number=ITERATIONS
+    )
+    fast_time = timeit.timeit(
+        lambda: price_fetching._extract_price_fast(content), number=ITERATIONS
+    )
+
+    print(
+        f"\nBeautifulSoup: {soup_time / ITERATIONS * 1000:.2f}ms per page, "
+        f"fast path: {fast_time / ITERATIONS * 1000:.3f}ms per page "
+        f"({soup_time / fast_time:.0f}x speedup)"
+    )
+    assert fast_time < soup_time
@@ -0,0 +1,41 @@
+import functools
+import time
+from unittest import mock
+
+import pytest
+
+from chow.usecases import price_fetching
+
+pytestmark = pytest.mark.enable_socket
+
+NUM_PRODUCTS = 50
+
+
+@pytest.mark.parametrize("stream", (False, True), ids=("full", "streamed"))
+def test_page_download(stub_server, stream):
+    # Roughly 16MB/s of bandwidth per connection.
+    stub_server.latency = 0.0
+    stub_server.chunk_delay = 0.001
+
+    products = [
+        price_fetching.Product(name=f"Product {i}", ocado_product_id=str(i))
+        for i in range(NUM_PRODUCTS)
+    ]
+    with price_fetching._create_session(pool_size=10) as session:
+        fetch_price = functools.partial(
+            price_fetching.fetch_ocado_price,
+            logger=mock.Mock(),
+            session=session,
+            stream=stream,
+        )
+        start = time.perf_counter()
+        product_prices, _ = price_fetching._fetch_product_prices(
+            products, logger=mock.Mock(), max_workers=10, fetch_price=fetch_price
+        )
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"\n{'streamed' if stream else 'full'}: {NUM_PRODUCTS} products in {elapsed:.2f}s, "
+        f"{stub_server.bytes_sent / NUM_PRODUCTS / 1024:.0f}KB sent per product"
+    )
+    assert [price for _, price in product_prices] == [190] * NUM_PRODUCTS
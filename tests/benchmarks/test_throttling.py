@@ -0,0 +1,68 @@
+import functools
+import time
+from unittest import mock
+
+import pytest
+
+from chow import throttling
+from chow.usecases import price_fetching
+from tests.benchmarks.conftest import StubOcadoServer
+
+pytestmark = pytest.mark.enable_socket
+
+NUM_PRODUCTS = 200
+CONCURRENCY = 40
+
+
+def _fetch(
+    stub_server: StubOcadoServer,
+    concurrency_limiter: throttling.AdaptiveConcurrencyLimiter | None,
+) -> tuple[list[tuple[price_fetching.Product, int]], float]:
+    products = [
+        price_fetching.Product(name=f"Product {i}", ocado_product_id=str(i))
+        for i in range(NUM_PRODUCTS)
+    ]
+    with price_fetching._create_session(pool_size=CONCURRENCY) as session:
+        fetch_price = price_fetching._throttle(
+            functools.partial(
+                price_fetching.fetch_ocado_price, logger=mock.Mock(), session=session
+            ),
+            None,
+            concurrency_limiter,
+        )
+        start = time.perf_counter()
+        product_prices, _ = price_fetching._fetch_product_prices(
+            products,
+            logger=mock.Mock(),
+            max_workers=CONCURRENCY,
+            fetch_price=fetch_price,
+        )
+        elapsed = time.perf_counter() - start
+    return product_prices, elapsed
+
+
+def test_fixed_concurrency_is_throttled(stub_server):
+    stub_server.max_in_flight = 10
+
+    product_prices, elapsed = _fetch(stub_server, None)
+
+    print(
+        f"\nfixed concurrency {CONCURRENCY}: {len(product_prices)}/{NUM_PRODUCTS} "
+        f"fetched in {elapsed:.2f}s, {stub_server.num_throttled} throttled"
+    )
+
+
+def test_adaptive_concurrency_backs_off(stub_server):
+    stub_server.max_in_flight = 10
+    limiter = throttling.AdaptiveConcurrencyLimiter(
+        initial_limit=CONCURRENCY, max_limit=CONCURRENCY
+    )
+
+    product_prices, elapsed = _fetch(stub_server, limiter)
+
+    print(
+        f"\nadaptive concurrency: {len(product_prices)}/{NUM_PRODUCTS} "
+        f"fetched in {elapsed:.2f}s, {stub_server.num_throttled} throttled\n"
+        f"{limiter.summary()}"
+    )
+    assert limiter.limit <= stub_server.max_in_flight + 1
@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from chow import archive_columns
+from chow.usecases import timeline
+
+from .conftest import build_archive
+
+
+@pytest.mark.parametrize("max_days", [None, 7])
+def test_timeline(max_days: int | None) -> None:
+    columns = archive_columns.ColumnarArchive.from_archive(
+        build_archive(20000, num_price_changes=50)
+    )
+
+    start = time.perf_counter()
+    timeline_dates = timeline._convert_to_timeline(columns, max_days)
+    duration = time.perf_counter() - start
+
+    # The previous approach merged the product histories for the whole timeline too.
+    start = time.perf_counter()
+    merged_timeline_dates = list(timeline._iter_timeline(columns))
+    merge_duration = time.perf_counter() - start
+
+    num_events = sum(len(date["event_descriptions"]) for date in timeline_dates)
+    print(
+        f"\n{len(columns.prices)} price changes, newest {max_days or 'all'} dates: "
+        f"{len(timeline_dates)} dates, {num_events} events in {duration * 1000:.0f}ms, "
+        f"merging all dates: {merge_duration * 1000:.0f}ms"
+    )
+    assert timeline_dates == merged_timeline_dates[:max_days]
+    assert duration < merge_duration
@@ -0,0 +1,143 @@
+import json
+
+import time_machine
+
+import chow.__main__ as main
+
+
+def test_builds_site(runner, tmp_path, tmp_path_factory):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [
+                {"date": "2022-11-01", "price": "3.00"},
+                {"date": "2022-11-05", "price": "4.00"},
+            ],
+        },
+        "124": {
+            "name": "Bread",
+            "removed": True,
+            "prices": [{"date": "2022-11-01", "price": "1.00"}],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    (tmp_path / "archive.json.changed").write_text("123\n")
+    docs_folder = tmp_path_factory.mktemp("docs")
+
+    with time_machine.travel("2022-11-10T14:00"):
+        result = runner.invoke(
+            main.cli, args=["build-site", str(archive_file), str(docs_folder)]
+        )
+    assert result.exit_code == 0, result.exception
+
+    assert (docs_folder / "charts" / "product-123.png").is_file()
+    assert (docs_folder / "charts" / "product-124.png").is_file()
+    assert (docs_folder / "product-123.md").is_file()
+    assert (docs_folder / "product-124.md").is_file()
+    # The overview is generated after the charts so includes them.
+    assert (docs_folder / "overview.md").read_text().count("<img") == 2
+    assert "## Missing products" in (docs_folder / "timeline.md").read_text()
+
+    # All product documents are up to date so the list of changed products is cleared.
+    assert not (tmp_path / "archive.json.changed").exists()
+
+    assert "Stage timings:" in result.output
+    for stage in ["load archive", "charts", "overview", "timeline", "total"]:
+        assert f"  {stage}: " in result.output
+
+
+def test_matches_separate_commands(runner, tmp_path, tmp_path_factory):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [
+                {"date": "2022-11-01", "price": "3.00"},
+                {"date": "2022-11-05", "price": "4.00"},
+            ],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    site_folder = tmp_path_factory.mktemp("site")
+    docs_folder = tmp_path_factory.mktemp("docs")
+    charts_folder = docs_folder / "charts"
+    charts_folder.mkdir()
+
+    with time_machine.travel("2022-11-10T14:00"):
+        for args in [
+            ["build-site", str(archive_file), str(site_folder)],
+            ["generate-graphs", str(archive_file), str(charts_folder)],
+            [
+                "generate-overview",
+                str(archive_file),
+                str(charts_folder),
+                str(docs_folder / "overview.md"),
+            ],
+            ["generate-timeline", str(archive_file), str(docs_folder / "timeline.md")],
+            [
+                "generate-product-documents",
+                str(archive_file),
+                str(charts_folder),
+                str(docs_folder),
+            ],
+        ]:
+            result = runner.invoke(main.cli, args=args)
+            assert result.exit_code == 0, result.exception
+
+    site_files = sorted(
+        path.relative_to(site_folder) for path in site_folder.rglob("*")
+    )
+    assert site_files == sorted(
+        path.relative_to(docs_folder) for path in docs_folder.rglob("*")
+    )
+    for path in site_files:
+        if (site_folder / path).is_file():
+            assert (site_folder / path).read_bytes() == (
+                docs_folder / path
+            ).read_bytes()
+
+
+def test_incremental_mode_only_regenerates_changed_products(
+    runner, tmp_path, tmp_path_factory
+):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [{"date": "2022-11-01", "price": "3.00"}],
+        },
+        "124": {
+            "name": "Bread",
+            "prices": [{"date": "2022-11-01", "price": "1.00"}],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    docs_folder = tmp_path_factory.mktemp("docs")
+
+    def build_site() -> str:
+        with time_machine.travel("2022-11-10T14:00"):
+            result = runner.invoke(
+                main.cli,
+                args=[
+                    "build-site",
+                    str(archive_file),
+                    str(docs_folder),
+                    "--incremental",
+                ],
+            )
+        assert result.exit_code == 0, result.exception
+        return str(result.output)
+
+    assert "Generated 2 product documents, 0 up to date" in build_site()
+
+    # Change both products but only record one of them as changed.
+    archive_data["123"]["prices"].append({"date": "2022-11-05", "price": "4.00"})
+    archive_data["124"]["prices"].append({"date": "2022-11-05", "price": "2.00"})
+    archive_file.write_text(json.dumps(archive_data))
+    (tmp_path / "archive.json.changed").write_text("123\n")
+
+    assert "Generated 1 product documents, 1 up to date" in build_site()
+    assert "£4.00" in (docs_folder / "product-123.md").read_text()
+    assert "£2.00" not in (docs_folder / "product-124.md").read_text()
+    assert not (tmp_path / "archive.json.changed").exists()
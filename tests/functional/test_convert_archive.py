@@ -0,0 +1,46 @@
+import json
+
+import chow.__main__ as main
+
+
+def test_round_trips_json_archive_through_sqlite(runner, tmp_path):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "removed": False,
+            "prices": [
+                {"date": "2022-11-01", "price": "3.00"},
+                {"date": "2022-11-05", "price": "4.00"},
+            ],
+        },
+    }
+    json_file = tmp_path / "archive.json"
+    json_file.write_text(json.dumps(archive_data))
+    sqlite_file = tmp_path / "archive.db"
+    exported_file = tmp_path / "exported.json"
+
+    result = runner.invoke(
+        main.cli, args=["convert-archive", str(json_file), str(sqlite_file)]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Copied 1 products" in result.output
+
+    result = runner.invoke(
+        main.cli, args=["convert-archive", str(sqlite_file), str(exported_file)]
+    )
+    assert result.exit_code == 0, result.output
+
+    assert json.loads(exported_file.read_text()) == archive_data
+
+
+def test_invalid_json_archive(runner, tmp_path):
+    json_file = tmp_path / "archive.json"
+    json_file.write_text("{")
+
+    result = runner.invoke(
+        main.cli,
+        args=["convert-archive", str(json_file), str(tmp_path / "archive.db")],
+    )
+
+    assert result.exit_code == 1
+    assert "JSON could not be decoded" in result.output
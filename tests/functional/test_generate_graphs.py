@@ -39,3 +39,109 @@ def test_creates_product_graphs(runner, tmp_path, tmp_path_factory):
     # Check chart image file has been created
     chart_path = charts_folder / "product-123.png"
     assert chart_path.exists()
+
+
+def test_skips_unchanged_product_graphs(runner, tmp_path, tmp_path_factory):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [{"date": "2022-11-01", "price": "3.00"}],
+        }
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    charts_folder = tmp_path_factory.mktemp("charts")
+
+    # Run command twice on the same day.
+    with time_machine.travel("2022-11-10T14:00"):
+        for _ in range(2):
+            result = runner.invoke(
+                main.cli,
+                args=["generate-graphs", str(archive_file), str(charts_folder)],
+            )
+            assert result.exit_code == 0, result.exception
+
+    assert "Wrote 0 files, skipped 1 unchanged files" in result.output
+
+
+def test_only_renders_charts_when_inputs_change(runner, tmp_path, tmp_path_factory):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [{"date": "2022-11-01", "price": "3.00"}],
+        },
+        "124": {
+            "name": "Bread",
+            "prices": [{"date": "2022-11-01", "price": "1.00"}],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    charts_folder = tmp_path_factory.mktemp("charts")
+
+    def generate_graphs(now: str, *args: str) -> str:
+        with time_machine.travel(now):
+            result = runner.invoke(
+                main.cli,
+                args=["generate-graphs", str(archive_file), str(charts_folder), *args],
+            )
+        assert result.exit_code == 0, result.exception
+        return str(result.output)
+
+    assert "Rendered 2 charts, 0 up to date" in generate_graphs("2022-11-10T14:00")
+    assert (
+        json.loads((charts_folder / "manifest.json").read_text())["123"]["end_date"]
+        == "2022-11-10"
+    )
+
+    # Only the product with a new price change is re-rendered.
+    archive_data["123"]["prices"].append({"date": "2022-11-10", "price": "3.50"})
+    archive_file.write_text(json.dumps(archive_data))
+    assert "Rendered 1 charts, 1 up to date" in generate_graphs("2022-11-10T18:00")
+
+    # Unchanged charts are extended to today once they are old enough.
+    assert "Rendered 0 charts, 2 up to date" in generate_graphs(
+        "2022-11-12T14:00", "--refresh-days", "7"
+    )
+    assert "Rendered 2 charts, 0 up to date" in generate_graphs("2022-11-12T14:00")
+
+
+def test_parallel_rendering_matches_serial_rendering(
+    runner, tmp_path, tmp_path_factory
+):
+    archive_data = {
+        str(product_id): {
+            "name": f"Product {product_id}",
+            "prices": [
+                {"date": "2022-11-01", "price": "3.00"},
+                {"date": f"2022-11-0{product_id}", "price": f"{product_id}.50"},
+            ],
+        }
+        for product_id in range(2, 6)
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    serial_folder = tmp_path_factory.mktemp("serial")
+    parallel_folder = tmp_path_factory.mktemp("parallel")
+
+    with time_machine.travel("2022-11-10T14:00"):
+        for folder, jobs in [(serial_folder, "1"), (parallel_folder, "2")]:
+            result = runner.invoke(
+                main.cli,
+                args=[
+                    "generate-graphs",
+                    str(archive_file),
+                    str(folder),
+                    "--jobs",
+                    jobs,
+                ],
+            )
+            assert result.exit_code == 0, result.exception
+            assert (
+                f"Render time per chart ({jobs} processes): 4 charts" in result.output
+            )
+
+    for serial_path in serial_folder.iterdir():
+        assert (
+            parallel_folder / serial_path.name
+        ).read_bytes() == serial_path.read_bytes()
@@ -3,6 +3,7 @@ import json
 import time_machine
 
 import chow.__main__ as main
+from chow.usecases import product_docs
 
 
 def test_creates_product_doc(runner, fixture_path, tmp_path, tmp_path_factory):
@@ -65,3 +66,65 @@ def test_creates_product_doc(runner, fixture_path, tmp_path, tmp_path_factory):
         "## 2022-11-01",
         "🟡 Added to archive with price £3.00",
     ]
+
+
+def test_incremental_mode_only_regenerates_changed_products(
+    runner, tmp_path, tmp_path_factory
+):
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [{"date": "2022-11-01", "price": "3.00"}],
+        },
+        "124": {
+            "name": "Bread",
+            "prices": [{"date": "2022-11-01", "price": "1.00"}],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    products_folder = tmp_path_factory.mktemp("products")
+    charts_folder = products_folder / "charts"
+    charts_folder.mkdir()
+
+    def generate_documents() -> str:
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "generate-product-documents",
+                str(archive_file),
+                str(charts_folder),
+                str(products_folder),
+                "--incremental",
+            ],
+        )
+        assert result.exit_code == 0, result.exception
+        return str(result.output)
+
+    # Documents without a manifest entry are generated.
+    assert "Generated 2 product documents, 0 up to date" in generate_documents()
+
+    # Change both products but only record one of them as changed.
+    archive_data["123"]["prices"].append({"date": "2022-11-05", "price": "4.00"})
+    archive_data["124"]["prices"].append({"date": "2022-11-05", "price": "2.00"})
+    archive_file.write_text(json.dumps(archive_data))
+    (tmp_path / "archive.json.changed").write_text("123\n")
+
+    assert "Generated 1 product documents, 1 up to date" in generate_documents()
+    assert "£4.00" in (products_folder / "product-123.md").read_text()
+    assert "£2.00" not in (products_folder / "product-124.md").read_text()
+    assert not (tmp_path / "archive.json.changed").exists()
+
+    # Documents generated with an older template version are regenerated.
+    manifest_file = products_folder / "product-docs-manifest.json"
+    manifest_file.write_text(
+        json.dumps(
+            {
+                "123": product_docs.TEMPLATE_VERSION,
+                "124": product_docs.TEMPLATE_VERSION - 1,
+            }
+        )
+    )
+
+    assert "Generated 1 product documents, 1 up to date" in generate_documents()
+    assert "£2.00" in (products_folder / "product-124.md").read_text()
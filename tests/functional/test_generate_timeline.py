@@ -3,6 +3,7 @@ import json
 import time_machine
 
 import chow.__main__ as main
+from chow import archive
 
 
 def test_creates_timeline_doc(runner, fixture_path, tmp_path, tmp_path_factory):
@@ -70,3 +71,91 @@ def test_creates_timeline_doc(runner, fixture_path, tmp_path, tmp_path_factory):
     )
     with open(timeline_file) as f:
         assert f.read() == expected_contents
+
+
+def test_partitioned_timeline(runner, tmp_path, tmp_path_factory):
+    archive_data: archive.ArchiveProductMap = {
+        "123": {
+            "name": "Crisps",
+            "removed": False,
+            "prices": [
+                {"date": "2022-10-20", "price": "3.00"},
+                {"date": "2022-11-05", "price": "4.00"},
+            ],
+        },
+        "124": {
+            "name": "Eggs",
+            "removed": True,
+            "prices": [{"date": "2022-09-01", "price": "0.50"}],
+        },
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+    timeline_folder = tmp_path_factory.mktemp("docs")
+    timeline_file = timeline_folder / "timeline.md"
+
+    def generate_timeline(now: str = "2022-11-10T14:00") -> None:
+        with time_machine.travel(now):
+            result = runner.invoke(
+                main.cli,
+                args=[
+                    "generate-timeline",
+                    str(archive_file),
+                    str(timeline_file),
+                    "--partitioned",
+                ],
+            )
+        assert result.exit_code == 0, result.exception
+
+    generate_timeline()
+
+    assert timeline_file.read_text().splitlines() == [
+        "# Product price timeline",
+        "- [November 2022](./timeline-2022-11.md)",
+        "- [October 2022](./timeline-2022-10.md)",
+        "- [September 2022](./timeline-2022-09.md)",
+        "## Missing products",
+        "The following products are no longer available:<br/>",
+        "- Eggs",
+    ]
+    assert (timeline_folder / "timeline-2022-10.md").read_text().splitlines() == [
+        "# Product price timeline for October 2022",
+        "## 2022-10-20",
+        "🟡 [Crisps](./product-123.md) added to archive - price is £3.00<br/>",
+    ]
+
+    # Add a price change to the current month, and one to a closed month that shouldn't appear.
+    archive_data["123"]["prices"].append({"date": "2022-11-10", "price": "3.50"})
+    archive_data["124"]["prices"].append({"date": "2022-10-25", "price": "0.60"})
+    archive_file.write_text(json.dumps(archive_data))
+    generate_timeline()
+
+    assert "£4.00 to £3.50" in (timeline_folder / "timeline-2022-11.md").read_text()
+    assert "£0.50 to £0.60" not in (timeline_folder / "timeline-2022-10.md").read_text()
+
+    # Add a price change fetched late on the last day of the newest month, after it has ended.
+    archive_data["123"]["prices"].append({"date": "2022-11-30", "price": "3.75"})
+    archive_file.write_text(json.dumps(archive_data))
+    generate_timeline("2022-12-01T00:30")
+
+    assert "£3.50 to £3.75" in (timeline_folder / "timeline-2022-11.md").read_text()
+
+
+def test_partitioned_timeline_doesnt_support_max_days(runner, tmp_path):
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text("{}")
+
+    result = runner.invoke(
+        main.cli,
+        args=[
+            "generate-timeline",
+            str(archive_file),
+            str(tmp_path / "timeline.md"),
+            "--partitioned",
+            "--max-days",
+            "7",
+        ],
+    )
+
+    assert result.exit_code == 2
+    assert "--max-days isn't supported in partitioned mode" in result.output
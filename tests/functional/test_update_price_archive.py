@@ -1,6 +1,7 @@
 import json
 import re
 
+import pytest
 import responses
 import time_machine
 
@@ -100,3 +101,355 @@ def test_update_archive_file(runner, fixture, tmp_path):
             ],
         }
     }
+
+    # Check the changed product is recorded for incremental document generation.
+    assert (tmp_path / "archive.json.changed").read_text() == "123\n"
+
+
+@responses.activate
+def test_concurrency(runner, fixture, tmp_path):
+    # Create a temporary file of products.
+    products = [
+        {"name": "Crisps", "ocado_product_id": "123"},
+        {"name": "Eggs", "ocado_product_id": "124"},
+    ]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create a filepath for the archive file
+    archive_file = tmp_path / "archive.json"
+
+    # Stub Ocado responses for the above product URLs.
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-12[34]"),
+        body=fixture("ocado_product.html"),
+    )
+
+    # Run command.
+    with time_machine.travel("2022-11-01T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                "--concurrency=2",
+                str(products_file),
+                str(archive_file),
+            ],
+        )
+    assert result.exit_code == 0, result.output
+
+    # Check archive file has been created with both products.
+    content = json.loads(archive_file.read_text())
+    assert sorted(content.keys()) == ["123", "124"]
+    assert content["124"]["prices"] == [{"date": "2022-11-01", "price": "1.90"}]
+
+
+@responses.activate
+@pytest.mark.parametrize("fetch_mode", ("threads", "pipeline"))
+def test_throttled_products_are_left_unchanged(runner, fixture, tmp_path, fetch_mode):
+    # Create a temporary file of products.
+    products = [
+        {"name": "Crisps", "ocado_product_id": "123"},
+        {"name": "Eggs", "ocado_product_id": "124"},
+    ]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create an archive file with a pre-existing price for each product.
+    archive_data = {
+        product["ocado_product_id"]: {
+            "name": product["name"],
+            "prices": [{"date": "2022-11-01", "price": "1.90"}],
+        }
+        for product in products
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+
+    # Stub Ocado responses, throttling the request for the second product.
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-123"),
+        body=fixture("ocado_product.html"),
+    )
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-124"),
+        status=429,
+    )
+
+    # Run command without a retry policy.
+    with time_machine.travel("2022-11-03T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                f"--fetch-mode={fetch_mode}",
+                str(products_file),
+                str(archive_file),
+            ],
+        )
+    assert result.exit_code == 0, result.output
+
+    # Check the throttled product hasn't been marked as removed.
+    content = json.loads(archive_file.read_text())
+    assert content == archive_data
+
+
+def test_offline_mode_replays_cached_prices(runner, tmp_path):
+    # Create a temporary file of products.
+    products = [{"name": "Crisps", "ocado_product_id": "123"}]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create a cache folder with a price for the product.
+    cache_folder = tmp_path / "cache"
+    cache_folder.mkdir()
+    (cache_folder / "product-123.json").write_text(
+        json.dumps({"price": 250, "etag": None, "last_modified": None})
+    )
+
+    # Create a filepath for the archive file
+    archive_file = tmp_path / "archive.json"
+
+    # Run command without stubbing any responses.
+    with time_machine.travel("2022-11-01T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                "--offline",
+                f"--cache-dir={cache_folder}",
+                str(products_file),
+                str(archive_file),
+            ],
+        )
+    assert result.exit_code == 0, result.output
+
+    # Check archive file has been created with the cached price.
+    content = json.loads(archive_file.read_text())
+    assert content["123"]["prices"] == [{"date": "2022-11-01", "price": "2.50"}]
+
+
+def test_offline_mode_leaves_uncached_products_unchanged(runner, tmp_path):
+    # Create a temporary file of products.
+    products = [
+        {"name": "Crisps", "ocado_product_id": "123"},
+        {"name": "Eggs", "ocado_product_id": "124"},
+    ]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create an archive file with a pre-existing price for each product.
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(
+        json.dumps(
+            {
+                product["ocado_product_id"]: {
+                    "name": product["name"],
+                    "prices": [{"date": "2022-11-01", "price": "1.90"}],
+                }
+                for product in products
+            }
+        )
+    )
+
+    # Create a cache folder with a price for the first product only.
+    cache_folder = tmp_path / "cache"
+    cache_folder.mkdir()
+    (cache_folder / "product-123.json").write_text(
+        json.dumps({"price": 250, "etag": None, "last_modified": None})
+    )
+
+    # Run command without stubbing any responses.
+    with time_machine.travel("2022-11-03T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                "--offline",
+                f"--cache-dir={cache_folder}",
+                str(products_file),
+                str(archive_file),
+            ],
+        )
+    assert result.exit_code == 0, result.output
+
+    # Check the cached price was added and the uncached product wasn't marked as removed.
+    content = json.loads(archive_file.read_text())
+    assert content == {
+        "123": {
+            "name": "Crisps",
+            "prices": [
+                {"date": "2022-11-01", "price": "1.90"},
+                {"date": "2022-11-03", "price": "2.50"},
+            ],
+        },
+        "124": {
+            "name": "Eggs",
+            "prices": [{"date": "2022-11-01", "price": "1.90"}],
+        },
+    }
+
+
+def test_offline_mode_requires_cache(runner, tmp_path):
+    products_file = tmp_path / "products.json"
+    products_file.write_text("[]")
+
+    result = runner.invoke(
+        main.cli,
+        args=[
+            "update-price-archive",
+            "--offline",
+            str(products_file),
+            str(tmp_path / "archive.json"),
+        ],
+    )
+
+    assert result.exit_code == 2
+
+
+@responses.activate
+def test_resume_skips_checkpointed_products(runner, fixture, tmp_path):
+    # Create a temporary file of products.
+    products = [
+        {"name": "Crisps", "ocado_product_id": "123"},
+        {"name": "Eggs", "ocado_product_id": "124"},
+    ]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create a checkpoint journal from an interrupted update that fetched one price.
+    archive_file = tmp_path / "archive.json"
+    checkpoint_file = tmp_path / "archive.json.checkpoint"
+    checkpoint_file.write_text(
+        json.dumps({"product_id": "124", "price": 60, "date": "2022-11-01"}) + "\n"
+    )
+
+    # Only stub the Ocado response for the product that wasn't fetched.
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-123"),
+        body=fixture("ocado_product.html"),
+    )
+
+    # Run command.
+    with time_machine.travel("2022-11-01T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                "--resume",
+                str(products_file),
+                str(archive_file),
+            ],
+        )
+    assert result.exit_code == 0, result.output
+
+    # Check archive file contains both prices and the journal has been removed.
+    content = json.loads(archive_file.read_text())
+    assert content["123"]["prices"] == [{"date": "2022-11-01", "price": "1.90"}]
+    assert content["124"]["prices"] == [{"date": "2022-11-01", "price": "0.60"}]
+    assert len(responses.calls) == 1
+    assert not checkpoint_file.exists()
+
+
+@responses.activate
+def test_journal_then_compact(runner, fixture, tmp_path):
+    # Create a temporary file of products.
+    products = [{"name": "Crisps", "ocado_product_id": "123"}]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create an archive file with a pre-existing price.
+    archive_data = {
+        "123": {
+            "name": "Crisps",
+            "prices": [{"date": "2022-11-01", "price": "3.00"}],
+        }
+    }
+    archive_file = tmp_path / "archive.json"
+    archive_file.write_text(json.dumps(archive_data))
+
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-123"),
+        body=fixture("ocado_product.html"),
+    )
+
+    with time_machine.travel("2022-11-03T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                str(products_file),
+                str(archive_file),
+                "--journal",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    assert "1.90" in result.output
+
+    # Check the archive file is untouched and the change is in the journal.
+    assert json.loads(archive_file.read_text()) == archive_data
+    journal_file = tmp_path / "archive.json.journal"
+    assert journal_file.exists()
+
+    result = runner.invoke(main.cli, args=["compact-archive", str(archive_file)])
+    assert result.exit_code == 0, result.output
+    assert "Folded 1 journal records" in result.output
+
+    # Check the change has been folded into the archive file.
+    assert not journal_file.exists()
+    assert json.loads(archive_file.read_text())["123"]["prices"] == [
+        {"date": "2022-11-01", "price": "3.00"},
+        {"date": "2022-11-03", "price": "1.90"},
+    ]
+
+
+@responses.activate
+def test_journal_only_archive(runner, fixture, tmp_path):
+    # Create a temporary file of products.
+    products = [{"name": "Crisps", "ocado_product_id": "123"}]
+    products_file = tmp_path / "products.json"
+    products_file.write_text(json.dumps(products))
+
+    # Create a filepath for the archive file, which the journal is written next to.
+    archive_file = tmp_path / "archive.json"
+
+    responses.get(
+        url=re.compile(r"https://www.ocado.com/products/slug-123"),
+        body=fixture("ocado_product.html"),
+    )
+
+    with time_machine.travel("2022-11-03T14:00"):
+        result = runner.invoke(
+            main.cli,
+            args=[
+                "update-price-archive",
+                str(products_file),
+                str(archive_file),
+                "--journal",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    assert not archive_file.exists()
+
+    # Check commands that load the archive accept it before it is first compacted.
+    result = runner.invoke(
+        main.cli,
+        args=["generate-timeline", str(archive_file), str(tmp_path / "timeline.md")],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Crisps" in (tmp_path / "timeline.md").read_text()
+
+    result = runner.invoke(main.cli, args=["compact-archive", str(archive_file)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(archive_file.read_text())["123"]["prices"] == [
+        {"date": "2022-11-03", "price": "1.90"},
+    ]
+
+
+def test_compact_missing_archive(runner, tmp_path):
+    result = runner.invoke(
+        main.cli, args=["compact-archive", str(tmp_path / "archive.json")]
+    )
+
+    assert result.exit_code == 2
+    assert "nor its journal" in result.output
@@ -1,4 +1,7 @@
+import copy
+import hashlib
 import json
+import os
 
 import pytest
 
@@ -93,3 +96,537 @@ class TestLoad:
 
         with pytest.raises(archive.InvalidJSON):
             archive.load(str(archive_file))
+
+
+class TestLoadWithStructuralValidation:
+    @pytest.mark.parametrize(
+        "content",
+        [
+            {},
+            {"123": {"name": "X", "prices": []}},
+            {
+                "123": {
+                    "name": "X",
+                    "prices": [{"date": "2022-10-02", "price": "5.00"}],
+                    "removed": True,
+                },
+            },
+        ],
+    )
+    def test_valid_content(self, tmp_path, content):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps(content))
+
+        assert (
+            archive.load(str(archive_file), validation=archive.VALIDATION_STRUCTURAL)
+            == content
+        )
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            [],
+            {"123x": {"name": "X", "prices": []}},
+            {"123": "X"},
+            {"123": {"name": "X"}},
+            {"123": {"prices": []}},
+            {"123": {"name": 1, "prices": []}},
+            {"123": {"name": "X", "prices": {}}},
+            {"123": {"name": "X", "egg": "X", "prices": []}},
+            {"123": {"name": "X", "prices": [], "removed": "no"}},
+            {"123": {"name": "X", "prices": [{"date": "2022-10-02"}]}},
+            {"123": {"name": "X", "prices": [{"date": "2022-10-02", "price": 5}]}},
+            {
+                "123": {
+                    "name": "X",
+                    "prices": [{"date": "2022-10-02", "price": "5.00", "x": "y"}],
+                }
+            },
+        ],
+    )
+    def test_invalid_content_matches_schema(self, tmp_path, content):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps(content))
+
+        # The structural checks should reject the same content as the schema.
+        with pytest.raises(archive.InvalidJSON):
+            archive.load(str(archive_file), validation=archive.VALIDATION_FULL)
+        with pytest.raises(archive.InvalidJSON):
+            archive.load(str(archive_file), validation=archive.VALIDATION_STRUCTURAL)
+
+
+class TestLoadWithTrustedValidation:
+    def test_records_hash_of_validated_file(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps({"123": {"name": "X", "prices": []}}))
+
+        archive.load(str(archive_file), validation=archive.VALIDATION_TRUSTED)
+
+        assert (tmp_path / "archive.json.validated").exists()
+
+    def test_skips_validation_of_unchanged_file(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps({"123": {"name": "X", "prices": []}}))
+        archive.load(str(archive_file), validation=archive.VALIDATION_TRUSTED)
+
+        # Pretend the validated file is invalid to check it isn't validated again.
+        invalid_content = json.dumps({"123x": {}})
+        archive_file.write_text(invalid_content)
+        (tmp_path / "archive.json.validated").write_text(
+            hashlib.sha256(invalid_content.encode()).hexdigest()
+        )
+
+        content = archive.load(str(archive_file), validation=archive.VALIDATION_TRUSTED)
+        assert list(content) == ["123x"]
+
+    def test_validates_changed_file(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps({"123": {"name": "X", "prices": []}}))
+        archive.load(str(archive_file), validation=archive.VALIDATION_TRUSTED)
+
+        archive_file.write_text(json.dumps({"123x": {}}))
+
+        with pytest.raises(archive.InvalidJSON):
+            archive.load(str(archive_file), validation=archive.VALIDATION_TRUSTED)
+
+
+def test_schema_validator_is_built_once():
+    assert archive._schema_validator() is archive._schema_validator()
+
+
+class TestSave:
+    def test_doesnt_leave_temporary_files(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+
+        archive.save(
+            str(archive_file), {"123": {"name": "X", "removed": False, "prices": []}}
+        )
+
+        assert [p.name for p in tmp_path.iterdir()] == ["archive.json"]
+        assert json.loads(archive_file.read_text()) == {
+            "123": {"name": "X", "removed": False, "prices": []}
+        }
+
+    def test_keeps_file_permissions(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text("{}")
+        archive_file.chmod(0o640)
+
+        archive.save(str(archive_file), {})
+
+        assert archive_file.stat().st_mode & 0o777 == 0o640
+
+
+def _new_products(products: archive.ArchiveProductMap) -> archive.ChangeSet:
+    return {"new_products": products, "price_changes": {}, "removed_products": []}
+
+
+class TestApplyChanges:
+    def test_copies_only_changed_products(self):
+        products: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+            "124": {"name": "Y", "removed": False, "prices": []},
+            "125": {"name": "Z", "removed": False, "prices": []},
+        }
+        original = copy.deepcopy(products)
+        changes: archive.ChangeSet = {
+            "new_products": {"126": {"name": "W", "removed": False, "prices": []}},
+            "price_changes": {"123": {"date": "2022-10-09", "price": "5.50"}},
+            "removed_products": ["124"],
+        }
+
+        updated = archive.apply_changes(products, changes)
+
+        assert updated == {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [
+                    {"date": "2022-10-02", "price": "5.00"},
+                    {"date": "2022-10-09", "price": "5.50"},
+                ],
+            },
+            "124": {"name": "Y", "removed": True, "prices": []},
+            "125": {"name": "Z", "removed": False, "prices": []},
+            "126": {"name": "W", "removed": False, "prices": []},
+        }
+        # The passed archive is unchanged and unchanged products are shared.
+        assert products == original
+        assert updated["125"] is products["125"]
+
+
+class TestSaveChanges:
+    @pytest.mark.parametrize("filename", ["archive.json", "archive.db"])
+    def test_saves_changes(self, tmp_path, filename):
+        filepath = str(tmp_path / filename)
+        products: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+            "124": {"name": "Y", "removed": False, "prices": []},
+        }
+        archive.save(filepath, products)
+        changes: archive.ChangeSet = {
+            "new_products": {
+                "125": {
+                    "name": "Z",
+                    "removed": False,
+                    "prices": [{"date": "2022-10-09", "price": "1.00"}],
+                }
+            },
+            "price_changes": {"123": {"date": "2022-10-09", "price": "5.50"}},
+            "removed_products": ["124"],
+        }
+
+        archive.save_changes(filepath, products, changes)
+
+        assert archive.load(filepath) == archive.apply_changes(products, changes)
+
+
+class TestJournal:
+    def test_appends_only_changes(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        previous: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+            "124": {
+                "name": "Y",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "1.00"}],
+            },
+        }
+        changes: archive.ChangeSet = {
+            "new_products": {
+                "125": {
+                    "name": "Z",
+                    "removed": False,
+                    "prices": [{"date": "2022-10-09", "price": "2.00"}],
+                },
+            },
+            "price_changes": {"123": {"date": "2022-10-09", "price": "5.50"}},
+            "removed_products": ["124"],
+        }
+
+        num_records = archive.append_changes(filepath, previous, changes)
+
+        assert num_records == 3
+        with open(archive.journal_filepath(filepath)) as f:
+            assert [json.loads(line) for line in f] == [
+                {
+                    "product_id": "125",
+                    "name": "Z",
+                    "date": "2022-10-09",
+                    "price": "2.00",
+                },
+                {
+                    "product_id": "123",
+                    "name": "X",
+                    "date": "2022-10-09",
+                    "price": "5.50",
+                },
+                {"product_id": "124", "name": "Y", "removed": True},
+            ]
+
+    def test_load_replays_journal_onto_archive_file(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        previous: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive.save(filepath, previous)
+        changes: archive.ChangeSet = {
+            "new_products": {},
+            "price_changes": {"123": {"date": "2022-10-09", "price": "5.50"}},
+            "removed_products": ["123"],
+        }
+        archive.append_changes(filepath, previous, changes)
+
+        assert archive.load(filepath) == {
+            "123": {
+                "name": "X",
+                "removed": True,
+                "prices": [
+                    {"date": "2022-10-02", "price": "5.00"},
+                    {"date": "2022-10-09", "price": "5.50"},
+                ],
+            },
+        }
+
+    def test_load_replays_journal_without_archive_file(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        updated: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive.append_changes(filepath, {}, _new_products(updated))
+
+        assert archive.load(filepath) == updated
+
+    def test_load_ignores_incomplete_last_line(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        with open(archive.journal_filepath(filepath), "w") as f:
+            f.write(
+                '{"product_id": "123", "name": "X", "date": "2022-10-02", "price": "5.00"}\n'
+                '{"product_id": "124", "na'
+            )
+
+        assert list(archive.load(filepath)) == ["123"]
+
+    def test_append_after_interrupted_append(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        with open(archive.journal_filepath(filepath), "w") as f:
+            f.write(
+                '{"product_id": "123", "name": "X", "date": "2022-10-02", "price": "5.00"}\n'
+                '{"product_id": "124", "na'
+            )
+        previous: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        changes: archive.ChangeSet = {
+            "new_products": {},
+            "price_changes": {"123": {"date": "2022-10-09", "price": "5.50"}},
+            "removed_products": [],
+        }
+
+        archive.append_changes(filepath, previous, changes)
+
+        assert archive.load(filepath) == {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [
+                    {"date": "2022-10-02", "price": "5.00"},
+                    {"date": "2022-10-09", "price": "5.50"},
+                ],
+            },
+        }
+
+    def test_load_rejects_invalid_record(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        with open(archive.journal_filepath(filepath), "w") as f:
+            f.write('{"product_id": "123", "name": "X", "date": "2022-10-02"}\n')
+
+        with pytest.raises(archive.InvalidJSON):
+            archive.load(filepath)
+
+    def test_compact_folds_journal_into_archive_file(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        updated: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive.append_changes(filepath, {}, _new_products(updated))
+
+        assert archive.compact(filepath) == 1
+
+        assert not os.path.exists(archive.journal_filepath(filepath))
+        with open(filepath) as f:
+            assert json.load(f) == updated
+
+    def test_replaying_compacted_journal_is_harmless(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        updated: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive.append_changes(filepath, {}, _new_products(updated))
+
+        # Simulate a crash after the archive file is written but before the journal is removed.
+        archive.save(filepath, archive.load(filepath))
+
+        assert archive.load(filepath) == updated
+
+
+class TestIterProducts:
+    content: archive.ArchiveProductMap = {
+        "123": {
+            "name": 'X "quoted" {braces}',
+            "removed": False,
+            "prices": [
+                {"date": "2022-10-02", "price": "5.00"},
+                {"date": "2022-10-09", "price": "5.50"},
+            ],
+        },
+        "124": {"name": "Ÿ", "removed": True, "prices": []},
+    }
+
+    @pytest.mark.parametrize("indent", [None, 4])
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_matches_load(self, tmp_path, monkeypatch, indent, chunk_size):
+        monkeypatch.setattr(archive, "_STREAM_CHUNK_SIZE", chunk_size)
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps(self.content, indent=indent))
+
+        assert list(archive.iter_products(str(archive_file))) == list(
+            archive.load(str(archive_file)).items()
+        )
+
+    def test_no_file(self):
+        assert list(archive.iter_products("/tmp/does-not-exist")) == []
+
+    def test_empty_object(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(" { } \n")
+
+        assert list(archive.iter_products(str(archive_file))) == []
+
+    @pytest.mark.parametrize(
+        "raw_content",
+        ["", "{", '{"123": ', '{"123": {}', '{"123" {}}', "{} x", "[]"],
+    )
+    def test_invalid_json(self, tmp_path, raw_content):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(raw_content)
+
+        with pytest.raises(archive.InvalidJSON):
+            list(archive.iter_products(str(archive_file)))
+
+    @pytest.mark.parametrize("validation", archive.VALIDATIONS)
+    def test_validates_each_product(self, tmp_path, validation):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(
+            json.dumps(
+                {
+                    "123": {"name": "X", "prices": []},
+                    "124": {"name": "Y"},
+                }
+            )
+        )
+        products = archive.iter_products(str(archive_file), validation=validation)
+
+        # Products before the invalid one are yielded.
+        assert next(products)[0] == "123"
+        with pytest.raises(archive.InvalidJSON):
+            next(products)
+
+    def test_validates_product_id(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps({"123x": {"name": "X", "prices": []}}))
+
+        with pytest.raises(archive.InvalidJSON):
+            list(archive.iter_products(str(archive_file)))
+
+    def test_records_trusted_hash_once_all_products_are_validated(self, tmp_path):
+        archive_file = tmp_path / "archive.json"
+        archive_file.write_text(json.dumps(self.content))
+
+        list(
+            archive.iter_products(
+                str(archive_file), validation=archive.VALIDATION_TRUSTED
+            )
+        )
+
+        assert (tmp_path / "archive.json.validated").read_text() == hashlib.sha256(
+            archive_file.read_bytes()
+        ).hexdigest()
+
+    def test_replays_journal(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        archive.save(filepath, self.content)
+        changes: archive.ChangeSet = {
+            "new_products": {
+                "125": {
+                    "name": "Z",
+                    "removed": False,
+                    "prices": [{"date": "2022-10-16", "price": "1.00"}],
+                }
+            },
+            "price_changes": {"123": {"date": "2022-10-16", "price": "6.00"}},
+            "removed_products": [],
+        }
+        archive.append_changes(filepath, self.content, changes)
+        updated = archive.apply_changes(self.content, changes)
+
+        assert dict(archive.iter_products(filepath)) == updated
+        assert [product_id for product_id, _ in archive.iter_products(filepath)] == [
+            "123",
+            "124",
+            "125",
+        ]
+
+    def test_sqlite_archive(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        archive.save(filepath, self.content)
+
+        assert list(archive.iter_products(filepath)) == list(self.content.items())
+
+
+class TestChangedProducts:
+    def test_no_changed_products(self, tmp_path):
+        assert archive.load_changed_products(str(tmp_path / "archive.json")) == set()
+
+    def test_accumulates_changed_products(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+
+        archive.record_changed_products(
+            filepath,
+            {
+                "new_products": {
+                    "125": {"name": "Z", "removed": False, "prices": []},
+                },
+                "price_changes": {"123": {"date": "2022-10-03", "price": "5.50"}},
+                "removed_products": [],
+            },
+        )
+        archive.record_changed_products(
+            filepath,
+            {"new_products": {}, "price_changes": {}, "removed_products": ["124"]},
+        )
+
+        assert archive.load_changed_products(filepath) == {"123", "124", "125"}
+
+    def test_ignores_incomplete_last_line(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        with open(archive.changed_products_filepath(filepath), "w") as f:
+            f.write("123\n12")
+
+        assert archive.load_changed_products(filepath) == {"123"}
+
+    def test_record_after_interrupted_record(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        with open(archive.changed_products_filepath(filepath), "w") as f:
+            f.write("123\n12")
+
+        archive.record_changed_products(
+            filepath,
+            {"new_products": {}, "price_changes": {}, "removed_products": ["124"]},
+        )
+
+        assert archive.load_changed_products(filepath) == {"123", "124"}
+
+    def test_clear(self, tmp_path):
+        filepath = str(tmp_path / "archive.json")
+        archive.record_changed_products(
+            filepath,
+            {"new_products": {}, "price_changes": {}, "removed_products": ["124"]},
+        )
+
+        archive.clear_changed_products(filepath)
+        archive.clear_changed_products(filepath)
+
+        assert archive.load_changed_products(filepath) == set()
@@ -0,0 +1,175 @@
+import datetime
+import os
+import pathlib
+
+from chow import archive, archive_columns
+
+
+class TestColumnarArchive:
+    def test_from_archive(self):
+        products: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [
+                    {"date": "2022-10-02", "price": "5.00"},
+                    {"date": "2022-10-09", "price": "5.50"},
+                ],
+            },
+            "124": {"name": "Y", "removed": True, "prices": []},
+            "125": {
+                "name": "Z",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "0.85"}],
+            },
+        }
+
+        columns = archive_columns.ColumnarArchive.from_archive(products)
+
+        assert len(columns) == 3
+        assert columns.product_ids == ["123", "124", "125"]
+        assert columns.names == ["X", "Y", "Z"]
+        assert columns.removed == [False, True, False]
+        assert list(columns.offsets) == [0, 2, 2, 3]
+        assert list(columns.prices) == [500, 550, 85]
+        assert list(columns.days) == [
+            datetime.date(2022, 10, 2).toordinal(),
+            datetime.date(2022, 10, 9).toordinal(),
+            datetime.date(2022, 10, 2).toordinal(),
+        ]
+        assert columns.price_range(0) == range(0, 2)
+        assert columns.price_range(1) == range(2, 2)
+        assert columns.price_range(2) == range(2, 3)
+
+    def test_missing_removed_flag(self):
+        products: archive.ArchiveProductMap = {
+            "123": {"name": "X", "prices": []},  # type: ignore[typeddict-item]
+        }
+
+        columns = archive_columns.ColumnarArchive.from_archive(products)
+
+        assert columns.removed == [False]
+
+
+class TestFormatting:
+    def test_pence_round_trip(self):
+        for price in ["0.01", "0.85", "1.90", "5.00", "12.34"]:
+            assert archive_columns.format_pence(archive_columns.parse_pence(price)) == (
+                price
+            )
+
+    def test_format_day(self):
+        day = datetime.date(2022, 10, 2).toordinal()
+
+        assert archive_columns.format_day(day) == "2022-10-02"
+
+
+class TestSnapshot:
+    def _write_archive(self, tmp_path: pathlib.Path) -> str:
+        filepath = str(tmp_path / "archive.json")
+        archive.save(
+            filepath,
+            {
+                "123": {
+                    "name": "X",
+                    "removed": False,
+                    "prices": [
+                        {"date": "2022-10-02", "price": "5.00"},
+                        {"date": "2022-10-09", "price": "5.50"},
+                    ],
+                },
+                "124": {"name": "Ÿ", "removed": True, "prices": []},
+            },
+        )
+        return filepath
+
+    def test_round_trip(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+
+        written = archive_columns.write_snapshot(filepath)
+        loaded = archive_columns.load_snapshot(filepath)
+
+        assert loaded is not None
+        assert loaded.product_ids == written.product_ids
+        assert loaded.names == written.names
+        assert loaded.removed == written.removed
+        assert list(loaded.offsets) == list(written.offsets)
+        assert list(loaded.days) == list(written.days)
+        assert list(loaded.prices) == list(written.prices)
+
+    def test_snapshot_has_usual_permissions(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        # Temporary files are only readable by their owner, so compare with a file created normally.
+        reference_filepath = tmp_path / "reference"
+        reference_filepath.touch()
+        new_file_mode = reference_filepath.stat().st_mode & 0o777
+        reference_filepath.unlink()
+
+        archive_columns.write_snapshot(filepath)
+
+        snapshot_filepath = pathlib.Path(archive_columns.snapshot_filepath(filepath))
+        assert snapshot_filepath.stat().st_mode & 0o777 == new_file_mode
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "archive.json",
+            "archive.json.snapshot",
+        ]
+
+    def test_load_uses_fresh_snapshot(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        archive_columns.write_snapshot(filepath)
+
+        columns = archive_columns.load(filepath)
+
+        # Snapshot sections are memory-mapped rather than copied into arrays.
+        assert isinstance(columns.prices, memoryview)
+
+    def test_missing_snapshot(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+
+        assert archive_columns.load_snapshot(filepath) is None
+
+    def test_snapshot_is_stale_when_archive_changes(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        archive_columns.write_snapshot(filepath)
+
+        archive.save(filepath, {})
+
+        assert archive_columns.load_snapshot(filepath) is None
+        assert len(archive_columns.load(filepath)) == 0
+
+    def test_snapshot_is_stale_when_journal_changes(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        archive_columns.write_snapshot(filepath)
+
+        archive.append_changes(
+            filepath,
+            {},
+            {
+                "new_products": {
+                    "125": {
+                        "name": "Z",
+                        "removed": False,
+                        "prices": [{"date": "2022-10-09", "price": "1.00"}],
+                    }
+                },
+                "price_changes": {},
+                "removed_products": [],
+            },
+        )
+
+        assert archive_columns.load_snapshot(filepath) is None
+
+    def test_snapshot_is_fresh_when_only_mtime_changes(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        archive_columns.write_snapshot(filepath)
+
+        os.utime(filepath, ns=(0, 0))
+
+        assert archive_columns.load_snapshot(filepath) is not None
+
+    def test_corrupt_snapshot(self, tmp_path):
+        filepath = self._write_archive(tmp_path)
+        with open(archive_columns.snapshot_filepath(filepath), "wb") as f:
+            f.write(b"CHOWSNAP\xff")
+
+        assert archive_columns.load_snapshot(filepath) is None
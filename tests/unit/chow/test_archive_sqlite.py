@@ -0,0 +1,117 @@
+import sqlite3
+from typing import Any
+
+from chow import archive, archive_sqlite
+
+
+def _price_change_rows(filepath: str) -> list[Any]:
+    with sqlite3.connect(filepath) as connection:
+        return connection.execute(
+            "SELECT product_id, position, date, price FROM price_changes ORDER BY rowid"
+        ).fetchall()
+
+
+class TestLoad:
+    def test_empty_database(self, tmp_path):
+        assert archive_sqlite.load(str(tmp_path / "archive.db")) == {}
+
+
+class TestSave:
+    def test_round_trip(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        content: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [
+                    {"date": "2022-10-02", "price": "5.00"},
+                    {"date": "2022-10-09", "price": "5.50"},
+                ],
+            },
+            "124": {"name": "Y", "removed": True, "prices": []},
+        }
+
+        archive_sqlite.save(filepath, content)
+
+        assert archive_sqlite.load(filepath) == content
+
+    def test_only_inserts_new_price_changes(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        content: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive_sqlite.save(filepath, content)
+        rows = _price_change_rows(filepath)
+
+        content["123"]["prices"].append({"date": "2022-10-09", "price": "5.50"})
+        archive_sqlite.save(filepath, content)
+
+        # The original row is kept and the new price change is appended after it.
+        assert _price_change_rows(filepath) == rows + [("123", 1, "2022-10-09", "5.50")]
+
+    def test_replaces_changed_price_history(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        content: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+        archive_sqlite.save(filepath, content)
+
+        content["123"]["prices"] = [{"date": "2022-10-03", "price": "4.00"}]
+        archive_sqlite.save(filepath, content)
+
+        assert archive_sqlite.load(filepath) == content
+
+    def test_updates_removed_flag(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        content: archive.ArchiveProductMap = {
+            "123": {"name": "X", "removed": False, "prices": []},
+        }
+        archive_sqlite.save(filepath, content)
+
+        content["123"]["removed"] = True
+        archive_sqlite.save(filepath, content)
+
+        assert archive_sqlite.load(filepath)["123"]["removed"] is True
+
+    def test_deletes_products_not_in_archive(self, tmp_path):
+        filepath = str(tmp_path / "archive.db")
+        archive_sqlite.save(
+            filepath,
+            {
+                "123": {
+                    "name": "X",
+                    "removed": False,
+                    "prices": [{"date": "2022-10-02", "price": "5.00"}],
+                },
+            },
+        )
+
+        archive_sqlite.save(filepath, {})
+
+        assert archive_sqlite.load(filepath) == {}
+        assert _price_change_rows(filepath) == []
+
+
+class TestArchiveDispatch:
+    def test_loads_and_saves_sqlite_files_by_suffix(self, tmp_path):
+        filepath = str(tmp_path / "archive.sqlite")
+        content: archive.ArchiveProductMap = {
+            "123": {
+                "name": "X",
+                "removed": False,
+                "prices": [{"date": "2022-10-02", "price": "5.00"}],
+            },
+        }
+
+        archive.save(filepath, content)
+
+        assert archive.is_sqlite(filepath)
+        assert archive.load(filepath) == content
@@ -0,0 +1,62 @@
+import datetime
+
+from chow import checkpoint
+
+
+class TestCheckpointJournal:
+    def test_no_journal(self, tmp_path):
+        journal = checkpoint.CheckpointJournal(tmp_path / "archive.json.checkpoint")
+
+        assert journal.load(datetime.date(2022, 11, 1)) == {}
+
+    def test_roundtrip(self, tmp_path):
+        journal = checkpoint.CheckpointJournal(tmp_path / "archive.json.checkpoint")
+
+        journal.append("123", 190, datetime.date(2022, 11, 1))
+        journal.append("124", 250, datetime.date(2022, 11, 1))
+
+        assert journal.load(datetime.date(2022, 11, 1)) == {"123": 190, "124": 250}
+
+    def test_only_loads_prices_for_passed_date(self, tmp_path):
+        journal = checkpoint.CheckpointJournal(tmp_path / "archive.json.checkpoint")
+
+        journal.append("123", 190, datetime.date(2022, 10, 31))
+        journal.append("124", 250, datetime.date(2022, 11, 1))
+
+        assert journal.load(datetime.date(2022, 11, 1)) == {"124": 250}
+
+    def test_ignores_incomplete_last_line(self, tmp_path):
+        filepath = tmp_path / "archive.json.checkpoint"
+        journal = checkpoint.CheckpointJournal(filepath)
+        journal.append("123", 190, datetime.date(2022, 11, 1))
+        with filepath.open("a") as f:
+            f.write('{"product_id": "12')
+
+        assert journal.load(datetime.date(2022, 11, 1)) == {"123": 190}
+
+    def test_resume_after_interrupted_append(self, tmp_path):
+        filepath = tmp_path / "archive.json.checkpoint"
+        checkpoint.CheckpointJournal(filepath).append(
+            "123", 190, datetime.date(2022, 11, 1)
+        )
+        with filepath.open("a") as f:
+            f.write('{"product_id": "12')
+
+        journal = checkpoint.CheckpointJournal(filepath)
+        journal.append("124", 250, datetime.date(2022, 11, 1))
+        journal.append("125", 100, datetime.date(2022, 11, 1))
+
+        assert journal.load(datetime.date(2022, 11, 1)) == {
+            "123": 190,
+            "124": 250,
+            "125": 100,
+        }
+
+    def test_clear(self, tmp_path):
+        filepath = tmp_path / "archive.json.checkpoint"
+        journal = checkpoint.CheckpointJournal(filepath)
+        journal.append("123", 190, datetime.date(2022, 11, 1))
+
+        journal.clear()
+
+        assert not filepath.exists()
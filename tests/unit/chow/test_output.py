@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+from chow import output
+
+
+class TestOutputWriter:
+    def test_writes_new_file(self, tmp_path):
+        filepath = tmp_path / "timeline.md"
+        writer = output.OutputWriter()
+
+        assert writer.write(filepath, "# Timeline\n") is True
+
+        assert filepath.read_text() == "# Timeline\n"
+        assert (writer.num_written, writer.num_skipped) == (1, 0)
+
+    def test_skips_unchanged_file(self, tmp_path):
+        filepath = tmp_path / "timeline.md"
+        filepath.write_text("# Timeline\n")
+        os.utime(filepath, ns=(0, 0))
+        writer = output.OutputWriter()
+
+        assert writer.write(filepath, "# Timeline\n") is False
+
+        assert filepath.stat().st_mtime_ns == 0
+        assert (writer.num_written, writer.num_skipped) == (0, 1)
+
+    def test_replaces_changed_file(self, tmp_path):
+        filepath = tmp_path / "timeline.md"
+        filepath.write_text("# Timeline\n")
+        writer = output.OutputWriter()
+
+        assert writer.write(filepath, "# Product timeline\n") is True
+        # Same size, different content.
+        assert writer.write(filepath, "# Product timelinf\n") is True
+
+        assert filepath.read_text() == "# Product timelinf\n"
+        assert (writer.num_written, writer.num_skipped) == (2, 0)
+
+    def test_writes_bytes(self, tmp_path):
+        filepath = tmp_path / "product-123.png"
+        writer = output.OutputWriter()
+
+        writer.write(filepath, b"\x89PNG")
+        writer.write(filepath, b"\x89PNG")
+
+        assert filepath.read_bytes() == b"\x89PNG"
+        assert (writer.num_written, writer.num_skipped) == (1, 1)
+
+    def test_keeps_file_permissions(self, tmp_path):
+        filepath = tmp_path / "timeline.md"
+        filepath.write_text("# Timeline\n")
+        filepath.chmod(0o640)
+        writer = output.OutputWriter()
+
+        writer.write(tmp_path / "overview.md", "# Overview\n")
+        writer.write(filepath, "# Product timeline\n")
+
+        assert filepath.stat().st_mode & 0o777 == 0o640
+
+    def test_new_file_has_usual_permissions(self, tmp_path):
+        # Temporary files are only readable by their owner, so compare with a file created normally.
+        (tmp_path / "reference.md").touch()
+        writer = output.OutputWriter()
+
+        writer.write(tmp_path / "overview.md", "# Overview\n")
+
+        assert (tmp_path / "overview.md").stat().st_mode & 0o777 == (
+            tmp_path / "reference.md"
+        ).stat().st_mode & 0o777
+
+    def test_new_file_permissions_use_umask(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(output, "_umask", lambda: 0o027)
+        writer = output.OutputWriter()
+
+        writer.write(tmp_path / "overview.md", "# Overview\n")
+
+        assert (tmp_path / "overview.md").stat().st_mode & 0o777 == 0o640
+
+    def test_leaves_no_temporary_files(self, tmp_path):
+        writer = output.OutputWriter()
+
+        writer.write(tmp_path / "timeline.md", "# Timeline\n")
+        writer.write(tmp_path / "timeline.md", "# Product timeline\n")
+
+        assert [path.name for path in tmp_path.iterdir()] == ["timeline.md"]
+
+    def test_summary(self, tmp_path):
+        writer = output.OutputWriter()
+        writer.write(tmp_path / "a.md", "a")
+        writer.write(tmp_path / "b.md", "b")
+        writer.write(tmp_path / "b.md", "b")
+
+        assert writer.summary() == "Wrote 2 files, skipped 1 unchanged files"
+
+
+class TestAtomicWrite:
+    def test_writes_text(self, tmp_path):
+        filepath = tmp_path / "product-123.json"
+
+        with output.atomic_write(filepath, "w") as f:
+            f.write('{"price": 190}')
+
+        assert filepath.read_text() == '{"price": 190}'
+
+    def test_failed_write_leaves_file_untouched(self, tmp_path):
+        filepath = tmp_path / "archive.json"
+        filepath.write_text("{}")
+
+        with pytest.raises(ValueError):
+            with output.atomic_write(filepath, "w", fsync=True) as f:
+                f.write('{"123": ')
+                raise ValueError("Unserializable")
+
+        assert filepath.read_text() == "{}"
+        assert [path.name for path in tmp_path.iterdir()] == ["archive.json"]
+
+
+class TestTruncatePartialLine:
+    @pytest.mark.parametrize(
+        ("content", "expected"),
+        [
+            (b"", b""),
+            (b"a\nb\n", b"a\nb\n"),
+            (b"a\nb", b"a\n"),
+            (b"partial", b""),
+            (b"a\n" + b"b" * 10000, b"a\n"),
+        ],
+    )
+    def test_truncates_partial_line(self, tmp_path, content, expected):
+        filepath = tmp_path / "archive.json.journal"
+        filepath.write_bytes(content)
+
+        output.truncate_partial_line(filepath)
+
+        assert filepath.read_bytes() == expected
+
+    def test_missing_file(self, tmp_path):
+        filepath = tmp_path / "archive.json.journal"
+
+        output.truncate_partial_line(filepath)
+
+        assert not filepath.exists()
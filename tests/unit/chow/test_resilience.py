@@ -0,0 +1,95 @@
+import time
+
+import time_machine
+
+from chow import resilience
+
+
+class TestRetryPolicy:
+    def test_backoff_is_bounded(self):
+        policy = resilience.RetryPolicy(base_delay=1.0, max_delay=5.0)
+
+        assert 0 <= policy.backoff(0) <= 1.0
+        assert 0 <= policy.backoff(2) <= 4.0
+        assert 0 <= policy.backoff(10) <= 5.0
+
+    def test_no_deadline(self):
+        policy = resilience.RetryPolicy()
+
+        assert policy.time_remaining() is None
+
+    def test_deadline(self):
+        policy = resilience.RetryPolicy(deadline=60)
+
+        time_remaining = policy.time_remaining()
+        assert time_remaining is not None
+        assert 0 < time_remaining <= 60
+
+    def test_deadline_passed(self):
+        policy = resilience.RetryPolicy(deadline=0.01)
+        time.sleep(0.02)
+
+        assert policy.time_remaining() == 0
+
+
+class TestCircuitBreaker:
+    def test_closed_by_default(self):
+        breaker = resilience.CircuitBreaker()
+
+        assert breaker.allow_request()
+
+    def test_opens_when_error_rate_too_high(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=0.5, window=4)
+
+        for success in (True, False, True, False):
+            breaker.record(success)
+
+        assert breaker.state == breaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_stays_closed_when_error_rate_low(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=0.5, window=4)
+
+        for success in (True, False, True, True):
+            breaker.record(success)
+
+        assert breaker.state == breaker.CLOSED
+        assert breaker.allow_request()
+
+    def test_allows_single_trial_after_reset_timeout(self):
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=30)
+        with time_machine.travel(0, tick=False) as traveller:
+            breaker.record(False)
+            traveller.shift(31)
+
+            assert breaker.allow_request()
+            assert breaker.state == breaker.HALF_OPEN
+            assert not breaker.allow_request()
+
+    def test_closes_after_successful_trial(self):
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=0)
+        breaker.record(False)
+        breaker.allow_request()
+
+        breaker.record(True)
+
+        assert breaker.state == breaker.CLOSED
+
+    def test_reopens_after_failed_trial(self):
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=0)
+        breaker.record(False)
+        breaker.allow_request()
+
+        breaker.record(False)
+
+        assert breaker.state == breaker.OPEN
+
+    def test_release_allows_another_trial(self):
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=0)
+        breaker.record(False)
+        breaker.allow_request()
+
+        breaker.release()
+
+        assert breaker.state == breaker.HALF_OPEN
+        assert breaker.allow_request()
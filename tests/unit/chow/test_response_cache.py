@@ -0,0 +1,59 @@
+import os
+
+from chow import response_cache
+
+
+def _entry(price: int) -> response_cache.CacheEntry:
+    return response_cache.CacheEntry(price=price, etag='"abc"', last_modified=None)
+
+
+class TestResponseCache:
+    def test_missing_entry(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+
+        assert cache.get("123") is None
+
+    def test_roundtrip(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+
+        cache.set("123", _entry(190))
+
+        assert cache.get("123") == {
+            "price": 190,
+            "etag": '"abc"',
+            "last_modified": None,
+        }
+
+    def test_persists_between_instances(self, tmp_path):
+        response_cache.ResponseCache(tmp_path).set("123", _entry(190))
+
+        assert response_cache.ResponseCache(tmp_path).get("123") == _entry(190)
+
+    def test_corrupt_entry_is_ignored(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+        (tmp_path / "product-123.json").write_text("not JSON")
+
+        assert cache.get("123") is None
+
+
+class TestEvict:
+    def test_nothing_evicted_when_within_size(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+        cache.set("1", _entry(100))
+
+        assert cache.evict() == 0
+        assert cache.get("1") is not None
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+        for i, product_id in enumerate(("1", "2", "3")):
+            cache.set(product_id, _entry(100))
+            # Give each entry a distinct access time.
+            os.utime(tmp_path / f"product-{product_id}.json", (i, i))
+        entry_size = (tmp_path / "product-1.json").stat().st_size
+        cache.max_bytes = entry_size * 2
+
+        assert cache.evict() == 1
+        assert cache.get("1") is None
+        assert cache.get("2") is not None
+        assert cache.get("3") is not None
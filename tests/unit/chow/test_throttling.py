@@ -0,0 +1,82 @@
+import time
+
+from chow import throttling
+
+
+class TestTokenBucket:
+    def test_allows_burst_up_to_capacity(self):
+        bucket = throttling.TokenBucket(rate=1, capacity=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+
+        assert time.monotonic() - start < 0.5
+
+    def test_limits_rate_once_burst_used(self):
+        bucket = throttling.TokenBucket(rate=50, capacity=1)
+
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+
+        # The first token is available immediately, the other five take 20ms each.
+        assert time.monotonic() - start >= 0.09
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_increases_limit_after_successes(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=10)
+
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(time.monotonic(), throttled=False)
+
+        assert limiter.limit == 3
+
+    def test_limit_capped_at_max(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(time.monotonic(), throttled=False)
+
+        assert limiter.limit == 2
+
+    def test_halves_limit_when_throttled(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=10)
+
+        limiter.acquire()
+        limiter.release(time.monotonic(), throttled=True)
+
+        assert limiter.limit == 4
+
+    def test_limit_not_reduced_below_min(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(
+            initial_limit=1, min_limit=1, max_limit=10
+        )
+
+        limiter.acquire()
+        limiter.release(time.monotonic(), throttled=True)
+
+        assert limiter.limit == 1
+
+    def test_requests_started_before_decrease_dont_decrease_again(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=10)
+        started_at = time.monotonic()
+        limiter.acquire()
+        limiter.acquire()
+
+        limiter.release(started_at, throttled=True)
+        limiter.release(started_at, throttled=True)
+
+        assert limiter.limit == 4
+
+    def test_latency_percentiles(self):
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=2)
+        limiter.latencies = [i / 100 for i in range(1, 101)]
+
+        percentiles = limiter.latency_percentiles()
+
+        assert round(percentiles[50], 3) == 0.505
+        assert round(percentiles[99], 3) == 0.99
@@ -1,5 +1,6 @@
 import datetime
 
+from chow import archive_columns
 from chow.usecases import charts
 from tests import factories
 
@@ -13,12 +14,16 @@ class TestGenerateDataSeries:
         )
         end_date = datetime.date(2022, 10, 1)
 
-        dates, prices = charts._generate_data_series(product_data, end_date)
+        dates, prices = charts._generate_data_series(
+            archive_columns.ColumnarArchive.from_archive({"123": product_data}),
+            0,
+            end_date,
+        )
 
-        assert dates == [
-            datetime.date(2022, 10, 1),
+        assert [str(date) for date in dates] == [
+            "2022-10-01",
         ]
-        assert prices == [1.00]
+        assert prices.tolist() == [1.00]
 
     def test_single_price_change_with_later_end_date(self):
         product_data = factories.ProductPriceHistory(
@@ -28,13 +33,17 @@ class TestGenerateDataSeries:
         )
         end_date = datetime.date(2022, 10, 2)
 
-        dates, prices = charts._generate_data_series(product_data, end_date)
+        dates, prices = charts._generate_data_series(
+            archive_columns.ColumnarArchive.from_archive({"123": product_data}),
+            0,
+            end_date,
+        )
 
-        assert dates == [
-            datetime.date(2022, 10, 1),
-            datetime.date(2022, 10, 2),
+        assert [str(date) for date in dates] == [
+            "2022-10-01",
+            "2022-10-02",
         ]
-        assert prices == [1.00, 1.00]
+        assert prices.tolist() == [1.00, 1.00]
 
     def test_multiple_price_changes_with_later_end_date(self):
         product_data = factories.ProductPriceHistory(
@@ -45,13 +54,28 @@ class TestGenerateDataSeries:
         )
         end_date = datetime.date(2022, 10, 5)
 
-        dates, prices = charts._generate_data_series(product_data, end_date)
+        dates, prices = charts._generate_data_series(
+            archive_columns.ColumnarArchive.from_archive({"123": product_data}),
+            0,
+            end_date,
+        )
 
-        assert dates == [
-            datetime.date(2022, 10, 1),
-            datetime.date(2022, 10, 2),
-            datetime.date(2022, 10, 3),
-            datetime.date(2022, 10, 4),
-            datetime.date(2022, 10, 5),
+        # Only the price change points are returned, for drawing as steps.
+        assert [str(date) for date in dates] == [
+            "2022-10-01",
+            "2022-10-03",
+            "2022-10-05",
         ]
-        assert prices == [1.00, 1.00, 2.00, 2.00, 2.00]
+        assert prices.tolist() == [1.00, 2.00, 2.00]
+
+    def test_no_price_changes(self):
+        product_data = factories.ProductPriceHistory(prices=[])
+
+        dates, prices = charts._generate_data_series(
+            archive_columns.ColumnarArchive.from_archive({"123": product_data}),
+            0,
+            datetime.date(2022, 10, 5),
+        )
+
+        assert [str(date) for date in dates] == []
+        assert prices.tolist() == []
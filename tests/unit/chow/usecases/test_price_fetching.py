@@ -1,9 +1,12 @@
 import datetime
+import re
+import time
 from unittest import mock
 
 import pytest
+import responses
 
-from chow import archive
+from chow import archive, resilience, response_cache, throttling
 from chow.usecases import price_fetching
 from tests import factories
 
@@ -20,6 +23,427 @@ class TestFetchOcadoPrice:
         )
         assert price == 190
 
+    def test_uses_passed_session(self, fixture):
+        session = mock.Mock()
+        session.get.return_value = mock.Mock(
+            text=fixture("ocado_product.html"), status_code=200
+        )
+
+        price = price_fetching.fetch_ocado_price(
+            "123", logger=mock.Mock(), session=session
+        )
+
+        assert price == 190
+        assert session.get.call_args.args == (
+            "https://www.ocado.com/products/slug-123",
+        )
+
+    @responses.activate
+    def test_stream_mode(self, fixture):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"),
+            body=fixture("ocado_product.html"),
+            content_type="text/html; charset=utf-8",
+        )
+
+        price = price_fetching.fetch_ocado_price("123", logger=mock.Mock(), stream=True)
+
+        assert price == 190
+
+    @responses.activate
+    def test_stream_mode_with_error_response(self):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"), status=404
+        )
+
+        with pytest.raises(price_fetching.UnableToFetchPrice):
+            price_fetching.fetch_ocado_price("123", logger=mock.Mock(), stream=True)
+
+    @pytest.mark.parametrize("status_code", (429, 503))
+    @responses.activate
+    def test_throttling_responses(self, status_code):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"),
+            status=status_code,
+        )
+
+        with pytest.raises(price_fetching.Throttled):
+            price_fetching.fetch_ocado_price("123", logger=mock.Mock())
+
+    @responses.activate
+    def test_server_errors_are_temporary(self):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"), status=500
+        )
+
+        with pytest.raises(price_fetching.TemporarilyUnableToFetchPrice):
+            price_fetching.fetch_ocado_price("123", logger=mock.Mock())
+
+    @responses.activate
+    def test_not_found_is_not_temporary(self):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"), status=404
+        )
+
+        with pytest.raises(price_fetching.UnableToFetchPrice) as excinfo:
+            price_fetching.fetch_ocado_price("123", logger=mock.Mock())
+
+        assert not isinstance(
+            excinfo.value, price_fetching.TemporarilyUnableToFetchPrice
+        )
+
+
+class TestRetry:
+    def test_unchanged_without_policy(self):
+        fetch = mock.Mock()
+
+        assert price_fetching._retry(fetch, None, None, mock.Mock()) is fetch
+
+    def test_retries_temporary_errors(self):
+        fetch = mock.Mock(
+            side_effect=[price_fetching.TemporarilyUnableToFetchPrice("Timeout"), 190]
+        )
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+
+        result = price_fetching._retry(fetch, policy, None, mock.Mock())("123")
+
+        assert result == 190
+        assert fetch.call_count == 2
+
+    def test_gives_up_after_max_attempts(self):
+        fetch = mock.Mock(
+            side_effect=price_fetching.TemporarilyUnableToFetchPrice("Timeout")
+        )
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+
+        with pytest.raises(price_fetching.FetchAbandoned):
+            price_fetching._retry(fetch, policy, None, mock.Mock())("123")
+
+        assert fetch.call_count == 3
+
+    def test_does_not_retry_other_errors(self):
+        fetch = mock.Mock(side_effect=price_fetching.UnableToFetchPrice("Not found"))
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+
+        with pytest.raises(price_fetching.UnableToFetchPrice) as excinfo:
+            price_fetching._retry(fetch, policy, None, mock.Mock())("123")
+
+        assert not isinstance(excinfo.value, price_fetching.FetchAbandoned)
+        assert fetch.call_count == 1
+
+    def test_open_circuit_breaker_fails_fast(self):
+        fetch = mock.Mock(return_value=190)
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+        breaker = resilience.CircuitBreaker(window=1)
+        breaker.record(success=False)
+
+        with pytest.raises(price_fetching.FetchAbandoned):
+            price_fetching._retry(fetch, policy, breaker, mock.Mock())("123")
+
+        assert fetch.call_count == 0
+
+    def test_not_found_trial_closes_circuit_breaker(self):
+        fetch = mock.Mock(
+            side_effect=[price_fetching.UnableToFetchPrice("Not found"), 190]
+        )
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=0)
+        breaker.record(success=False)
+        retrying_fetch = price_fetching._retry(fetch, policy, breaker, mock.Mock())
+
+        with pytest.raises(price_fetching.UnableToFetchPrice):
+            retrying_fetch("123")
+
+        assert breaker.state == breaker.CLOSED
+        assert retrying_fetch("456") == 190
+
+    def test_unexpected_error_releases_circuit_breaker_trial(self):
+        fetch = mock.Mock(side_effect=[ValueError("Unexpected"), 190])
+        policy = resilience.RetryPolicy(max_attempts=3, base_delay=0)
+        breaker = resilience.CircuitBreaker(window=1, reset_timeout=0)
+        breaker.record(success=False)
+        retrying_fetch = price_fetching._retry(fetch, policy, breaker, mock.Mock())
+
+        with pytest.raises(ValueError):
+            retrying_fetch("123")
+
+        assert retrying_fetch("456") == 190
+        assert breaker.state == breaker.CLOSED
+
+    def test_passed_deadline_fails_fast(self):
+        fetch = mock.Mock(return_value=190)
+        policy = resilience.RetryPolicy(deadline=0.001)
+        time.sleep(0.002)
+
+        with pytest.raises(price_fetching.FetchAbandoned):
+            price_fetching._retry(fetch, policy, None, mock.Mock())("123")
+
+        assert fetch.call_count == 0
+
+
+class TestThrottle:
+    def test_unchanged_without_limiters(self):
+        fetch = mock.Mock()
+
+        assert price_fetching._throttle(fetch, None, None) is fetch
+
+    def test_throttled_fetches_reduce_concurrency(self):
+        fetch = mock.Mock(side_effect=price_fetching.Throttled("Slow down"))
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=8)
+
+        with pytest.raises(price_fetching.Throttled):
+            price_fetching._throttle(fetch, None, limiter)("123")
+
+        assert limiter.limit == 4
+        assert len(limiter.latencies) == 1
+
+    def test_other_errors_dont_reduce_concurrency(self):
+        fetch = mock.Mock(side_effect=price_fetching.UnableToFetchPrice("Not found"))
+        limiter = throttling.AdaptiveConcurrencyLimiter(initial_limit=8)
+
+        with pytest.raises(price_fetching.UnableToFetchPrice):
+            price_fetching._throttle(fetch, None, limiter)("123")
+
+        assert limiter.limit == 8
+
+
+class TestFetchOcadoPriceWithCache:
+    @responses.activate
+    def test_stores_price_and_validators(self, fixture, tmp_path):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"),
+            body=fixture("ocado_product.html"),
+            headers={"ETag": '"abc"', "Last-Modified": "Tue, 01 Nov 2022 10:00:00 GMT"},
+        )
+        cache = response_cache.ResponseCache(tmp_path)
+
+        price = price_fetching.fetch_ocado_price("123", logger=mock.Mock(), cache=cache)
+
+        assert price == 190
+        assert cache.get("123") == {
+            "price": 190,
+            "etag": '"abc"',
+            "last_modified": "Tue, 01 Nov 2022 10:00:00 GMT",
+        }
+
+    @responses.activate
+    def test_reuses_cached_price_when_not_modified(self, tmp_path):
+        responses.get(
+            url=re.compile(r"https://www.ocado.com/products/slug-123"),
+            status=304,
+            match=[
+                responses.matchers.header_matcher(
+                    {
+                        "If-None-Match": '"abc"',
+                        "If-Modified-Since": "Tue, 01 Nov 2022 10:00:00 GMT",
+                    }
+                )
+            ],
+        )
+        cache = response_cache.ResponseCache(tmp_path)
+        cache.set(
+            "123",
+            response_cache.CacheEntry(
+                price=250, etag='"abc"', last_modified="Tue, 01 Nov 2022 10:00:00 GMT"
+            ),
+        )
+
+        price = price_fetching.fetch_ocado_price("123", logger=mock.Mock(), cache=cache)
+
+        assert price == 250
+
+    def test_offline_uses_cached_price(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+        cache.set(
+            "123", response_cache.CacheEntry(price=250, etag=None, last_modified=None)
+        )
+
+        price = price_fetching.fetch_ocado_price(
+            "123", logger=mock.Mock(), cache=cache, offline=True
+        )
+
+        assert price == 250
+
+    def test_offline_without_cached_price(self, tmp_path):
+        cache = response_cache.ResponseCache(tmp_path)
+
+        with pytest.raises(price_fetching.FetchAbandoned):
+            price_fetching.fetch_ocado_price(
+                "123", logger=mock.Mock(), cache=cache, offline=True
+            )
+
+
+class TestIncrementalPriceExtractor:
+    def test_stops_after_price_container(self, fixture):
+        content = fixture("ocado_product.html")
+        extractor = price_fetching._IncrementalPriceExtractor()
+
+        for i in range(0, len(content), 1000):
+            if extractor.feed(content[i : i + 1000]):
+                break
+
+        assert len(extractor.content) < len(content)
+        assert price_fetching._extract_price(extractor.content) == 190
+
+    def test_marker_split_across_chunks(self):
+        extractor = price_fetching._IncrementalPriceExtractor()
+
+        assert not extractor.feed("<html><div data-test=")
+        assert not extractor.feed('"price-container"><span>£2.50</span></')
+        assert extractor.feed("div><p>Rest of page</p>")
+        assert price_fetching._extract_price(extractor.content) == 250
+
+    def test_no_price_container(self):
+        extractor = price_fetching._IncrementalPriceExtractor()
+
+        assert not extractor.feed("<html><div>No price</div>")
+        assert not extractor.feed("</html>")
+
+
+class TestCreateSession:
+    def test_pool_is_sized_to_passed_size(self):
+        session = price_fetching._create_session(pool_size=25)
+
+        adapter = session.get_adapter("https://www.ocado.com")
+        assert adapter._pool_maxsize == 25
+
+    def test_no_connections_before_any_requests(self):
+        session = price_fetching._create_session(pool_size=25)
+
+        assert price_fetching._connection_stats(session) == {
+            "requests": 0,
+            "connections": 0,
+        }
+
+
+class TestFetchProductPrices:
+    def test_abandoned_products_are_not_missing(self):
+        def fetch_price(product_id):
+            if product_id == "2":
+                raise price_fetching.FetchAbandoned("Circuit breaker is open")
+            return 100
+
+        products = [
+            price_fetching.Product(name="Eggs", ocado_product_id="1"),
+            price_fetching.Product(name="Bacon", ocado_product_id="2"),
+        ]
+
+        product_prices, missing_products = price_fetching._fetch_product_prices(
+            products, logger=mock.Mock(), fetch_price=fetch_price
+        )
+
+        assert product_prices == [(products[0], 100)]
+        assert missing_products == []
+
+
+class TestFetchProductPricesPipeline:
+    def test_splits_prices_and_missing_products(self, fixture):
+        pages = {
+            "1": fixture("ocado_product.html"),
+            "3": "<html>No price here</html>",
+        }
+
+        def fetch_page(product_id):
+            if product_id not in pages:
+                raise price_fetching.UnableToFetchPrice("Not found")
+            return price_fetching._ProductPage(
+                content=pages[product_id], etag=None, last_modified=None
+            )
+
+        products = [
+            price_fetching.Product(name="Eggs", ocado_product_id="1"),
+            price_fetching.Product(name="Bacon", ocado_product_id="2"),
+            price_fetching.Product(name="Beans", ocado_product_id="3"),
+        ]
+
+        product_prices, missing_products = (
+            price_fetching._fetch_product_prices_pipeline(
+                products,
+                logger=mock.Mock(),
+                download_workers=2,
+                parse_workers=1,
+                fetch_page=fetch_page,
+            )
+        )
+
+        assert product_prices == [(products[0], 190)]
+        assert sorted(missing_products, key=lambda x: x["name"]) == [
+            products[1],
+            products[2],
+        ]
+
+    def test_reraises_unexpected_download_errors(self):
+        def fetch_page(product_id):
+            raise RuntimeError("Bug")
+
+        products = [price_fetching.Product(name="Eggs", ocado_product_id="1")]
+
+        with pytest.raises(RuntimeError):
+            price_fetching._fetch_product_prices_pipeline(
+                products,
+                logger=mock.Mock(),
+                download_workers=1,
+                parse_workers=1,
+                fetch_page=fetch_page,
+            )
+
+    def test_raises_errors_recording_prices(self, fixture):
+        content = fixture("ocado_product.html")
+
+        def fetch_page(product_id):
+            return price_fetching._ProductPage(
+                content=content, etag=None, last_modified=None
+            )
+
+        def on_price(product, price):
+            raise OSError("No space left on device")
+
+        # More products than fit on the queue, so downloads are waiting when the error is raised.
+        products = [
+            price_fetching.Product(name="Eggs", ocado_product_id=str(product_id))
+            for product_id in range(20)
+        ]
+
+        with pytest.raises(OSError):
+            price_fetching._fetch_product_prices_pipeline(
+                products,
+                logger=mock.Mock(),
+                download_workers=4,
+                parse_workers=1,
+                fetch_page=fetch_page,
+                on_price=on_price,
+            )
+
+
+class TestExtractPrice:
+    def test_fast_path_matches_full_parse(self, fixture):
+        content = fixture("ocado_product.html")
+
+        assert price_fetching._extract_price_fast(content) == 190
+        assert price_fetching._extract_price_with_soup(content) == 190
+
+    def test_falls_back_to_full_parse(self):
+        # Single-quoted attributes aren't matched by the fast path.
+        content = (
+            "<html><div data-test='price-container'><span>£2.50</span></div></html>"
+        )
+
+        with pytest.raises(price_fetching.UnableToExtractPrice):
+            price_fetching._extract_price_fast(content)
+        assert price_fetching._extract_price(content) == 250
+
+    def test_missing_price_container(self):
+        content = "<html><div><span>£2.50</span></div></html>"
+
+        with pytest.raises(price_fetching.UnableToExtractPrice):
+            price_fetching._extract_price(content)
+
+    def test_missing_price_span(self):
+        content = '<html><div data-test="price-container">£2.50</div></html>'
+
+        with pytest.raises(price_fetching.UnableToExtractPrice):
+            price_fetching._extract_price(content)
+
 
 class TestConvertPenceToPounds:
     @pytest.mark.parametrize(
@@ -38,26 +462,38 @@ class TestConvertPenceToPounds:
 class TestChangeSummary:
     def test_no_summary_when_no_changes(self):
         current_archive: archive.ArchiveProductMap = {}
-        updated_archive: archive.ArchiveProductMap = {}
+        changes: archive.ChangeSet = {
+            "new_products": {},
+            "price_changes": {},
+            "removed_products": [],
+        }
 
-        assert price_fetching._change_summary(current_archive, updated_archive) == ""
+        assert price_fetching._change_summary(current_archive, changes) == ""
 
     def test_summary_when_new_product_added(self):
         current_archive: archive.ArchiveProductMap = {}
-        updated_archive = factories.ArchiveProductMap(p1__name="Snickers")
+        changes: archive.ChangeSet = {
+            "new_products": factories.ArchiveProductMap(p1__name="Snickers"),
+            "price_changes": {},
+            "removed_products": [],
+        }
 
-        summary = price_fetching._change_summary(current_archive, updated_archive)
+        summary = price_fetching._change_summary(current_archive, changes)
 
         assert summary == "Update price archive\n\nNew product: Snickers"
 
     def test_summary_when_multiple_new_products_added(self):
         current_archive: archive.ArchiveProductMap = {}
-        updated_archive = factories.ArchiveProductMap(
-            p1=factories.ProductPriceHistory(name="Eggs"),
-            p2=factories.ProductPriceHistory(name="Bacon"),
-        )
+        changes: archive.ChangeSet = {
+            "new_products": factories.ArchiveProductMap(
+                p1=factories.ProductPriceHistory(name="Eggs"),
+                p2=factories.ProductPriceHistory(name="Bacon"),
+            ),
+            "price_changes": {},
+            "removed_products": [],
+        }
 
-        summary = price_fetching._change_summary(current_archive, updated_archive)
+        summary = price_fetching._change_summary(current_archive, changes)
 
         assert (
             summary == "Update price archive\n\nNew product: Eggs\nNew product: Bacon"
@@ -68,11 +504,13 @@ class TestChangeSummary:
             p1=factories.ProductPriceHistory(name="Eggs"),
             p2=factories.ProductPriceHistory(name="Bacon"),
         )
-        updated_archive = factories.ArchiveProductMap(
-            p1=factories.ProductPriceHistory(name="Eggs"),
-        )
+        changes: archive.ChangeSet = {
+            "new_products": {},
+            "price_changes": {},
+            "removed_products": ["p2"],
+        }
 
-        summary = price_fetching._change_summary(current_archive, updated_archive)
+        summary = price_fetching._change_summary(current_archive, changes)
 
         assert summary == "Update price archive\n\nRemove product: Bacon"
 
@@ -85,24 +523,20 @@ class TestChangeSummary:
                 ],
             )
         )
-        updated_archive = factories.ArchiveProductMap(
-            p1=factories.ProductPriceHistory(
-                name="Eggs",
-                prices=[
-                    factories.PriceChange(price="1.50"),
-                    factories.PriceChange(price="2.50"),
-                ],
-            )
-        )
+        changes: archive.ChangeSet = {
+            "new_products": {},
+            "price_changes": {"p1": factories.PriceChange(price="2.50")},
+            "removed_products": [],
+        }
 
-        summary = price_fetching._change_summary(current_archive, updated_archive)
+        summary = price_fetching._change_summary(current_archive, changes)
 
         assert (
             summary == "Update price archive\n\nPrice change for Eggs: £1.50 to £2.50"
         )
 
 
-class TestUpdatePriceArchive:
+class TestPriceArchiveChanges:
     def test_simple_update(self):
         price_date = datetime.date(2023, 4, 1)
         product_prices = [
@@ -110,17 +544,80 @@ class TestUpdatePriceArchive:
         ]
         missing_products: list[price_fetching.Product] = []
 
-        new_archive = price_fetching._update_price_archive(
+        changes = price_fetching._price_archive_changes(
             price_date=price_date,
             product_prices=product_prices,
             missing_products=missing_products,
             price_archive={},
         )
 
-        assert new_archive == {
+        assert archive.apply_changes({}, changes) == {
             "123": {
                 "name": "Sample product",
                 "removed": False,
                 "prices": [{"date": "2023-04-01", "price": "1.20"}],
             }
         }
+
+    def test_changes_to_known_products(self):
+        price_archive: archive.ArchiveProductMap = {
+            "123": {
+                "name": "Changed",
+                "removed": False,
+                "prices": [{"date": "2023-03-01", "price": "1.00"}],
+            },
+            "124": {
+                "name": "Unchanged",
+                "removed": False,
+                "prices": [{"date": "2023-03-01", "price": "2.00"}],
+            },
+            "125": {
+                "name": "Missing",
+                "removed": False,
+                "prices": [{"date": "2023-03-01", "price": "3.00"}],
+            },
+            "126": {
+                "name": "Already missing",
+                "removed": True,
+                "prices": [{"date": "2023-03-01", "price": "4.00"}],
+            },
+        }
+
+        changes = price_fetching._price_archive_changes(
+            price_date=datetime.date(2023, 4, 1),
+            product_prices=[
+                (price_fetching.Product(name="Changed", ocado_product_id="123"), 110),
+                (price_fetching.Product(name="Unchanged", ocado_product_id="124"), 200),
+            ],
+            missing_products=[
+                price_fetching.Product(name="Missing", ocado_product_id="125"),
+                price_fetching.Product(name="Already missing", ocado_product_id="126"),
+            ],
+            price_archive=price_archive,
+        )
+
+        assert changes == {
+            "new_products": {},
+            "price_changes": {"123": {"date": "2023-04-01", "price": "1.10"}},
+            "removed_products": ["125"],
+        }
+
+    def test_no_changes(self):
+        price_archive: archive.ArchiveProductMap = {
+            "123": {
+                "name": "Unchanged",
+                "removed": False,
+                "prices": [{"date": "2023-03-01", "price": "1.00"}],
+            },
+        }
+
+        changes = price_fetching._price_archive_changes(
+            price_date=datetime.date(2023, 4, 1),
+            product_prices=[
+                (price_fetching.Product(name="Unchanged", ocado_product_id="123"), 100),
+            ],
+            missing_products=[],
+            price_archive=price_archive,
+        )
+
+        assert not archive.has_changes(changes)
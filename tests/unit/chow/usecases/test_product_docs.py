@@ -1,5 +1,6 @@
 import pathlib
 
+from chow import archive_columns
 from chow.usecases import product_docs as usecase
 from tests import factories
 
@@ -15,7 +16,11 @@ class TestProductDetailMarkdown:
         )
         chart_url = pathlib.Path("chart.png")
 
-        result = usecase._product_detail_markdown(price_changes, chart_url)
+        result = usecase._product_detail_markdown(
+            archive_columns.ColumnarArchive.from_archive({"123": price_changes}),
+            0,
+            chart_url,
+        )
 
         expected_lines = [
             "# Test Product",
@@ -36,7 +41,11 @@ class TestProductDetailMarkdown:
         )
         chart_url = pathlib.Path("chart.png")
 
-        result = usecase._product_detail_markdown(price_changes, chart_url)
+        result = usecase._product_detail_markdown(
+            archive_columns.ColumnarArchive.from_archive({"123": price_changes}),
+            0,
+            chart_url,
+        )
 
         expected_lines = [
             "# Removed Product",
@@ -56,7 +65,11 @@ class TestProductDetailMarkdown:
         )
         chart_url = pathlib.Path("chart.png")
 
-        result = usecase._product_detail_markdown(price_changes, chart_url)
+        result = usecase._product_detail_markdown(
+            archive_columns.ColumnarArchive.from_archive({"123": price_changes}),
+            0,
+            chart_url,
+        )
 
         expected_lines = [
             "# Default Product",
@@ -1,4 +1,4 @@
-from chow import archive
+from chow import archive, archive_columns
 from chow.usecases import timeline as usecase
 from tests import factories
 
@@ -7,7 +7,9 @@ class TestConvertToTimeline:
     def test_empty(self):
         archive_products: archive.ArchiveProductMap = {}
 
-        timeline = usecase._convert_to_timeline(archive_products)
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products)
+        )
 
         assert timeline == []
 
@@ -21,7 +23,9 @@ class TestConvertToTimeline:
             ),
         }
 
-        timeline = usecase._convert_to_timeline(archive_products)
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products)
+        )
 
         assert timeline == [
             {
@@ -50,7 +54,9 @@ class TestConvertToTimeline:
             ),
         }
 
-        timeline = usecase._convert_to_timeline(archive_products)
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products)
+        )
 
         assert timeline == [
             {
@@ -68,3 +74,106 @@ class TestConvertToTimeline:
                 ],
             },
         ]
+
+    def test_interleaves_product_histories(self):
+        archive_products: archive.ArchiveProductMap = {
+            "sku_1": factories.ProductPriceHistory(
+                name="Cheese",
+                prices=[
+                    factories.PriceChange(date="2021-01-10", price="0.70"),
+                    factories.PriceChange(date="2021-03-10", price="0.60"),
+                ],
+            ),
+            "sku_2": factories.ProductPriceHistory(
+                name="Eggs",
+                prices=[
+                    factories.PriceChange(date="2021-02-10", price="1.20"),
+                ],
+            ),
+            "sku_3": factories.ProductPriceHistory(name="Milk", prices=[]),
+        }
+
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products)
+        )
+
+        assert [timeline_date["date"] for timeline_date in timeline] == [
+            "2021-03-10",
+            "2021-02-10",
+            "2021-01-10",
+        ]
+        assert timeline[0]["event_descriptions"] == [
+            "🟢 [Cheese](./product-sku_1.md) changed price from £0.70 to £0.60 (-14%)",
+        ]
+
+    def test_multiple_price_changes_on_the_same_date(self):
+        archive_products: archive.ArchiveProductMap = {
+            "sku_1": factories.ProductPriceHistory(
+                name="Cheese",
+                prices=[
+                    factories.PriceChange(date="2021-01-10", price="0.70"),
+                    factories.PriceChange(date="2021-01-10", price="0.80"),
+                ],
+            ),
+        }
+
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products)
+        )
+
+        assert timeline == [
+            {
+                "date": "2021-01-10",
+                "event_descriptions": [
+                    "🔴 [Cheese](./product-sku_1.md) changed price from £0.70 to £0.80 (+14%)",
+                    "🟡 [Cheese](./product-sku_1.md) added to archive - price is £0.70",
+                ],
+            }
+        ]
+
+    def test_max_days(self):
+        archive_products: archive.ArchiveProductMap = {
+            "sku_1": factories.ProductPriceHistory(
+                name="Cheese",
+                prices=[
+                    factories.PriceChange(date="2021-01-10", price="0.70"),
+                    factories.PriceChange(date="2021-02-10", price="0.90"),
+                    factories.PriceChange(date="2021-03-10", price="0.80"),
+                ],
+            ),
+        }
+
+        timeline = usecase._convert_to_timeline(
+            archive_columns.ColumnarArchive.from_archive(archive_products), max_days=2
+        )
+
+        assert [timeline_date["date"] for timeline_date in timeline] == [
+            "2021-03-10",
+            "2021-02-10",
+        ]
+
+    def test_newest_dates_match_full_timeline(self):
+        archive_products: archive.ArchiveProductMap = {
+            "sku_1": factories.ProductPriceHistory(
+                name="Cheese",
+                prices=[
+                    factories.PriceChange(date="2021-01-10", price="0.70"),
+                    factories.PriceChange(date="2021-02-10", price="0.90"),
+                    factories.PriceChange(date="2021-02-10", price="0.80"),
+                ],
+            ),
+            "sku_2": factories.ProductPriceHistory(
+                name="Eggs",
+                prices=[
+                    factories.PriceChange(date="2021-02-10", price="1.20"),
+                    factories.PriceChange(date="2021-03-10", price="1.10"),
+                ],
+            ),
+        }
+        columns = archive_columns.ColumnarArchive.from_archive(archive_products)
+
+        # The full timeline is built by grouping every price change, and the newest dates by merging
+        # the product histories.
+        assert usecase._convert_to_timeline(
+            columns, max_days=10
+        ) == usecase._convert_to_timeline(columns)